@@ -0,0 +1,88 @@
+"""
+Asset fetch benchmark: sequential per-asset requests vs the shared FetchEngine.
+
+The baseline reproduces the old scraper loop (a fresh ``requests.get`` per
+asset, optionally with the 0.1 s pause between files). Both runs hit the
+same local server, so the numbers are reproducible offline.
+
+    python benchmarks/bench_asset_fetch.py --images 300 --latency-ms 20
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fetch_engine import FetchEngine  # noqa: E402
+from image_scraper import ImageScraper  # noqa: E402
+from local_server import LocalAssetServer  # noqa: E402
+
+
+def run_baseline(page_url, base_url, images, output_dir, legacy_delay):
+    start = time.perf_counter()
+    requests.get(page_url, timeout=15)
+    for i in range(images):
+        res = requests.get(f'{base_url}/img/{i}.png', timeout=10)
+        with open(os.path.join(output_dir, f'image_{i}.png'), 'wb') as f:
+            f.write(res.content)
+        if legacy_delay:
+            time.sleep(0.1)
+    return time.perf_counter() - start
+
+
+def run_engine(page_url, output_dir, workers, per_host):
+    engine = FetchEngine(max_workers=workers, per_host=per_host)
+    scraper = ImageScraper(output_dir=output_dir, fetcher=engine)
+    start = time.perf_counter()
+    files = scraper.download_images(page_url)
+    elapsed = time.perf_counter() - start
+    engine.close()
+    return elapsed, len(files)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', type=int, default=300)
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--connect-ms', type=float, default=30, help='simulated handshake cost per connection')
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--per-host', type=int, default=8)
+    parser.add_argument('--legacy-delay', action='store_true', help='include the old 0.1 s pause per asset in the baseline')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    with LocalAssetServer(latency=args.latency_ms / 1000, connect_delay=args.connect_ms / 1000) as server:
+        page_url = f'{server.base_url}/page?images={args.images}'
+        with tempfile.TemporaryDirectory() as base_dir, tempfile.TemporaryDirectory() as engine_dir:
+            baseline = run_baseline(page_url, server.base_url, args.images, base_dir, args.legacy_delay)
+            engine, fetched = run_engine(page_url, engine_dir, args.workers, args.per_host)
+
+    results = {
+        'benchmark': 'asset_fetch',
+        'images': args.images,
+        'latency_ms': args.latency_ms,
+        'connect_ms': args.connect_ms,
+        'workers': args.workers,
+        'per_host': args.per_host,
+        'baseline_seconds': round(baseline, 3),
+        'engine_seconds': round(engine, 3),
+        'engine_assets': fetched,
+        'baseline_assets_per_sec': round(args.images / baseline, 1),
+        'engine_assets_per_sec': round(fetched / engine, 1),
+        'speedup': round(baseline / engine, 2),
+    }
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
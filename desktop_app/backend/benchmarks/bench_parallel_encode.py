@@ -0,0 +1,83 @@
+"""
+Encode benchmark: one ffmpeg process vs chunked parallel encoding.
+
+Generates a synthetic source (testsrc2 video + sine audio) with ffmpeg,
+then converts it with VideoFormatConverter twice, once with
+``parallel=False`` and once with ``parallel=True``, and reports the
+wall-clock times.
+
+    python benchmarks/bench_parallel_encode.py --seconds 300 --quality high
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from video_format_converter import VideoFormatConverter  # noqa: E402
+
+
+def make_source(path, seconds, size, gop):
+    # MPEG-4 Part 2 source so the converter has to run a real H.264 encode
+    subprocess.run([
+        'ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+        '-f', 'lavfi', '-i', f'testsrc2=size={size}:rate=30:duration={seconds}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:duration={seconds}',
+        '-c:v', 'mpeg4', '-q:v', '3', '-g', str(gop), '-c:a', 'mp3', path,
+    ], check=True)
+
+
+def run_convert(converter, source, output, quality, parallel):
+    start = time.perf_counter()
+    ok = converter.convert_to_mp4(source, output, quality_preset=quality, parallel=parallel)
+    elapsed = time.perf_counter() - start
+    if not ok:
+        raise RuntimeError(f"conversion failed (parallel={parallel})")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=int, default=300, help='length of the synthetic source')
+    parser.add_argument('--size', default='1280x720')
+    parser.add_argument('--gop', type=int, default=60, help='source keyframe interval in frames')
+    parser.add_argument('--quality', default='high', choices=['high', 'medium', 'fast', 'ultrafast'])
+    parser.add_argument('--workers', type=int, default=None, help='parallel chunk encoders (default: cores, at most 8)')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    if not (shutil.which('ffmpeg') and shutil.which('ffprobe')):
+        sys.exit('ffmpeg and ffprobe are required for this benchmark')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'source.avi')
+        make_source(source, args.seconds, args.size, args.gop)
+        converter = VideoFormatConverter(output_dir=tmp, encode_workers=args.workers)
+        single = run_convert(converter, source, os.path.join(tmp, 'single.mp4'), args.quality, False)
+        parallel = run_convert(converter, source, os.path.join(tmp, 'parallel.mp4'), args.quality, True)
+
+    results = {
+        'benchmark': 'parallel_encode',
+        'seconds': args.seconds,
+        'size': args.size,
+        'quality': args.quality,
+        'cores': os.cpu_count(),
+        'workers': converter.parallel_encoder.workers,
+        'single_seconds': round(single, 3),
+        'parallel_seconds': round(parallel, 3),
+        'speedup': round(single / parallel, 2),
+    }
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Startup benchmark: time from spawning the backend to its first answer.
+
+Starts ``python main.py`` the way Electron's ``startPythonBackend`` does,
+polls ``/`` until the server answers, then polls ``/ready`` until every
+tool is warm. Each run is a fresh process, so import costs are paid in
+full every time.
+
+    python benchmarks/bench_startup.py --runs 5
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def poll(url, until=lambda body: True, timeout=60.0, interval=0.005):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as res:
+                body = json.loads(res.read())
+                if until(body):
+                    return body
+        except OSError:
+            pass
+        time.sleep(interval)
+    raise TimeoutError(f"{url} did not answer within {timeout}s")
+
+
+def run_once(python):
+    port = free_port()
+    env = dict(os.environ, TURBODL_PORT=str(port))
+    start = time.perf_counter()
+    proc = subprocess.Popen([python, 'main.py'], cwd=BACKEND_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        base = f'http://127.0.0.1:{port}'
+        poll(f'{base}/')
+        first_answer = time.perf_counter() - start
+        ready = poll(f'{base}/ready', until=lambda body: body.get('ready'))
+        all_warm = time.perf_counter() - start
+    finally:
+        proc.terminate()
+        proc.wait()
+    return {
+        'first_answer_seconds': round(first_answer, 3),
+        'ready_seconds': round(all_warm, 3),
+        'tools': {name: tool['seconds'] for name, tool in ready['tools'].items()},
+        'lazy_extractors': ready.get('lazy_extractors'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--python', default=sys.executable, help='interpreter used to start the backend')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    runs = [run_once(args.python) for _ in range(args.runs)]
+    results = {
+        'benchmark': 'startup',
+        'runs': runs,
+        'first_answer_median': statistics.median(r['first_answer_seconds'] for r in runs),
+        'ready_median': statistics.median(r['ready_seconds'] for r in runs),
+    }
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
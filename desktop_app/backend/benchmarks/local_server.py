@@ -0,0 +1,250 @@
+"""
+Local stand-in web server for offline benchmarks.
+
+Serves synthetic HTML pages that reference generated images and scripts,
+with configurable per-request latency and per-connection setup cost so
+connection reuse and concurrency show up on localhost the way they would
+against a real CDN.
+
+    /page?images=300&scripts=20&styles=10&variants=0
+                                   HTML page referencing the assets below; with
+                                   variants=k each image is responsive, offered at
+                                   k widths (<picture> with AVIF/WebP sources, or
+                                   <img srcset> of extensionless CDN-style URLs)
+    /img/<n>.<ext>                 Image body signed for its extension (png, jpg,
+                                   webp, avif) or ?fm=; size via ?size=, or
+                                   proportional to ?w=
+    /img/<n>.html                  An HTML page posing as an image
+    /js/<n>.js                     JavaScript body
+    /css/<n>.css                   Stylesheet importing css/sub/<n>.css, with a
+                                   background image and a shared web font
+    /css/sub/<n>.css               Imported sheet with a relative url() image
+    /fonts/<name>.woff2            WOFF2-signed font body
+    /site/<n>.html?pages=200&fanout=5&images=10
+                                   Page n of a linked site tree (children n*fanout+1..),
+                                   with shared and page-specific images
+    /robots.txt                    Disallows /private/
+    /media/<path>                  Files from ``media_dir`` (Range requests supported)
+"""
+
+import mimetypes
+import os
+import re
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+IMAGE_SIGNATURES = {
+    'png': (PNG_SIGNATURE, 'image/png'),
+    'jpg': (b'\xff\xd8\xff\xe0', 'image/jpeg'),
+    'webp': (b'RIFF\0\0\0\0WEBPVP8 ', 'image/webp'),
+    'avif': (b'\0\0\0\x1cftypavif', 'image/avif'),
+}
+VARIANT_BASE_WIDTH = 320
+
+
+class AssetHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like a real CDN
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out in separate writes; avoid Nagle/delayed-ACK stalls
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # Simulated TCP/TLS handshake cost, paid once per connection
+        time.sleep(self.server.connect_delay)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, body, content_type, etag=None):
+        if etag and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if etag:
+            self.send_header('ETag', etag)
+        if self.server.max_age is not None:
+            self.send_header('Cache-Control', f'max-age={self.server.max_age}')
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+        size = int(query.get('size', [self.server.asset_size])[0])
+
+        if parsed.path == '/page':
+            images = int(query.get('images', [100])[0])
+            scripts = int(query.get('scripts', [0])[0])
+            styles = int(query.get('styles', [0])[0])
+            parts = ['<html><head><title>bench</title>']
+            parts += [f'<link rel="stylesheet" href="/css/{i}.css">' for i in range(styles)]
+            parts += [f'<script src="/js/{i}.js"></script>' for i in range(scripts)]
+            parts.append('</head><body>')
+            variants = int(query.get('variants', [0])[0])
+            if variants:
+                parts += [self._responsive_image(i, variants) for i in range(images)]
+            else:
+                parts += [f'<img src="/img/{i}.png" alt="{i}">' for i in range(images)]
+            parts.append('</body></html>')
+            self._send('\n'.join(parts).encode(), 'text/html; charset=utf-8')
+        elif parsed.path.startswith('/img/') and parsed.path.endswith('.html'):
+            self._send(b'<html><body>not an image</body></html>', 'text/html; charset=utf-8')
+        elif parsed.path.startswith('/img/'):
+            ext = os.path.splitext(parsed.path)[1].lstrip('.')
+            signature, content_type = IMAGE_SIGNATURES.get(query.get('fm', [ext])[0], IMAGE_SIGNATURES['png'])
+            if 'w' in query:
+                size = self.server.asset_size * int(query['w'][0]) // (VARIANT_BASE_WIDTH * 4)
+            body = signature + b'\0' * max(0, size - len(signature))
+            self._send(body, content_type, etag=f'"{parsed.path}-{parsed.query}-{size}"')
+        elif parsed.path.startswith('/fonts/'):
+            body = b'wOF2' + b'\0' * max(0, size - 4)
+            self._send(body, 'font/woff2', etag=f'"{parsed.path}-{size}"')
+        elif parsed.path.startswith('/js/'):
+            body = b'//' + b'x' * max(0, size - 3) + b'\n'
+            self._send(body, 'application/javascript', etag=f'"{parsed.path}-{size}"')
+        elif parsed.path.startswith('/css/sub/'):
+            n = parsed.path.rsplit('/', 1)[-1].split('.')[0]
+            rule = f'.nested{n} {{ background-image: url(../../img/nested{n}.png); }}\n'.encode()
+            body = rule + b'/*' + b'x' * max(0, size - len(rule) - 5) + b'*/\n'
+            self._send(body, 'text/css', etag=f'"{parsed.path}-{size}"')
+        elif parsed.path.startswith('/css/'):
+            n = parsed.path.rsplit('/', 1)[-1].split('.')[0]
+            rule = (f'@import "sub/{n}.css";\n'
+                    f'@font-face {{ font-family: Bench; src: url("/fonts/bench.woff2") format("woff2"); }}\n'
+                    f'.bg{n} {{ background: url("/img/bg{n}.png"); }}\n').encode()
+            body = rule + b'/*' + b'x' * max(0, size - len(rule) - 5) + b'*/\n'
+            self._send(body, 'text/css', etag=f'"{parsed.path}-{size}"')
+        elif parsed.path.startswith('/site/'):
+            self._send(self._site_page(parsed.path, query), 'text/html; charset=utf-8')
+        elif parsed.path == '/robots.txt':
+            self._send(b'User-agent: *\nDisallow: /private/\n', 'text/plain')
+        elif parsed.path.startswith('/media/') and self.server.media_dir:
+            self._send_file(parsed.path[len('/media/'):])
+        else:
+            self.send_error(404)
+
+    @staticmethod
+    def _responsive_image(i, variants):
+        widths = [VARIANT_BASE_WIDTH * (k + 1) for k in range(variants)]
+        if i % 2:
+            srcset = ', '.join(f'/img/cdn{i}?w={w}&fm=jpg {w}w' for w in widths)
+            return f'<img src="/img/cdn{i}?w={widths[0]}&fm=jpg" srcset="{srcset}" sizes="100vw" alt="{i}">'
+        sources = [f'<source type="image/{fmt}" srcset="'
+                   + ', '.join(f'/img/{i}-{w}.{fmt} {w}w' for w in widths) + '">' for fmt in ('avif', 'webp')]
+        srcset = ', '.join(f'/img/{i}-{w}.png {w}w' for w in widths)
+        return f'<picture>{"".join(sources)}<img src="/img/{i}.png" srcset="{srcset}" alt="{i}"></picture>'
+
+    @staticmethod
+    def _site_page(path, query):
+        n = int(path.rsplit('/', 1)[-1].split('.')[0])
+        pages = int(query.get('pages', [200])[0])
+        fanout = int(query.get('fanout', [5])[0])
+        images = int(query.get('images', [10])[0])
+        params = f'?pages={pages}&fanout={fanout}&images={images}'
+        children = [c for c in range(n * fanout + 1, n * fanout + fanout + 1) if c < pages]
+        parts = [f'<html><head><title>page {n}</title><script src="/js/site.js"></script></head><body>']
+        parts += [f'<a href="/site/{c}.html{params}">page {c}</a>' for c in children]
+        # Links the crawler must collapse or skip: the root again, a tracking variant,
+        # a fragment, a robots-disallowed page and an off-site page
+        parts.append(f'<a href="/site/0.html{params}&utm_source=bench#top">home</a>')
+        parts.append(f'<a href="../site/{n}.html{params}#self">self</a>')
+        parts.append('<a href="/private/admin.html">admin</a><a href="http://elsewhere.invalid/">out</a>')
+        parts += [f'<img src="/img/shared{k}.png">' for k in range(images // 2)]
+        parts += [f'<img src="/img/p{n}_{k}.png">' for k in range(images - images // 2)]
+        parts.append('</body></html>')
+        return '\n'.join(parts).encode()
+
+    def _send_file(self, relpath):
+        root = os.path.realpath(self.server.media_dir)
+        path = os.path.realpath(os.path.join(root, relpath))
+        if not path.startswith(root + os.sep) or not os.path.isfile(path):
+            self.send_error(404)
+            return
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        match = re.fullmatch(r'bytes=(\d*)-(\d*)', self.headers.get('Range', ''))
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            else:
+                start = max(0, size - int(match.group(2)))
+            if start > end:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        else:
+            self.send_response(200)
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if path.endswith('.m3u8'):
+            content_type = 'application/vnd.apple.mpegurl'
+        elif path.endswith('.mpd'):
+            content_type = 'application/dash+xml'
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        if self.command == 'HEAD':
+            return
+        with open(path, 'rb') as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(256 * 1024, remaining))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+
+class _QuietServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # Clients that exit with keep-alive connections open are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class LocalAssetServer:
+    """Context manager running the asset server on a background thread."""
+
+    def __init__(self, latency=0.02, connect_delay=0.03, asset_size=20_000, max_age=None, port=0, media_dir=None):
+        self.httpd = _QuietServer(('127.0.0.1', port), AssetHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.latency = latency
+        self.httpd.connect_delay = connect_delay
+        self.httpd.asset_size = asset_size
+        self.httpd.max_age = max_age
+        self.httpd.media_dir = media_dir
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,84 @@
+"""
+Synthetic media for the offline benchmarks, generated with ffmpeg.
+
+A test-pattern clip with a tone is written once per fixture directory
+and repackaged into the layouts the downloaders meet in practice:
+
+    clip.mp4             H.264/AAC progressive MP4 (1 s keyframe interval)
+    clip.mkv             MPEG-4 Part 2/MP2 Matroska, forcing a full re-encode
+    clip_open_gop.mp4    H.264 with open GOPs and B-frames, as cut sources
+    clip_hevc.mp4        HEVC (hvc1)/AAC MP4, only when ffmpeg has libx265
+    hls/index.m3u8       HLS VOD playlist of 2 s MPEG-TS segments
+    dash/manifest.mpd    DASH manifest with separate video and audio
+                         representations
+
+Serve the directory with ``LocalAssetServer(media_dir=...)``.
+"""
+
+import os
+import shutil
+import subprocess
+
+FIXTURES = {
+    'mp4': 'clip.mp4',
+    'mkv': 'clip.mkv',
+    'hls': 'hls/index.m3u8',
+    'dash': 'dash/manifest.mpd',
+    'open_gop': 'clip_open_gop.mp4',
+    'hevc': 'clip_hevc.mp4',
+}
+
+
+def ffmpeg_available():
+    return shutil.which('ffmpeg') is not None and shutil.which('ffprobe') is not None
+
+
+def _has_encoder(name):
+    out = subprocess.run(['ffmpeg', '-hide_banner', '-encoders'], capture_output=True, text=True).stdout
+    return any(line.split()[1:2] == [name] for line in out.splitlines())
+
+
+def _run(cmd):
+    subprocess.run(['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y'] + cmd, check=True)
+
+
+def make_media(media_dir, seconds=20, size='640x360', fps=30):
+    """
+    Write the fixtures into ``media_dir`` (skipping ones already there) and
+    return ``{name: relative path}``; 'hevc' is left out when libx265 is
+    missing. Raises RuntimeError without ffmpeg.
+    """
+    if not ffmpeg_available():
+        raise RuntimeError('ffmpeg and ffprobe are required to generate media fixtures')
+    os.makedirs(os.path.join(media_dir, 'hls'), exist_ok=True)
+    os.makedirs(os.path.join(media_dir, 'dash'), exist_ok=True)
+    path = {name: os.path.join(media_dir, rel) for name, rel in FIXTURES.items()}
+
+    if not os.path.exists(path['mp4']):
+        _run(['-f', 'lavfi', '-i', f'testsrc2=size={size}:rate={fps}',
+              '-f', 'lavfi', '-i', 'sine=frequency=440:sample_rate=44100',
+              '-t', str(seconds), '-c:v', 'libx264', '-preset', 'veryfast', '-g', str(fps),
+              '-pix_fmt', 'yuv420p', '-c:a', 'aac', '-b:a', '96k', '-movflags', '+faststart',
+              path['mp4']])
+    if not os.path.exists(path['mkv']):
+        _run(['-i', path['mp4'], '-c:v', 'mpeg4', '-q:v', '5', '-c:a', 'mp2', path['mkv']])
+    if not os.path.exists(path['hls']):
+        _run(['-i', path['mp4'], '-c', 'copy', '-f', 'hls', '-hls_time', '2',
+              '-hls_playlist_type', 'vod', path['hls']])
+    if not os.path.exists(path['dash']):
+        _run(['-i', path['mp4'], '-map', '0:v', '-map', '0:a', '-c', 'copy', '-f', 'dash',
+              '-seg_duration', '2', path['dash']])
+    if not os.path.exists(path['open_gop']):
+        _run(['-i', path['mp4'], '-c:v', 'libx264', '-preset', 'veryfast', '-bf', '3',
+              '-x264-params', f'open-gop=1:keyint={2 * fps}:min-keyint={fps}',
+              '-pix_fmt', 'yuv420p', '-c:a', 'copy', '-movflags', '+faststart', path['open_gop']])
+    fixtures = dict(FIXTURES)
+    if os.path.exists(path['hevc']) or _has_encoder('libx265'):
+        if not os.path.exists(path['hevc']):
+            # x265 defaults to open GOPs with B-frames
+            _run(['-i', path['mp4'], '-c:v', 'libx265', '-preset', 'veryfast', '-tag:v', 'hvc1',
+                  '-x265-params', f'keyint={2 * fps}:log-level=error',
+                  '-pix_fmt', 'yuv420p', '-c:a', 'copy', '-movflags', '+faststart', path['hevc']])
+    else:
+        del fixtures['hevc']
+    return fixtures
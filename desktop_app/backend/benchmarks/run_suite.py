@@ -0,0 +1,507 @@
+"""
+Offline benchmark suite for the backend tools.
+
+Every case runs against local stand-ins, with no network access needed:
+``LocalAssetServer`` serves the HTML pages and assets for the scrapers,
+plus MP4, HLS and DASH fixtures for yt-dlp. Those fixtures come from
+``media_fixtures``. Each case runs in a fresh subprocess, so its peak
+RSS is its own and imports are paid the same way on every release.
+
+Cases and what they report:
+
+    images, scripts, styles   assets/s, MB/s, time to first progress update
+    variants                  images on a page of responsive images (--variants
+                              widths each, in three formats): files and bytes kept
+                              with one variant per image
+    crawl                     SiteCrawler over a linked local site: assets/s, pages/s
+    video_mp4/_hls/_dash      MB/s through VideoDownloader (generic extractor)
+    clips                     YTClipsDownloader cutting two 4 s ranges with the default
+                              re-encoding cutter
+    clips_smart               the same with smart_cut, from the H.264, open-GOP
+                              H.264 and (with libx265) HEVC fixtures
+                              Both check every clip with ffprobe: it must decode
+                              cleanly and last end - start within CLIP_TOLERANCE
+    convert                   VideoFormatConverter re-encoding MKV to MP4
+    websocket                 progress frames/s reaching a /ws client while
+                              POST /scrape-images runs through main.app
+
+All cases report wall seconds and peak RSS. Cases that need ffmpeg are
+recorded as skipped when it is missing. Pass ``--json`` to save the
+results and ``--compare`` to diff them against an earlier file:
+
+    python benchmarks/run_suite.py --json bench-1.4.json
+    python benchmarks/run_suite.py --compare bench-1.4.json --cases images,websocket
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(BENCH_DIR, '..')
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'scripts'))
+sys.path.insert(0, BENCH_DIR)
+
+from local_server import LocalAssetServer  # noqa: E402
+from media_fixtures import ffmpeg_available, make_media  # noqa: E402
+
+MEDIA_CASES = {'video_mp4', 'video_hls', 'video_dash', 'clips', 'clips_smart', 'convert'}
+CASES = ['images', 'variants', 'scripts', 'styles', 'crawl', 'video_mp4', 'video_hls', 'video_dash', 'clips',
+         'clips_smart', 'convert', 'websocket']
+# Seconds a cut clip's duration may differ from end - start
+CLIP_TOLERANCE = 0.25
+# Every clip lasts CLIP_SECONDS, so outputs can be checked without mapping them to ranges
+CLIP_SECONDS = 4
+CLIP_STARTS = (2, 10)
+# Updates sent before any work item has progressed; not counted as the first update
+SETUP_STATUSES = {'scanning', 'found', 'analyzing', 'starting', 'sampling'}
+# Metrics compared between runs, and whether a larger value is better
+COMPARED = {
+    'seconds': False,
+    'first_update_seconds': False,
+    'items_per_sec': True,
+    'mb_per_sec': True,
+    'frames_per_sec': True,
+    'pages_per_sec': True,
+    'peak_rss_mb': False,
+}
+
+
+# --- Child side: one case per process ---
+
+class Recorder:
+    """progress_callback that times the first real progress update and notes errors."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first = None
+        self.updates = 0
+        self.errors = []
+
+    def __call__(self, data):
+        self.updates += 1
+        if self.first is None and data.get('status') not in SETUP_STATUSES:
+            self.first = time.perf_counter() - self.started
+        if data.get('status') == 'error':
+            self.errors.append(data.get('error') or data.get('message'))
+
+
+def dir_stats(path):
+    files, size = 0, 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            if name.startswith('.'):
+                continue
+            files += 1
+            size += os.path.getsize(os.path.join(root, name))
+    return files, size
+
+
+def _timed(fn, output_dir, recorder=None):
+    started = time.perf_counter()
+    fn()
+    seconds = time.perf_counter() - started
+    files, size = dir_stats(output_dir)
+    result = {
+        'seconds': seconds,
+        'items': files,
+        'items_per_sec': files / seconds,
+        'mb_per_sec': size / seconds / 1e6,
+        'bytes': size,
+    }
+    if recorder is not None:
+        result['updates'] = recorder.updates
+        result['first_update_seconds'] = recorder.first
+        if recorder.errors:
+            result['error'] = recorder.errors[0]
+    return result
+
+
+def _fetcher(config):
+    from fetch_engine import FetchEngine
+    return FetchEngine(max_workers=config['workers'], per_host=config['per_host'])
+
+
+def case_images(config, out):
+    from image_scraper import ImageScraper
+    scraper = ImageScraper(output_dir=out, fetcher=_fetcher(config))
+    recorder = Recorder()
+    url = f"{config['base_url']}/page?images={config['images']}"
+    return _timed(lambda: scraper.download_images(url, progress_callback=recorder), out, recorder)
+
+
+def case_variants(config, out):
+    from image_scraper import ImageScraper
+    scraper = ImageScraper(output_dir=out, fetcher=_fetcher(config))
+    recorder = Recorder()
+    url = f"{config['base_url']}/page?images={config['images']}&variants={config['variants']}"
+    return _timed(lambda: scraper.download_images(url, progress_callback=recorder), out, recorder)
+
+
+def case_scripts(config, out):
+    from javascript_scraper import JavascriptScraper
+    scraper = JavascriptScraper(output_dir=out, fetcher=_fetcher(config))
+    recorder = Recorder()
+    url = f"{config['base_url']}/page?images=0&scripts={config['scripts']}"
+    return _timed(lambda: scraper.download_javascript(url, progress_callback=recorder), out, recorder)
+
+
+def case_styles(config, out):
+    from style_scraper import download_css
+    url = f"{config['base_url']}/page?images=0&styles={config['styles']}"
+    return _timed(lambda: download_css(url, output_dir=out, fetcher=_fetcher(config)), out)
+
+
+def case_crawl(config, out):
+    from image_scraper import ImageScraper
+    from javascript_scraper import JavascriptScraper
+    from page_assets import PageAssetScraper
+    from site_crawler import SiteCrawler
+    from style_scraper import StyleScraper
+    fetcher = _fetcher(config)
+    pages = PageAssetScraper(ImageScraper(os.path.join(out, 'images'), fetcher),
+                             JavascriptScraper(os.path.join(out, 'js'), fetcher),
+                             StyleScraper(os.path.join(out, 'styles'), fetcher), fetcher)
+    crawler = SiteCrawler(pages, fetcher, per_host=config['per_host'])
+    recorder = Recorder()
+    url = f"{config['base_url']}/site/0.html?pages={config['crawl_pages']}&fanout=5&images=10"
+    summary = {}
+    result = _timed(lambda: summary.update(crawler.crawl_site(url, max_depth=10, max_pages=config['crawl_pages'],
+                                                              progress_callback=recorder)), out, recorder)
+    result['pages'] = summary.get('pages')
+    result['pages_per_sec'] = (summary.get('pages') or 0) / result['seconds']
+    return result
+
+
+def _video(config, out, fixture):
+    from any_video_downloader import VideoDownloader
+    downloader = VideoDownloader(output_dir=out, connections=config['connections'])
+    recorder = Recorder()
+    url = f"{config['base_url']}/media/{config['media'][fixture]}"
+
+    def run():
+        info = downloader.analyze(url)
+        downloader.download_video(info['videos'][0], -1, progress_callback=recorder)
+    return _timed(run, out, recorder)
+
+
+def case_video_mp4(config, out):
+    return _video(config, out, 'mp4')
+
+
+def case_video_hls(config, out):
+    return _video(config, out, 'hls')
+
+
+def case_video_dash(config, out):
+    return _video(config, out, 'dash')
+
+
+def check_clip(path, expected):
+    """Return (problem or None, duration error) for one clip, decoding it fully."""
+    probe = subprocess.run(['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+                            '-of', 'default=noprint_wrappers=1:nokey=1', path],
+                           capture_output=True, text=True)
+    try:
+        error = abs(float(probe.stdout.strip()) - expected)
+    except ValueError:
+        return f"ffprobe could not read {os.path.basename(path)}: {probe.stderr.strip()}", None
+    decode = subprocess.run(['ffmpeg', '-v', 'error', '-i', path, '-f', 'null', '-'],
+                            capture_output=True, text=True)
+    if decode.returncode != 0 or decode.stderr.strip():
+        return f"{os.path.basename(path)} does not decode cleanly: {decode.stderr.strip()[:200]}", error
+    if error > CLIP_TOLERANCE:
+        return f"{os.path.basename(path)} lasts {expected + error:.2f}s, expected {expected:.2f}s", error
+    return None, error
+
+
+def _clips(config, out, sources, smart_cut):
+    from any_video_downloader import VideoDownloader
+    from yt_clips_downloader import YTClipsDownloader
+    clips = YTClipsDownloader(output_dir=out, video_tool=VideoDownloader(output_dir=out), smart_cut=smart_cut)
+    recorder = Recorder()
+    ranges = [{'url': f"{config['base_url']}/media/{config['media'][source]}",
+               'start': start, 'end': start + CLIP_SECONDS}
+              for source in sources for start in CLIP_STARTS]
+    outputs = []
+    result = _timed(lambda: outputs.extend(clips.download_clips(ranges, progress_callback=recorder)),
+                    out, recorder)
+
+    # Validate outside the timed section
+    problems, errors = [], []
+    if len(outputs) != len(ranges):
+        problems.append(f"expected {len(ranges)} clips, got {len(outputs)}")
+    for path in outputs:
+        problem, error = check_clip(path, CLIP_SECONDS)
+        if problem:
+            problems.append(problem)
+        if error is not None:
+            errors.append(error)
+    result['valid'] = not problems
+    result['max_duration_error'] = max(errors, default=None)
+    if problems and 'error' not in result:
+        result['error'] = problems[0]
+    return result
+
+
+def case_clips(config, out):
+    return _clips(config, out, ['mp4'], smart_cut=False)
+
+
+def case_clips_smart(config, out):
+    sources = [name for name in ('mp4', 'open_gop', 'hevc') if name in config['media']]
+    return _clips(config, out, sources, smart_cut=True)
+
+
+def case_convert(config, out):
+    from video_format_converter import VideoFormatConverter
+    converter = VideoFormatConverter(output_dir=out)
+    recorder = Recorder()
+    source = os.path.join(config['media_dir'], config['media']['mkv'])
+    return _timed(lambda: converter.convert_to_mp4(source, quality_preset=config['convert_preset'],
+                                                   progress_callback=recorder), out, recorder)
+
+
+def case_websocket(config, out):
+    # main.py is the real app, not a fixture: it reads TURBODL_DOWNLOADS_DIR once at import,
+    # so the variable is set before the (deferred) import to keep the job journal, asset
+    # store and downloads inside this case's temp dir rather than the user's downloads.
+    # Entering TestClient runs the startup hook, which creates them and warms the tools.
+    # Each case runs in its own process, so the import and environment do not leak.
+    os.environ['TURBODL_DOWNLOADS_DIR'] = out
+    sys.path.insert(0, BACKEND_DIR)
+    from fastapi.testclient import TestClient
+    import main
+
+    url = f"{config['base_url']}/page?images={config['images']}"
+    with TestClient(main.app) as client, client.websocket_connect('/ws') as ws:
+        started = time.perf_counter()
+        job_id = client.post('/scrape-images', json={'url': url}).json()['job_id']
+        frames, first, last = 0, None, None
+        while True:
+            msg = json.loads(ws.receive_text())
+            if msg.get('type') != 'progress' or msg.get('job_id') != job_id:
+                continue
+            frames += 1
+            last = msg['data']
+            if first is None and last.get('status') not in SETUP_STATUSES:
+                first = time.perf_counter() - started
+            if last.get('status') in ('completed', 'error', 'failed', 'cancelled'):
+                break
+        seconds = time.perf_counter() - started
+    files, size = dir_stats(os.path.join(out, 'images'))
+    result = {
+        'seconds': seconds,
+        'frames': frames,
+        'frames_per_sec': frames / seconds,
+        'first_update_seconds': first,
+        'items': files,
+        'items_per_sec': files / seconds,
+    }
+    if last.get('status') != 'completed':
+        result['error'] = last.get('error') or last.get('status')
+    return result
+
+
+def run_child(config_path, case, result_path):
+    with open(config_path) as f:
+        config = json.load(f)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with tempfile.TemporaryDirectory(prefix=f'bench-{case}-') as out:
+        result = globals()[f'case_{case}'](config, out)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    result['start_rss_mb'] = baseline * scale / 1e6
+    result['peak_rss_mb'] = peak * scale / 1e6
+    with open(result_path, 'w') as f:
+        json.dump(result, f)
+
+
+# --- Parent side ---
+
+def _round(value):
+    return round(value, 3) if isinstance(value, float) else value
+
+
+def summarize(runs):
+    """Median of every numeric field across runs; other fields from the first run."""
+    summary = dict(runs[0])
+    for key, value in runs[0].items():
+        values = [r[key] for r in runs if isinstance(r.get(key), (int, float)) and not isinstance(r.get(key), bool)]
+        if len(values) == len(runs) and values:
+            summary[key] = statistics.median(values)
+    summary = {key: _round(value) for key, value in summary.items()}
+    summary['runs'] = len(runs)
+    errors = [r['error'] for r in runs if r.get('error')]
+    if errors:
+        summary['error'] = errors[0]
+    return summary
+
+
+def run_case(case, config_path, timeout, quiet):
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+        result_path = f.name
+    try:
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', case, '--config', config_path,
+             '--result', result_path],
+            cwd=BACKEND_DIR, timeout=timeout,
+            stdout=subprocess.DEVNULL if quiet else None, stderr=subprocess.DEVNULL if quiet else None,
+        )
+        if proc.returncode != 0:
+            return {'error': f'exited with {proc.returncode}'}
+        with open(result_path) as f:
+            return json.load(f)
+    except subprocess.TimeoutExpired:
+        return {'error': f'timed out after {timeout}s'}
+    finally:
+        os.unlink(result_path)
+
+
+def environment():
+    try:
+        import yt_dlp
+        ytdlp = yt_dlp.version.__version__
+    except ImportError:
+        ytdlp = None
+    try:
+        rev = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, capture_output=True,
+                             text=True).stdout.strip() or None
+    except OSError:
+        rev = None
+    return {
+        'git_rev': rev,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'yt_dlp': ytdlp,
+        'ffmpeg': ffmpeg_available(),
+    }
+
+
+def compare(old, new):
+    """Print per-case metric changes; returns rows as dicts."""
+    rows = []
+    for case, result in new['cases'].items():
+        before = old.get('cases', {}).get(case)
+        if not before or before.get('skipped') or result.get('skipped'):
+            continue
+        for metric, higher_is_better in COMPARED.items():
+            a, b = before.get(metric), result.get(metric)
+            if not isinstance(a, (int, float)) or not isinstance(b, (int, float)) or not a:
+                continue
+            change = (b - a) / a * 100
+            better = change > 0 if higher_is_better else change < 0
+            rows.append({'case': case, 'metric': metric, 'old': a, 'new': b, 'change_pct': round(change, 1),
+                         'better': better})
+    print(f"\n{'case':<12} {'metric':<22} {'old':>10} {'new':>10} {'change':>9}")
+    for row in rows:
+        mark = '+' if row['better'] else ('-' if row['change_pct'] else ' ')
+        print(f"{row['case']:<12} {row['metric']:<22} {row['old']:>10} {row['new']:>10} "
+              f"{row['change_pct']:>8}% {mark}")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cases', default=','.join(CASES), help='comma-separated subset of: ' + ', '.join(CASES))
+    parser.add_argument('--repeat', type=int, default=1, help='runs per case; numbers are medians')
+    parser.add_argument('--images', type=int, default=300)
+    parser.add_argument('--variants', type=int, default=5, help='widths per responsive image')
+    parser.add_argument('--scripts', type=int, default=50)
+    parser.add_argument('--styles', type=int, default=5)
+    parser.add_argument('--crawl-pages', type=int, default=100)
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--connect-ms', type=float, default=30, help='simulated handshake cost per connection')
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--per-host', type=int, default=8)
+    parser.add_argument('--connections', type=int, default=8, help='yt-dlp connections per download')
+    parser.add_argument('--media-seconds', type=int, default=20)
+    parser.add_argument('--media-dir', help='keep generated media here between runs (default: temp dir)')
+    parser.add_argument('--convert-preset', default='fast')
+    parser.add_argument('--timeout', type=float, default=600, help='seconds per case run')
+    parser.add_argument('--verbose', action='store_true', help="show the tools' own output")
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--compare', help='earlier results file to diff against')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--config', help=argparse.SUPPRESS)
+    parser.add_argument('--result', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.config, args.child, args.result)
+        return
+
+    cases = [c.strip() for c in args.cases.split(',') if c.strip()]
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory(prefix='bench-media-') as tmp_media:
+        media_dir = args.media_dir or tmp_media
+        media, media_skip = None, None
+        if MEDIA_CASES & set(cases):
+            try:
+                media = make_media(media_dir, seconds=args.media_seconds)
+            except (RuntimeError, subprocess.CalledProcessError) as e:
+                media_skip = str(e)
+
+        with LocalAssetServer(latency=args.latency_ms / 1000, connect_delay=args.connect_ms / 1000,
+                              media_dir=media_dir) as server, \
+                tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            config = {
+                'base_url': server.base_url,
+                'media_dir': media_dir,
+                'media': media,
+                'images': args.images,
+                'variants': args.variants,
+                'scripts': args.scripts,
+                'styles': args.styles,
+                'crawl_pages': args.crawl_pages,
+                'workers': args.workers,
+                'per_host': args.per_host,
+                'connections': args.connections,
+                'convert_preset': args.convert_preset,
+            }
+            json.dump(config, f)
+            f.close()
+            try:
+                results = {}
+                for case in cases:
+                    if case in MEDIA_CASES and media is None:
+                        results[case] = {'skipped': media_skip}
+                        print(f"[{case}] skipped: {media_skip}")
+                        continue
+                    runs = [run_case(case, f.name, args.timeout, not args.verbose) for _ in range(args.repeat)]
+                    results[case] = summarize(runs)
+                    print(f"[{case}] {json.dumps(results[case])}")
+            finally:
+                os.unlink(f.name)
+
+    report = {
+        'benchmark': 'suite',
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': environment(),
+        'settings': {key: value for key, value in config.items() if key not in ('base_url', 'media_dir', 'media')}
+        | {'latency_ms': args.latency_ms, 'connect_ms': args.connect_ms, 'repeat': args.repeat,
+           'media_seconds': args.media_seconds},
+        'cases': results,
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            report['compared_to'] = {'file': args.compare, 'rows': compare(json.load(f), report)}
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,28 +1,47 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 from pydantic import BaseModel
 import json
 import asyncio
-from typing import Dict, List, Optional
+import importlib
 import threading
+import time
+from datetime import datetime
+from functools import partial
+from typing import Dict, List, Literal, Optional
 
 import os
+# Only the light modules are imported here. The tools (yt-dlp, lxml, requests)
+# are imported on first use or by the warm-up after startup; see load_script.
 try:
-    from scripts.any_video_downloader import VideoDownloader
-    from scripts.image_scraper import ImageScraper
-    from scripts.javascript_scraper import JavascriptScraper
-    from scripts.yt_clips_downloader import YTClipsDownloader
-    from scripts.video_format_converter import VideoFormatConverter
+    from scripts.job_scheduler import JobScheduler
+    from scripts.job_store import JobStore
+    from scripts.asset_store import AssetStore
+    from scripts.http_cache import HttpCache
+    from scripts.lazy_tools import ToolRegistry
+    from scripts.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY as METRICS, THREADS
+    from scripts.progress_channel import ConnectionManager, ProgressThrottle, is_event, is_terminal
+    SCRIPTS_PREFIX = "scripts."
 except ImportError:
     # Fallback for dev mode
     import sys
     import os
     sys.path.append(os.path.join(os.path.dirname(__file__), "scripts"))
-    from any_video_downloader import VideoDownloader
-    from image_scraper import ImageScraper
-    from javascript_scraper import JavascriptScraper
-    from yt_clips_downloader import YTClipsDownloader
-    from video_format_converter import VideoFormatConverter
+    from job_scheduler import JobScheduler
+    from job_store import JobStore
+    from asset_store import AssetStore
+    from http_cache import HttpCache
+    from lazy_tools import ToolRegistry
+    from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY as METRICS, THREADS
+    from progress_channel import ConnectionManager, ProgressThrottle, is_event, is_terminal
+    SCRIPTS_PREFIX = ""
+
+def load_script(module):
+    """Import a module from scripts/ the same way the eager imports above resolved."""
+    return importlib.import_module(SCRIPTS_PREFIX + module)
+
+PROCESS_STARTED = time.time()
 
 app = FastAPI()
 
@@ -37,17 +56,65 @@ app.add_middleware(
 # Initialize Utils
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.abspath(os.path.join(BASE_DIR, "../../"))
-DOWNLOADS_DIR = os.path.join(PROJECT_ROOT, "downloads")
+# TURBODL_DOWNLOADS_DIR relocates all output (the benchmark suite points it at a temp dir)
+DOWNLOADS_DIR = os.environ.get("TURBODL_DOWNLOADS_DIR") or os.path.join(PROJECT_ROOT, "downloads")
+
+def prepare_downloads():
+    """Create the output folders; runs at startup, not import, so importing main touches no disk."""
+    for subdir in ["videos", "images", "js files", "style files", "clips", "converted"]:
+        os.makedirs(os.path.join(DOWNLOADS_DIR, subdir), exist_ok=True)
 
-# Ensure subdirectories exist
-for subdir in ["videos", "images", "js files", "style files", "clips", "converted"]:
-    os.makedirs(os.path.join(DOWNLOADS_DIR, subdir), exist_ok=True)
+# --- Tools (built lazily) ---
+tools = ToolRegistry()
 
-video_tool = VideoDownloader(output_dir=os.path.join(DOWNLOADS_DIR, "videos"))
-image_tool = ImageScraper(output_dir=os.path.join(DOWNLOADS_DIR, "images"))
-script_tool = JavascriptScraper(output_dir=os.path.join(DOWNLOADS_DIR, "js files"))
-clip_tool = YTClipsDownloader(output_dir=os.path.join(DOWNLOADS_DIR, "clips"))
-converter_tool = VideoFormatConverter(output_dir=os.path.join(DOWNLOADS_DIR, "converted"))
+def build_http_cache():
+    # Content-addressed store backing every scraped asset (deduplicated across runs), with
+    # ETag/Last-Modified revalidation and max-age reuse over it, LRU-evicted by size
+    asset_store = AssetStore(os.path.join(DOWNLOADS_DIR, ".store"))
+    return HttpCache(asset_store, max_bytes=int(float(os.environ.get("TURBODL_CACHE_MB", 2048)) * 1024 * 1024))
+
+def build_fetch_engine():
+    # One pooled HTTP client shared by all scrapers (global and per-host fetch limits)
+    return load_script("fetch_engine").FetchEngine(
+        cache=http_cache.get(),
+        max_workers=int(os.environ.get("TURBODL_FETCH_WORKERS", 32)),
+        per_host=int(os.environ.get("TURBODL_FETCH_PER_HOST", 6)),
+        max_asset_bytes=int(float(os.environ.get("TURBODL_MAX_ASSET_MB", 50)) * 1024 * 1024),
+    )
+
+# Registration order is warm-up order: yt-dlp first, it is the slowest to load
+video_tool = tools.register("video", lambda: load_script("any_video_downloader").VideoDownloader(
+    output_dir=os.path.join(DOWNLOADS_DIR, "videos"), connections=int(os.environ.get("TURBODL_CONNECTIONS", 8))))
+batch_tool = tools.register("batch", lambda: load_script("batch_downloader").BatchDownloader(
+    video_tool.get(), output_dir=os.path.join(DOWNLOADS_DIR, "videos"),
+    workers=int(os.environ.get("TURBODL_YTDLP_WORKERS", 4)), slots=scheduler.slots("ytdlp")))
+clip_tool = tools.register("clips", lambda: load_script("yt_clips_downloader").YTClipsDownloader(
+    output_dir=os.path.join(DOWNLOADS_DIR, "clips"), video_tool=video_tool.get(),
+    # Experimental GOP-copying cutter; the re-encoding cutter stays the default
+    smart_cut=os.environ.get("TURBODL_SMART_CUT", "0") == "1"))
+http_cache = tools.register("cache", build_http_cache)
+fetch_engine = tools.register("fetch", build_fetch_engine)
+image_tool = tools.register("images", lambda: load_script("image_scraper").ImageScraper(
+    output_dir=os.path.join(DOWNLOADS_DIR, "images"), fetcher=fetch_engine.get(),
+    variant_policy=os.environ.get("TURBODL_IMAGE_VARIANT", "largest"),
+    max_width=int(os.environ.get("TURBODL_IMAGE_MAX_WIDTH", 0)) or None,
+    formats=[f.strip() for f in os.environ.get("TURBODL_IMAGE_FORMATS", "").split(",") if f.strip()]))
+script_tool = tools.register("scripts", lambda: load_script("javascript_scraper").JavascriptScraper(
+    output_dir=os.path.join(DOWNLOADS_DIR, "js files"), fetcher=fetch_engine.get()))
+style_tool = tools.register("styles", lambda: load_script("style_scraper").StyleScraper(
+    output_dir=os.path.join(DOWNLOADS_DIR, "style files"), fetcher=fetch_engine.get()))
+# Full-page archive: one fetch and one parse, each asset kind saved by its own tool
+page_tool = tools.register("pages", lambda: load_script("page_assets").PageAssetScraper(
+    image_tool.get(), script_tool.get(), style_tool.get(), fetcher=fetch_engine.get()))
+crawl_tool = tools.register("crawler", lambda: load_script("site_crawler").SiteCrawler(
+    page_tool.get(), fetcher=fetch_engine.get(),
+    per_host=int(os.environ.get("TURBODL_CRAWL_PER_HOST", 2)),
+    delay=float(os.environ.get("TURBODL_CRAWL_DELAY", 0))))
+converter_tool = tools.register("converter", lambda: load_script("video_format_converter").VideoFormatConverter(
+    output_dir=os.path.join(DOWNLOADS_DIR, "converted"),
+    encode_workers=int(os.environ.get("TURBODL_ENCODE_WORKERS", 0)) or None,
+    # Each ffmpeg slot gets an equal share of the cores, so concurrent jobs never oversubscribe the CPU
+    slots=scheduler.slots("ffmpeg"), slot_threads=max(1, (os.cpu_count() or 1) // POOL_SIZES["ffmpeg"])))
 
 # Global Event Loop Reference
 loop = None
@@ -57,71 +124,168 @@ async def startup_event():
     global loop
     loop = asyncio.get_running_loop()
     print(f"Captured Main Event Loop: {loop}")
+    prepare_downloads()
+    # Journal of every job, so a backend restart re-queues unfinished work
+    scheduler.store = JobStore(os.path.join(DOWNLOADS_DIR, ".jobs.sqlite"))
+    print(f"Backend up in {time.time() - PROCESS_STARTED:.2f}s, warming tools in the background")
+    # Load the tools off the request path, then pick up what the previous
+    # backend process left unfinished
+    tools.warm(then=resume_jobs)
+
+def resume_jobs():
+    try:
+        resumed = scheduler.resume(resume_actions())
+    except Exception as e:
+        print(f"[Resume] Could not resume unfinished jobs: {e}")
+        return
+    if resumed:
+        print(f"Resumed {len(resumed)} unfinished jobs")
+
+# --- Job Scheduling ---
+# Concurrent jobs per tool family, overridable through the environment
+POOL_SIZES = {
+    "ytdlp": int(os.environ.get("TURBODL_YTDLP_WORKERS", 4)),
+    "ffmpeg": int(os.environ.get("TURBODL_FFMPEG_WORKERS", 2)),
+    "scraper": int(os.environ.get("TURBODL_SCRAPER_WORKERS", 16)),
+    "analysis": int(os.environ.get("TURBODL_ANALYSIS_WORKERS", 2)),
+    # Batches run their own bounded download pool, so only a few run at once
+    "batch": int(os.environ.get("TURBODL_BATCH_WORKERS", 1)),
+}
+
+# Max progress frames per second per job; terminal frames are never throttled
+PROGRESS_MAX_RATE = float(os.environ.get("TURBODL_PROGRESS_HZ", 10))
+
+def publish_progress(job, data):
+    """Forward a job's progress update to subscribed WebSocket clients via the Main Loop"""
+    if loop and loop.is_running():
+        message = json.dumps({
+            "type": "progress",
+            "job_id": job.id,
+            "tool": job.tool,
+            "data": data
+        }, default=str)
+        loop.call_soon_threadsafe(manager.publish, job.id, message, is_terminal(data) or is_event(data))
+    else:
+        print("Error: Main loop not available for progress update")
 
-# --- WebSocket Manager ---
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            await connection.send_text(message)
-
-manager = ConnectionManager()
-
-# --- Helper for Threaded Execution ---
-def run_in_thread(target_func, *args, **kwargs):
-    def wrapper():
-        # Define a callback that talks to WebSocket via Main Loop
-        def thread_callback(data):
-            if loop and loop.is_running():
-                asyncio.run_coroutine_threadsafe(
-                    manager.broadcast(json.dumps({
-                        "type": "progress",
-                        "data": data
-                    })), loop
-                )
-            else:
-                print("Error: Main loop not available for progress update")
+def job_snapshot(job_ids=None):
+    jobs = scheduler.list_jobs()
+    return [j.to_dict() for j in jobs if job_ids is None or j.id in job_ids]
 
+manager = ConnectionManager(snapshot_provider=job_snapshot)
+# The job journal is attached at startup (see startup_event)
+scheduler = JobScheduler(pool_sizes=POOL_SIZES, progress_sink=ProgressThrottle(publish_progress, max_rate=PROGRESS_MAX_RATE))
+
+# Gauges read from live state when /metrics is scraped
+METRICS.add_collector(scheduler.collect_metrics)
+METRICS.add_collector(lambda: THREADS.set(threading.active_count()))
+
+# Job label -> (tool, method, whether it takes resume=True) for jobs re-queued after a restart.
+# Downloads continue their .part files; scrapes reuse assets already in the store.
+RESUMABLE = {
+    "download_video": (video_tool, "download_video", False),
+    "download_batch": (batch_tool, "download_batch", False),
+    "download_clip": (clip_tool, "download_clip", False),
+    "download_clips": (clip_tool, "download_clips", False),
+    "download_images": (image_tool, "download_images", True),
+    "download_javascript": (script_tool, "download_javascript", True),
+    "download_styles": (style_tool, "download_styles", True),
+    "scrape_page": (page_tool, "scrape_page", True),
+    "crawl_site": (crawl_tool, "crawl_site", True),
+    "convert_to_mp4": (converter_tool, "convert_to_mp4", False),
+    "convert_batch": (converter_tool, "convert_batch", False),
+}
+
+def resume_actions():
+    """
+    Job label -> callable for jobs re-queued after a restart. Labels whose tool failed
+    to load are left out and reported; the scheduler marks their jobs failed.
+    """
+    actions = {}
+    for label, (tool, method, resume) in RESUMABLE.items():
         try:
-            # Inject progress_callback
-            target_func(*args, **kwargs, progress_callback=thread_callback)
-            
-            # Send done if the function didn't send a final 'completed' event
-            # (Most of our scripts do, but safe to ensure)
-            
+            func = getattr(tool.get(), method)
         except Exception as e:
-            print(f"Thread Error: {e}")
-            thread_callback({"status": "error", "error": str(e)})
+            print(f"[Resume] {label} jobs cannot resume, {tool.name} failed to load: {e}")
+            continue
+        actions[label] = partial(func, resume=True) if resume else func
+    return actions
 
-    t = threading.Thread(target=wrapper)
-    t.start()
+def queued_response(job, message):
+    return {"status": job.status, "job_id": job.id, "message": message}
+
+def output_stamp():
+    # Fixed at submit time and journaled with the job, so a resumed job reuses its file names
+    return datetime.now().strftime('%Y%m%d_%H%M%S')
 
 # --- Models ---
 class AnalyzeUrlRequest(BaseModel):
     url: str
 
+class PlaylistPageRequest(BaseModel):
+    url: str
+    page: int = 0
+    page_size: int = 20
+
 class DownloadVideoRequest(BaseModel):
     video: Dict
     format_idx: int
+    priority: int = 0
+
+class BatchDownloadRequest(BaseModel):
+    videos: List[Dict] = []
+    playlist_url: Optional[str] = None
+    format_policy: str = "best"
+    workers: Optional[int] = None
+    priority: int = 0
 
 class ScrapeRequest(BaseModel):
     url: str
+    priority: int = 0
+
+class ImageScrapeRequest(ScrapeRequest):
+    # Variant choice for srcset/<picture> images; None keeps the tool's defaults
+    variant_policy: Optional[Literal["largest", "smallest", "src"]] = None
+    max_width: Optional[int] = None
+    formats: Optional[List[str]] = None
+
+class CrawlRequest(BaseModel):
+    url: str
+    max_depth: int = 2
+    max_pages: int = 100
+    # Hosts in scope (subdomains included); None keeps the crawl on the start page's origin
+    allow: Optional[List[str]] = None
+    # images | scripts | styles | fonts
+    kinds: List[str] = ["images", "scripts"]
+    respect_robots: bool = True
+    priority: int = 0
 
 class ClipRequest(BaseModel):
     url: str
+    priority: int = 0
+
+class ClipsRequest(BaseModel):
+    clips: List[Dict]
+    priority: int = 0
 
 class ConvertRequest(BaseModel):
     file_path: str
+    # high | medium | fast | ultrafast, or adaptive (uses time_budget / min_speed)
     quality: str = "high"
+    # None: chunked parallel encode for long videos; True/False forces it
+    parallel: Optional[bool] = None
+    # Adaptive only: finish within this many seconds and/or encode at least this fast (x realtime)
+    time_budget: Optional[float] = None
+    min_speed: Optional[float] = None
+    priority: int = 0
+
+class ConvertBatchRequest(BaseModel):
+    # Directory or glob pattern
+    source: str
+    quality: str = "high"
+    workers: Optional[int] = None
+    recursive: bool = False
+    priority: int = 0
 
 # --- Endpoints ---
 
@@ -129,12 +293,30 @@ class ConvertRequest(BaseModel):
 def read_root():
     return {"status": "ok", "service": "TurboDL Backend"}
 
+@app.get("/ready")
+def readiness():
+    """Which tools are loaded; endpoints work either way, a cold tool just loads on first use."""
+    return {
+        "ready": tools.ready,
+        "uptime": round(time.time() - PROCESS_STARTED, 3),
+        "warm_seconds": round(tools.warm_seconds, 3) if tools.warm_seconds is not None else None,
+        "lazy_extractors": video_tool.lazy_extractors if video_tool.ready else None,
+        "tools": tools.status(),
+    }
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus text exposition of job, download, ffmpeg and WebSocket metrics."""
+    return Response(METRICS.render(), media_type=METRICS_CONTENT_TYPE)
+
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+async def websocket_endpoint(websocket: WebSocket, job_id: Optional[str] = None):
+    # ?job_id=a,b limits the socket to those jobs; without it the client sees every job
+    job_ids = [j for j in job_id.split(",") if j] if job_id else None
+    await manager.connect(websocket, job_ids=job_ids)
     try:
         while True:
-            await websocket.receive_text()
+            await manager.handle_message(websocket, await websocket.receive_text())
     except WebSocketDisconnect:
         manager.disconnect(websocket)
 
@@ -142,38 +324,125 @@ async def websocket_endpoint(websocket: WebSocket):
 def analyze_url(req: AnalyzeUrlRequest):
     print(f"Analyzing: {req.url}")
     try:
-        videos = video_tool.get_video_info(req.url)
-        if not videos:
+        result = video_tool.analyze(req.url)
+        if not result or not result["videos"]:
             return {"found": False}
-        return {"found": True, "videos": videos}
+        # Playlists come back flat; formats are resolved per entry or per page on request
+        return {"found": True, "videos": result["videos"], "playlist": result["playlist"]}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/analyze/entry")
+def analyze_entry(req: AnalyzeUrlRequest):
+    try:
+        video = video_tool.resolve_entry(req.url)
+        if not video:
+            return {"found": False}
+        return {"found": True, "video": video}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/analyze/stream")
+def stream_playlist_page(req: PlaylistPageRequest):
+    # Resolved entries of the page arrive over the WebSocket as "entry" frames of this job
+    job = scheduler.submit("analysis", video_tool.stream_playlist, req.url, page=req.page,
+                           page_size=min(max(req.page_size, 1), 100), label="resolve_playlist")
+    return queued_response(job, "Playlist page queued")
+
+@app.get("/analyze/entries")
+def analyze_entries(url: str, page: int = 0, page_size: int = 20):
+    try:
+        result = video_tool.get_playlist_page(url, page=page, page_size=min(max(page_size, 1), 100))
+        if not result:
+            raise HTTPException(status_code=404, detail="Not a playlist")
+        return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/download")
 def start_download(req: DownloadVideoRequest):
-    run_in_thread(video_tool.download_video, req.video, req.format_idx)
-    return {"status": "started", "message": "Video download running in background"}
+    job = scheduler.submit("ytdlp", video_tool.download_video, req.video, req.format_idx,
+                           timestamp=output_stamp(), priority=req.priority)
+    return queued_response(job, "Video download queued")
+
+@app.post("/download-batch")
+def start_batch_download(req: BatchDownloadRequest):
+    if not req.videos and not req.playlist_url:
+        raise HTTPException(status_code=400, detail="Provide videos or playlist_url")
+    job = scheduler.submit("batch", batch_tool.download_batch, videos=req.videos, playlist_url=req.playlist_url,
+                           format_policy=req.format_policy, workers=req.workers, priority=req.priority)
+    response = queued_response(job, "Batch download queued")
+    response["batch_id"] = batch_tool.batch_id(req.videos, req.playlist_url, req.format_policy)
+    return response
 
 @app.post("/scrape-images")
-def start_scrape_images(req: ScrapeRequest):
-    run_in_thread(image_tool.download_images, req.url)
-    return {"status": "started", "message": "Image scrape running in background"}
+def start_scrape_images(req: ImageScrapeRequest):
+    job = scheduler.submit("scraper", image_tool.download_images, req.url, priority=req.priority,
+                           variant_policy=req.variant_policy, max_width=req.max_width, formats=req.formats)
+    return queued_response(job, "Image scrape queued")
 
 @app.post("/scrape-scripts")
 def start_scrape_scripts(req: ScrapeRequest):
-    run_in_thread(script_tool.download_javascript, req.url)
-    return {"status": "started", "message": "Script scrape running in background"}
+    job = scheduler.submit("scraper", script_tool.download_javascript, req.url, priority=req.priority)
+    return queued_response(job, "Script scrape queued")
+
+@app.post("/scrape-styles")
+def start_scrape_styles(req: ScrapeRequest):
+    job = scheduler.submit("scraper", style_tool.download_styles, req.url, priority=req.priority)
+    return queued_response(job, "Style scrape queued")
+
+@app.post("/scrape-all")
+def start_scrape_all(req: ScrapeRequest):
+    job = scheduler.submit("scraper", page_tool.scrape_page, req.url, priority=req.priority)
+    return queued_response(job, "Page scrape queued")
+
+@app.post("/crawl")
+def start_crawl(req: CrawlRequest):
+    job = scheduler.submit("scraper", crawl_tool.crawl_site, req.url, max_depth=req.max_depth,
+                           max_pages=req.max_pages, allow=req.allow, kinds=req.kinds,
+                           respect_robots=req.respect_robots, priority=req.priority)
+    return queued_response(job, "Site crawl queued")
 
 @app.post("/download-clip")
 def start_clip_download(req: ClipRequest):
-    run_in_thread(clip_tool.download_clip, req.url)
-    return {"status": "started", "message": "Clip download running in background"}
+    job = scheduler.submit("ytdlp", clip_tool.download_clip, req.url, timestamp=output_stamp(), priority=req.priority)
+    return queued_response(job, "Clip download queued")
+
+@app.post("/download-clips")
+def start_clips_download(req: ClipsRequest):
+    if not req.clips:
+        raise HTTPException(status_code=400, detail="No clips given")
+    job = scheduler.submit("ytdlp", clip_tool.download_clips, req.clips, timestamp=output_stamp(),
+                           priority=req.priority)
+    return queued_response(job, "Clip batch queued")
 
 @app.post("/convert")
 def start_conversion(req: ConvertRequest):
-    run_in_thread(converter_tool.convert_to_mp4, req.file_path, quality_preset=req.quality)
-    return {"status": "started", "message": "Conversion running in background"}
+    job = scheduler.submit("ffmpeg", converter_tool.convert_to_mp4, req.file_path, quality_preset=req.quality,
+                           parallel=req.parallel, time_budget=req.time_budget, min_speed=req.min_speed,
+                           priority=req.priority)
+    return queued_response(job, "Conversion queued")
+
+@app.post("/convert-batch")
+def start_batch_conversion(req: ConvertBatchRequest):
+    job = scheduler.submit("ffmpeg", converter_tool.convert_batch, req.source, quality_preset=req.quality,
+                           workers=req.workers, recursive=req.recursive, priority=req.priority)
+    return queued_response(job, "Batch conversion queued")
+
+@app.get("/jobs")
+def list_jobs(tool: Optional[str] = None, status: Optional[str] = None):
+    jobs = scheduler.list_jobs(tool=tool, status=status)
+    return {"jobs": [j.to_dict() for j in jobs], "pools": scheduler.stats()}
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = scheduler.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="127.0.0.1", port=8000)
+    uvicorn.run(app, host="127.0.0.1", port=int(os.environ.get("TURBODL_PORT", 8000)))
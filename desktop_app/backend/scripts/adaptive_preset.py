@@ -0,0 +1,136 @@
+"""
+Adaptive Preset
+
+Chooses the x264 preset and CRF from a deadline instead of a fixed
+quality tier. A few seconds from the middle of the actual input are
+encoded at a reference preset to measure throughput on this machine and
+this content. The other presets are predicted from their typical cost
+relative to it, and the slowest one that still meets the required speed
+is used. While the encode runs, the predicted finish is checked against
+the deadline.
+
+Dependencies:
+    - ffmpeg
+"""
+
+import time
+from datetime import datetime
+
+try:
+    from .ffmpeg_progress import run_ffmpeg
+except ImportError:
+    from ffmpeg_progress import run_ffmpeg
+
+# x264 presets from slowest to fastest: (preset, CRF, typical speed relative to 'medium').
+# Faster presets compress worse, so their CRF is raised a little to hold the file size.
+X264_LADDER = [
+    ('slow', '18', 0.55),
+    ('medium', '20', 1.0),
+    ('fast', '21', 1.3),
+    ('faster', '22', 1.7),
+    ('veryfast', '22', 2.6),
+    ('superfast', '23', 3.6),
+    ('ultrafast', '25', 5.0),
+]
+RELATIVE_SPEED = {preset: speed for preset, _, speed in X264_LADDER}
+
+REFERENCE_PRESET = 'medium'
+SAMPLE_SECONDS = 6
+# Plan to use only this share of the remaining budget; the sample is short and content varies
+SAFETY_MARGIN = 0.85
+# Restart on a faster preset only while little work would be thrown away
+RESTART_BEFORE_PERCENT = 25
+RESTART_AFTER_PERCENT = 3
+
+
+def required_speed(duration, time_budget=None, min_speed=None, elapsed=0.0):
+    """Realtime multiplier needed to encode ``duration`` seconds within the budget."""
+    speeds = [min_speed or 0.0]
+    if time_budget:
+        remaining = max(time_budget - elapsed, 1e-3)
+        speeds.append(duration / remaining)
+    return max(speeds)
+
+
+def choose_preset(sample_speed, required, reference=REFERENCE_PRESET, margin=SAFETY_MARGIN, fastest_first=None):
+    """
+    Slowest preset predicted to reach ``required`` speed.
+
+    ``sample_speed`` is the speed measured at ``reference``. Only presets
+    at or after ``fastest_first`` in the ladder are considered. When
+    none is fast enough the fastest is returned with ``meets`` False.
+    """
+    ladder = X264_LADDER
+    if fastest_first:
+        ladder = ladder[[p for p, _, _ in ladder].index(fastest_first):]
+    choice = ladder[-1]
+    for entry in ladder:
+        predicted = sample_speed * entry[2] / RELATIVE_SPEED[reference]
+        if predicted * margin >= required:
+            choice = entry
+            break
+    preset, crf, relative = choice
+    predicted = sample_speed * relative / RELATIVE_SPEED[reference]
+    return {
+        'preset': preset,
+        'crf': crf,
+        'predicted_speed': round(predicted, 3),
+        'required_speed': round(required, 3),
+        'meets': predicted * margin >= required,
+    }
+
+
+def faster_preset(preset):
+    """Next faster preset in the ladder, or None at ultrafast."""
+    names = [p for p, _, _ in X264_LADDER]
+    i = names.index(preset)
+    return names[i + 1] if i + 1 < len(names) else None
+
+
+def measure_speed(input_path, duration, preset=REFERENCE_PRESET, threads=None, seconds=SAMPLE_SECONDS):
+    """
+    Encode a short sample from the middle of the input and return its speed
+    (media seconds per wall second). Start-up is included, so the
+    figure errs on the slow side.
+    """
+    seconds = min(seconds, duration) if duration else seconds
+    start = max(0.0, (duration or 0) / 2 - seconds / 2)
+    cmd = ['ffmpeg', '-ss', str(start), '-i', str(input_path), '-t', str(seconds),
+           '-map', '0:v:0', '-an', '-c:v', 'libx264', '-preset', preset, '-crf', '20']
+    if threads:
+        cmd += ['-threads', str(threads)]
+    cmd += ['-f', 'null', '-']
+    started = time.time()
+    final = run_ffmpeg(cmd, duration=seconds)
+    wall = max(time.time() - started, 1e-3)
+    encoded = (final or {}).get('out_seconds') or seconds
+    return encoded / wall
+
+
+class DeadlineTracker:
+    """
+    Predicted finish of a running encode against its deadline.
+
+    Args:
+        deadline (float): Epoch seconds the encode should finish by, or None.
+        started (float): Epoch seconds the job started (the budget's origin).
+    """
+
+    def __init__(self, deadline=None, started=None):
+        self.deadline = deadline
+        self.started = started or time.time()
+
+    def check(self, eta):
+        """{predicted_finish, deadline, on_track} for an ETA in seconds."""
+        if eta is None:
+            return {'predicted_finish': None, 'deadline': _clock(self.deadline), 'on_track': None}
+        finish = time.time() + eta
+        return {
+            'predicted_finish': _clock(finish),
+            'deadline': _clock(self.deadline),
+            'on_track': None if self.deadline is None else finish <= self.deadline,
+        }
+
+
+def _clock(epoch):
+    return datetime.fromtimestamp(epoch).isoformat(timespec='seconds') if epoch else None
@@ -10,47 +10,309 @@ Dependencies:
 """
 
 import yt_dlp
+from yt_dlp.extractor import gen_extractor_classes
+import copy
 import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 import time
 
+try:
+    from .metrics import download_byte_hook
+    from .parallel_download import ParallelYoutubeDL, parallel_opts
+except ImportError:
+    from metrics import download_byte_hook
+    from parallel_download import ParallelYoutubeDL, parallel_opts
+
+try:
+    # True when yt-dlp resolves extractors from its generated lazy table
+    # instead of importing every extractor module
+    from yt_dlp.globals import LAZY_EXTRACTORS
+except ImportError:  # older yt-dlp
+    LAZY_EXTRACTORS = None
+
+# Query parameters that never change what a URL points at
+TRACKING_PARAMS = {'si', 'feature', 'pp', 'fbclid', 'gclid', 'igshid', 'ref', 'ref_src'}
+
+
+def normalize_url(url):
+    """Canonical form of a URL for cache keys: lowercased host, no fragment or tracking params, sorted query."""
+    parts = urlsplit(url.strip())
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                   if k not in TRACKING_PARAMS and not k.startswith('utm_'))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or '/', urlencode(query), ''))
+
+
+class _Extraction:
+    """An extraction in progress that concurrent callers for the same key wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.info = None
+        self.error = None
+
+
 class VideoDownloader:
-    def __init__(self, output_dir="downloads"):
+    # YoutubeDL subclass used for downloads (ranged parallel fetching); batches reuse it
+    ydl_class = ParallelYoutubeDL
+
+    def __init__(self, output_dir="downloads", cache_ttl=1800, cache_size=64, playlist_cache_size=8, connections=8):
         self.output_dir = output_dir
+        # Parallel connections per download: concurrent DASH/HLS fragments,
+        # or byte ranges of a progressive file
+        self.connections = connections
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
 
-    def get_video_info(self, url):
-        """Extract video information from URL"""
+        # Analysis cache: key -> (expires_at, info dict), kept in LRU order.
+        # The TTL stays well under the lifetime of signed stream URLs.
+        # Flat playlist listings have their own cache, so resolving many
+        # entries never evicts the listing they came from.
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.playlist_cache_size = playlist_cache_size
+        self._info_cache = OrderedDict()
+        self._playlist_cache = OrderedDict()
+        self._inflight = {}
+        self._cache_lock = threading.Lock()
+        self._extractors = None
+
+    def warm(self):
+        """Load the extractor table and compile its URL patterns ahead of the first /analyze."""
+        self._cache_key('https://example.invalid/warmup')
+        if LAZY_EXTRACTORS is not None and not LAZY_EXTRACTORS.value:
+            print("[Warning] yt-dlp is importing every extractor module (no lazy_extractors); startup is slower")
+
+    @property
+    def lazy_extractors(self):
+        return LAZY_EXTRACTORS.value if LAZY_EXTRACTORS is not None else None
+
+    def _cache_key(self, url):
+        """Extractor video ID when a site extractor recognizes the URL, else the normalized URL."""
+        if self._extractors is None:
+            self._extractors = [ie for ie in gen_extractor_classes() if ie.ie_key() != 'Generic']
+        for ie in self._extractors:
+            if ie.suitable(url):
+                video_id = ie.get_temp_id(url)
+                if video_id:
+                    return f"{ie.ie_key()}:{video_id}"
+                break
+        return normalize_url(url)
+
+    def _cache_get(self, key):
+        # Caller holds _cache_lock
+        for cache in (self._info_cache, self._playlist_cache):
+            item = cache.get(key)
+            if not item:
+                continue
+            expires_at, info = item
+            if expires_at < time.time():
+                del cache[key]
+                return None
+            cache.move_to_end(key)
+            return info
+        return None
+
+    def _cache_put(self, info, *urls):
+        keys = {self._cache_key(u) for u in urls if u}
+        if info.get('extractor_key') and info.get('id'):
+            keys.add(f"{info['extractor_key']}:{info['id']}")
+        if 'entries' in info:
+            cache, limit = self._playlist_cache, self.playlist_cache_size
+        else:
+            cache, limit = self._info_cache, self.cache_size
+        expires_at = time.time() + self.cache_ttl
+        with self._cache_lock:
+            for key in keys:
+                cache[key] = (expires_at, info)
+                cache.move_to_end(key)
+            while len(cache) > limit:
+                cache.popitem(last=False)
+
+    def cached_info(self, url):
+        """Cached extraction result for ``url`` if still fresh, without extracting."""
+        key = self._cache_key(url)
+        with self._cache_lock:
+            return self._cache_get(key)
+
+    def extract_info(self, url):
+        """
+        yt-dlp ``extract_info`` with a TTL/LRU cache and single-flight.
+
+        Concurrent calls for the same video share one extraction; later calls
+        within the TTL reuse its result. Playlists and channels are extracted
+        flat (titles and IDs only); entries are resolved on demand.
+        """
+        key = self._cache_key(url)
+        with self._cache_lock:
+            info = self._cache_get(key)
+            if info is not None:
+                return info
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Extraction()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error:
+                raise flight.error
+            return flight.info
+
         try:
             ydl_opts = {
                 'quiet': True,
                 'no_warnings': True,
-                'extract_flat': False, # We need full info to get formats
+                # Single videos come back with formats; playlist entries stay flat
+                'extract_flat': 'in_playlist',
             }
-
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
                 print(f"Analyzing URL: {url}")
-                info = ydl.extract_info(url, download=False)
-                
-                if not info:
-                    return None
-
-                # Handle playlists vs single video
-                if 'entries' in info:
-                    # It's a playlist or search result
-                    videos = []
-                    for entry in info['entries']:
-                        if entry:
-                            videos.append(self._process_video_entry(entry))
-                    return videos
-                else:
-                    return [self._process_video_entry(info)]
+                flight.info = ydl.extract_info(url, download=False)
+
+            if flight.info:
+                self._cache_put(flight.info, url, flight.info.get('webpage_url'))
+                # Some extractors return fully resolved entries; cache those for their downloads
+                for entry in flight.info.get('entries') or []:
+                    if entry and entry.get('formats'):
+                        self._cache_put(entry, entry.get('webpage_url'))
+            return flight.info
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._cache_lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def analyze(self, url):
+        """
+        Analyze a URL without resolving playlist entries.
+
+        Returns ``{'videos': [...], 'playlist': {...} or None}``. For a single
+        video the one entry carries its formats. For a playlist or channel
+        the entries are flat (``lazy: True``, no formats) and ``playlist``
+        holds its title and size; use ``resolve_entry``,
+        ``get_playlist_page`` or ``stream_playlist`` to fill in formats.
+        """
+        info = self.extract_info(url)
+        if not info:
+            return None
+
+        if 'entries' not in info:
+            return {'videos': [self._process_video_entry(info)], 'playlist': None}
+
+        entries = [e for e in info['entries'] if e]
+        videos = [
+            self._process_video_entry(e) if e.get('formats') else self._process_flat_entry(e, i)
+            for i, e in enumerate(entries)
+        ]
+        playlist = {
+            'id': info.get('id'),
+            'title': info.get('title', 'Unknown Playlist'),
+            'uploader': info.get('uploader', 'Unknown'),
+            'count': len(videos),
+            'url': url,
+        }
+        return {'videos': videos, 'playlist': playlist}
+
+    def get_video_info(self, url):
+        """Extract video information from URL"""
+        try:
+            result = self.analyze(url)
+            return result['videos'] if result else None
 
         except Exception as e:
             print(f"Error extracting video info: {str(e)}")
             return None
 
+    def resolve_entry(self, url):
+        """Full info (with formats) for one playlist entry URL."""
+        info = self.extract_info(url)
+        return self._process_video_entry(info) if info else None
+
+    def get_playlist_page(self, url, page=0, page_size=20, workers=4):
+        """
+        Resolve formats for one page of a playlist's entries.
+
+        The flat listing comes from the playlist cache, which resolved
+        entries do not evict, so paging does not re-list the playlist
+        while the listing is within its TTL.
+        """
+        result = self.analyze(url)
+        if not result or not result['playlist']:
+            return None
+        entries = result['videos'][page * page_size:(page + 1) * page_size]
+        resolved = list(entries)
+
+        def resolve(item):
+            i, entry = item
+            return i, (self.resolve_entry(entry['url']) if entry.get('lazy') else entry)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for i, video in pool.map(resolve, enumerate(entries)):
+                if video:
+                    video['index'] = entries[i].get('index', page * page_size + i)
+                    resolved[i] = video
+
+        return {
+            'playlist': result['playlist'],
+            'page': page,
+            'page_size': page_size,
+            'has_more': (page + 1) * page_size < result['playlist']['count'],
+            'videos': resolved,
+        }
+
+    def stream_playlist(self, url, progress_callback=None, page=0, page_size=20, workers=4):
+        """
+        Resolve one page of playlist entries in the background, reporting each
+        one as an ``entry`` progress event as soon as it is ready.
+        """
+        result = self.analyze(url)
+        if not result or not result['playlist']:
+            return 0
+        entries = result['videos'][page * page_size:(page + 1) * page_size]
+        lazy = [v for v in entries if v.get('lazy')]
+        total = len(lazy)
+        done = 0
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(self.resolve_entry, v['url']): v for v in lazy}
+            for future in as_completed(futures):
+                entry = futures[future]
+                done += 1
+                try:
+                    video = future.result()
+                except Exception as e:
+                    print(f"Error resolving {entry['url']}: {e}")
+                    video = None
+                if video and progress_callback:
+                    video['index'] = entry['index']
+                    progress_callback({"status": "entry", "index": entry['index'], "current": done, "total": total, "video": video})
+
+        if progress_callback:
+            progress_callback({"status": "completed", "count": done, "page": page,
+                               "message": f"Resolved {done} playlist entries."})
+        return done
+
+    def _process_flat_entry(self, entry, index):
+        """Lightweight placeholder for a playlist entry whose formats are not resolved yet"""
+        return {
+            'title': entry.get('title') or entry.get('id') or 'Unknown Title',
+            'id': entry.get('id'),
+            'duration': entry.get('duration') or 0,
+            'uploader': entry.get('uploader') or entry.get('channel') or 'Unknown',
+            'upload_date': entry.get('upload_date', ''),
+            'view_count': entry.get('view_count') or 0,
+            'url': entry.get('webpage_url') or entry.get('url', ''),
+            'index': index,
+            'lazy': True,
+            'formats': [],
+        }
+
     def _process_video_entry(self, info):
         """Process individual video entry"""
         video_data = {
@@ -104,8 +366,13 @@ class VideoDownloader:
              return desc + " (Audio Only)"
         return desc or 'Unknown'
 
-    def download_video(self, video_data, format_idx, progress_callback=None):
-        """Download selected video with specific format or best available"""
+    def download_video(self, video_data, format_idx, progress_callback=None, timestamp=None):
+        """
+        Download selected video with specific format or best available.
+
+        ``timestamp`` fixes the output name, so a job resumed after a restart
+        writes to the same file and continues its ``.part`` download.
+        """
         try:
             url = video_data['url']
             title = video_data['title']
@@ -138,7 +405,7 @@ class VideoDownloader:
             print(f"Downloading '{title}' with format: {format_str}")
             
             # Timestamp for uniqueness
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            timestamp = timestamp or datetime.now().strftime('%Y%m%d_%H%M%S')
             
             # Define Hooks
             def progress_hook(d):
@@ -166,6 +433,7 @@ class VideoDownloader:
                             "percent": percent,
                             "speed_mb": speed_mb,
                             "eta": eta_str,
+                            "connections": d.get('connections'),
                             "filename": d.get('filename', 'downloading...')
                         })
                 
@@ -178,17 +446,25 @@ class VideoDownloader:
                              "message": "Merging formats..."
                          })
 
+            # Reuse the /analyze extraction when we have it instead of extracting again
+            cached = self.cached_info(url)
+
             ydl_opts = {
                 'format': format_str,
                 'outtmpl': os.path.join(self.output_dir, f'%(title)s_{timestamp}.%(ext)s'),
-                'progress_hooks': [progress_hook],
+                'progress_hooks': [progress_hook, download_byte_hook('ytdlp')],
                 'quiet': False,
                 'no_warnings': True,
+                'continuedl': True,
                 # 'merge_output_format': 'mp4', # Optional: force mp4 container
+                **parallel_opts(self.connections),
             }
 
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
+            with self.ydl_class(ydl_opts) as ydl:
+                if cached:
+                    ydl.process_ie_result(copy.deepcopy(cached), download=True)
+                else:
+                    ydl.download([url])
                 
             print(f"[Success] '{title}' processed successfully.")
 
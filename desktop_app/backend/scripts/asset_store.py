@@ -0,0 +1,294 @@
+"""
+Asset Store
+
+Content-addressed blob storage for scraped assets.
+
+Every downloaded body is stored once under ``blobs/<aa>/<sha256>`` no
+matter how many URLs, sites or scrape runs produce it. A SQLite index maps
+each URL to its blob (with the HTTP validators needed to check it later)
+and each human-readable file in the downloads folders to the blob it
+points at. Those friendly files are reflinks or hard links, so they take
+no extra space.
+
+The store keeps a running total of its blob bytes, so the LRU budget check
+costs nothing until the budget is crossed. Callers pin a blob while they
+link it, and eviction leaves pinned blobs alone.
+"""
+
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+FICLONE = 0x40049409  # Linux ioctl for copy-on-write clones (btrfs, xfs)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS assets (
+    url TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    content_type TEXT,
+    ext TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    fetched_at REAL,
+    expires_at REAL,
+    last_access REAL
+);
+CREATE TABLE IF NOT EXISTS links (
+    path TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    url TEXT
+);
+CREATE INDEX IF NOT EXISTS links_sha256 ON links (sha256);
+"""
+
+# Columns added after the first release of the index
+MIGRATIONS = {
+    'expires_at': 'ALTER TABLE assets ADD COLUMN expires_at REAL',
+    'last_access': 'ALTER TABLE assets ADD COLUMN last_access REAL',
+}
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class AssetStore:
+    """
+    Blob store plus URL/filename index rooted at ``root``.
+
+    Args:
+        root (str): Store directory (blobs, temp files and index.sqlite live here).
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.blob_dir = os.path.join(root, 'blobs')
+        self.tmp_dir = os.path.join(root, 'tmp')
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._pins = {}
+        # Blobs released while pinned; deleted when their last pin goes
+        self._deferred = set()
+        self._sweep_tmp()
+        self._db = sqlite3.connect(os.path.join(root, 'index.sqlite'), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock:
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.executescript(SCHEMA)
+            columns = {row['name'] for row in self._db.execute('PRAGMA table_info(assets)')}
+            for column, ddl in MIGRATIONS.items():
+                if column not in columns:
+                    self._db.execute(ddl)
+            self._db.execute('CREATE INDEX IF NOT EXISTS assets_last_access ON assets (last_access)')
+            self._db.execute('CREATE INDEX IF NOT EXISTS assets_sha256 ON assets (sha256)')
+            self._db.commit()
+            self._total = self._total_size()
+
+    def _sweep_tmp(self):
+        """Remove temp files left behind by downloads interrupted in an earlier run."""
+        for name in os.listdir(self.tmp_dir):
+            if name.endswith('.part'):
+                try:
+                    os.remove(os.path.join(self.tmp_dir, name))
+                except OSError:
+                    pass
+
+    def blob_path(self, sha256):
+        return os.path.join(self.blob_dir, sha256[:2], sha256)
+
+    def temp_path(self):
+        """A temp file path on the same filesystem as the blobs (atomic rename)."""
+        return os.path.join(self.tmp_dir, f"{uuid.uuid4().hex}.part")
+
+    def lookup(self, url):
+        """Index record for ``url`` if its blob is still on disk, else None."""
+        with self._lock:
+            row = self._db.execute('SELECT * FROM assets WHERE url = ?', (url,)).fetchone()
+        if row and os.path.exists(self.blob_path(row['sha256'])):
+            return dict(row)
+        return None
+
+    @contextmanager
+    def pinned(self, sha256):
+        """
+        Keep the blob ``sha256`` from being evicted inside the block.
+
+        Yields whether the blob is on disk; once pinned it stays there, so a
+        caller can look a blob up (or add it) and link it without racing
+        ``evict_lru``.
+        """
+        with self._lock:
+            self._pins[sha256] = self._pins.get(sha256, 0) + 1
+            present = os.path.exists(self.blob_path(sha256))
+        try:
+            yield present
+        finally:
+            with self._lock:
+                self._pins[sha256] -= 1
+                if not self._pins[sha256]:
+                    del self._pins[sha256]
+                    if sha256 in self._deferred:
+                        self._deferred.discard(sha256)
+                        # Recorded again while pinned: the blob is in use after all
+                        if not self._referenced(sha256):
+                            self._remove_blob(sha256)
+
+    def add_blob(self, tmp_path, sha256):
+        """Move a finished temp file into the store, or drop it if the blob already exists."""
+        blob = self.blob_path(sha256)
+        if os.path.exists(blob):
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            os.replace(tmp_path, blob)
+        return blob
+
+    def record(self, url, sha256, size, content_type=None, ext=None, etag=None, last_modified=None, expires_at=None):
+        now = time.time()
+        with self._lock:
+            old = self._db.execute('SELECT sha256, size FROM assets WHERE url = ?', (url,)).fetchone()
+            if not self._referenced(sha256):
+                self._total += size
+            self._db.execute(
+                'INSERT OR REPLACE INTO assets '
+                '(url, sha256, size, content_type, ext, etag, last_modified, fetched_at, expires_at, last_access) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (url, sha256, size, content_type, ext, etag, last_modified, now, expires_at, now),
+            )
+            if old and old['sha256'] != sha256:
+                self._release(old['sha256'], old['size'])
+            self._db.commit()
+
+    def touch(self, url, expires_at=None):
+        """Mark ``url`` as used now, optionally extending its freshness."""
+        with self._lock:
+            if expires_at is None:
+                self._db.execute('UPDATE assets SET last_access = ? WHERE url = ?', (time.time(), url))
+            else:
+                self._db.execute('UPDATE assets SET last_access = ?, expires_at = ? WHERE url = ?',
+                                 (time.time(), expires_at, url))
+            self._db.commit()
+
+    def total_size(self):
+        """Bytes held by distinct blobs referenced from the index."""
+        with self._lock:
+            return self._total
+
+    def _total_size(self):
+        row = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT sha256, size FROM assets)').fetchone()
+        return row[0]
+
+    def _referenced(self, sha256):
+        return self._db.execute('SELECT 1 FROM assets WHERE sha256 = ? LIMIT 1', (sha256,)).fetchone() is not None
+
+    def _release(self, sha256, size):
+        """
+        Drop a blob no URL references any more; returns bytes freed. A pinned
+        blob is deleted when it is unpinned.
+        """
+        if self._referenced(sha256):
+            return 0
+        self._total -= size
+        if sha256 in self._pins:
+            self._deferred.add(sha256)
+        else:
+            self._remove_blob(sha256)
+        return size
+
+    def _remove_blob(self, sha256):
+        try:
+            os.remove(self.blob_path(sha256))
+        except FileNotFoundError:
+            pass
+
+    def evict_lru(self, max_bytes):
+        """
+        Forget least-recently-used URLs until the blobs fit in ``max_bytes``.
+
+        A blob file is deleted once no URL references it; pinned blobs and
+        their URLs are skipped. Friendly files are left alone: hard links and
+        reflinks keep their own data. Returns the number of bytes freed.
+        """
+        freed = 0
+        with self._lock:
+            if self._total <= max_bytes:
+                return 0
+            rows = self._db.execute('SELECT url, sha256, size FROM assets ORDER BY last_access ASC').fetchall()
+            for row in rows:
+                if self._total <= max_bytes:
+                    break
+                if row['sha256'] in self._pins:
+                    continue
+                self._db.execute('DELETE FROM assets WHERE url = ?', (row['url'],))
+                freed += self._release(row['sha256'], row['size'])
+            self._db.commit()
+        return freed
+
+    def linked_sha256(self, path):
+        """Blob hash a friendly file was created from, if the index knows it."""
+        with self._lock:
+            row = self._db.execute('SELECT sha256 FROM links WHERE path = ?', (os.path.abspath(path),)).fetchone()
+        return row['sha256'] if row else None
+
+    def link(self, sha256, dest_path, url=None):
+        """
+        Materialize a blob at ``dest_path``.
+
+        Tries a copy-on-write reflink, then a hard link, then a plain copy.
+        The link is built next to the destination and renamed over it.
+        """
+        blob = self.blob_path(sha256)
+        tmp = f"{dest_path}.{uuid.uuid4().hex[:8]}.part"
+        if not self._reflink(blob, tmp):
+            try:
+                os.link(blob, tmp)
+            except OSError:
+                shutil.copyfile(blob, tmp)
+        os.replace(tmp, dest_path)
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO links (path, sha256, url) VALUES (?, ?, ?)',
+                (os.path.abspath(dest_path), sha256, url),
+            )
+            self._db.commit()
+        return dest_path
+
+    def unlink(self, path):
+        """Delete a friendly file and forget its link; the blob stays."""
+        with self._lock:
+            self._db.execute('DELETE FROM links WHERE path = ?', (os.path.abspath(path),))
+            self._db.commit()
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _reflink(src, dst):
+        if fcntl is None:
+            return False
+        try:
+            with open(src, 'rb') as s, open(dst, 'wb') as d:
+                fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+            return True
+        except OSError:
+            if os.path.exists(dst):
+                os.remove(dst)
+            return False
@@ -0,0 +1,263 @@
+"""
+Batch Video Downloader
+
+Downloads many videos (or a whole playlist) through a bounded worker pool.
+Each worker keeps one YoutubeDL instance for its whole run and all workers
+share one cookie jar, so a batch pays the setup cost once per worker rather
+than once per video. Workers use the video tool's downloader class, so
+items get the same multi-connection fetching as single downloads, and each
+item holds a yt-dlp slot while it downloads, so a batch never exceeds the
+scheduler's yt-dlp cap. A per-batch manifest records finished items so a
+resubmitted batch skips them.
+
+Dependencies:
+    - yt-dlp
+    - ffmpeg (required for merging high-quality streams)
+"""
+
+import copy
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+
+try:
+    from .metrics import download_byte_hook
+    from .parallel_download import parallel_opts
+except ImportError:
+    from metrics import download_byte_hook
+    from parallel_download import parallel_opts
+
+
+def format_for_policy(policy):
+    """
+    Translate a format policy into a yt-dlp format string.
+
+    Accepts ``best``, ``audio``, ``best<=1080p`` / ``best<=720`` (height cap),
+    or any raw yt-dlp format string.
+    """
+    policy = (policy or 'best').strip()
+    if policy == 'best':
+        return 'bestvideo+bestaudio/best'
+    if policy == 'audio':
+        return 'bestaudio/best'
+    capped = re.fullmatch(r'best\s*(?:<=|≤)\s*(\d+)p?', policy)
+    if capped:
+        height = capped.group(1)
+        return f'bestvideo[height<=?{height}]+bestaudio/best[height<=?{height}]'
+    return policy
+
+
+class BatchManifest:
+    """JSON manifest of one batch, rewritten atomically after every item."""
+
+    def __init__(self, path, batch_id, format_policy):
+        self.path = path
+        self._lock = threading.Lock()
+        self.data = {'batch_id': batch_id, 'format_policy': format_policy, 'items': {}, 'created_at': time.time()}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.data = json.load(f)
+
+    def is_done(self, url):
+        item = self.data['items'].get(url)
+        return bool(item and item.get('status') == 'completed' and item.get('filepath') and os.path.exists(item['filepath']))
+
+    def update(self, url, **fields):
+        with self._lock:
+            self.data['items'].setdefault(url, {}).update(fields)
+            self.data['updated_at'] = time.time()
+            tmp = f"{self.path}.tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f, indent=2)
+            os.replace(tmp, self.path)
+
+
+class BatchDownloader:
+    """
+    Args:
+        video_tool (VideoDownloader): Source of cached analysis results and playlist listings.
+        output_dir (str): Where batch downloads and manifests are written.
+        workers (int): Default number of concurrent downloads per batch.
+        slots (threading.Semaphore): yt-dlp slots shared with the scheduler
+            (``JobScheduler.slots('ytdlp')``); each item in flight holds one.
+    """
+
+    def __init__(self, video_tool, output_dir="downloads", workers=4, slots=None):
+        self.video_tool = video_tool
+        self.output_dir = output_dir
+        self.workers = workers
+        self.slots = slots
+        self.manifest_dir = os.path.join(output_dir, '.batches')
+        os.makedirs(self.manifest_dir, exist_ok=True)
+
+    @staticmethod
+    def batch_id(videos=None, playlist_url=None, format_policy='best'):
+        """Stable ID for a batch, so resubmitting the same batch finds its manifest."""
+        source = playlist_url or '\n'.join(sorted(v['url'] for v in videos or []))
+        return hashlib.sha1(f"{source}\n{format_policy}".encode()).hexdigest()[:16]
+
+    def download_batch(self, videos=None, playlist_url=None, format_policy='best', workers=None, progress_callback=None):
+        """
+        Download every video in ``videos`` (dicts with a ``url`` and an
+        optional per-item ``format``) or every entry of ``playlist_url``.
+
+        Progress events aggregate the whole batch: items done, bytes
+        downloaded and overall throughput.
+        """
+        batch_id = self.batch_id(videos, playlist_url, format_policy)
+        manifest = BatchManifest(os.path.join(self.manifest_dir, f"{batch_id}.json"), batch_id, format_policy)
+
+        if playlist_url:
+            if progress_callback:
+                progress_callback({"status": "analyzing", "message": f"Listing playlist {playlist_url}..."})
+            result = self.video_tool.analyze(playlist_url)
+            videos = result['videos'] if result else []
+
+        items = [v for v in videos or [] if v.get('url')]
+        pending = [v for v in items if not manifest.is_done(v['url'])]
+        skipped = len(items) - len(pending)
+        if progress_callback:
+            progress_callback({
+                "status": "found",
+                "count": len(items),
+                "message": f"Batch {batch_id}: {len(pending)} to download, {skipped} already done."
+            })
+
+        default_format = format_for_policy(format_policy)
+        stats = {'done': skipped, 'failed': 0, 'bytes': 0, 'item_bytes': {}}
+        stats_lock = threading.Lock()
+        started = time.time()
+        local = threading.local()
+        shared = {'cookiejar': None}
+        ydls = []
+
+        def report(title):
+            if not progress_callback:
+                return
+            with stats_lock:
+                total_bytes = stats['bytes'] + sum(stats['item_bytes'].values())
+                done = stats['done'] + stats['failed']
+            elapsed = max(time.time() - started, 1e-6)
+            progress_callback({
+                "status": "downloading",
+                "percent": (done / len(items)) * 100 if items else 100,
+                "items_done": done,
+                "items_total": len(items),
+                "bytes": total_bytes,
+                "speed_mb": total_bytes / elapsed / 1024 / 1024,
+                "message": f"[{done}/{len(items)}] {title}"
+            })
+
+        def progress_hook(d):
+            url = getattr(local, 'url', None)
+            if url is None:
+                return
+            with stats_lock:
+                if d['status'] == 'downloading':
+                    stats['item_bytes'][url] = local.finished_bytes + (d.get('downloaded_bytes') or 0)
+                elif d['status'] == 'finished':
+                    local.finished_bytes += d.get('downloaded_bytes') or d.get('total_bytes') or 0
+                    stats['item_bytes'][url] = local.finished_bytes
+            report(getattr(local, 'title', ''))
+
+        count_bytes = download_byte_hook('ytdlp')
+
+        def worker_ydl():
+            # One YoutubeDL per worker thread, reused for every item it handles
+            ydl = getattr(local, 'ydl', None)
+            if ydl is None:
+                ydl = self.video_tool.ydl_class({
+                    'format': default_format,
+                    'outtmpl': os.path.join(self.output_dir, '%(title)s_%(id)s.%(ext)s'),
+                    'progress_hooks': [progress_hook, count_bytes],
+                    'quiet': True,
+                    'no_warnings': True,
+                    'noprogress': True,
+                    'continuedl': True,
+                    **parallel_opts(self.video_tool.connections),
+                })
+                with stats_lock:
+                    # Closed once the pool has shut down
+                    ydls.append(ydl)
+                    if shared['cookiejar'] is None:
+                        shared['cookiejar'] = ydl.cookiejar
+                    else:
+                        ydl.cookiejar = shared['cookiejar']
+                local.ydl = ydl
+            return ydl
+
+        def download_one(video):
+            with self.slots or nullcontext():
+                return download_item(video)
+
+        def download_item(video):
+            url = video['url']
+            ydl = worker_ydl()
+            local.url = url
+            local.title = video.get('title', url)
+            local.finished_bytes = 0
+            item_format = video.get('format')
+            ydl.format_selector = ydl.build_format_selector(format_for_policy(item_format) if item_format else default_format)
+            manifest.update(url, status='downloading', title=local.title)
+            try:
+                cached = self.video_tool.cached_info(url)
+                if cached:
+                    info = ydl.process_ie_result(copy.deepcopy(cached), download=True)
+                else:
+                    info = ydl.extract_info(url, download=True)
+                downloads = (info or {}).get('requested_downloads') or [{}]
+                filepath = downloads[0].get('filepath') or (info or {}).get('filepath')
+                manifest.update(url, status='completed', filepath=filepath, bytes=local.finished_bytes, finished_at=time.time())
+                return filepath
+            finally:
+                local.url = None
+
+        failures = []
+        try:
+            with ThreadPoolExecutor(max_workers=workers or self.workers, thread_name_prefix='batch') as pool:
+                futures = {pool.submit(download_one, v): v for v in pending}
+                for future in as_completed(futures):
+                    video = futures[future]
+                    error = None
+                    try:
+                        future.result()
+                    except Exception as e:
+                        error = str(e)
+                    with stats_lock:
+                        stats['bytes'] += stats['item_bytes'].pop(video['url'], 0)
+                        stats['failed' if error else 'done'] += 1
+                    if error:
+                        print(f"[Error] Batch item failed: {video['url']}: {error}")
+                        failures.append({'url': video['url'], 'error': error})
+                        manifest.update(video['url'], status='failed', error=error)
+                    report(video.get('title', video['url']))
+        finally:
+            # Releases each worker's HTTP sessions and saves the shared cookie jar
+            for ydl in ydls:
+                try:
+                    ydl.close()
+                except Exception as e:
+                    print(f"[Warning] Could not close batch downloader: {e}")
+
+        elapsed = time.time() - started
+        summary = {
+            "status": "completed",
+            "batch_id": batch_id,
+            "items_total": len(items),
+            "items_done": stats['done'],
+            "items_skipped": skipped,
+            "items_failed": stats['failed'],
+            "bytes": stats['bytes'],
+            "seconds": round(elapsed, 2),
+            "speed_mb": stats['bytes'] / max(elapsed, 1e-6) / 1024 / 1024,
+            "failures": failures,
+            "output": manifest.path,
+        }
+        if progress_callback:
+            progress_callback(summary)
+        return summary
@@ -0,0 +1,414 @@
+"""
+Fetch Engine
+
+Concurrent, connection-pooled HTTP fetching shared by the asset scrapers.
+
+A single session keeps connections alive across assets (and speaks HTTP/2
+when httpx with the h2 extra is installed), while a global worker pool and
+a per-host limit bound how hard any one server is hit. Work for a host at
+its limit waits in that host's queue rather than on a pool thread, so a
+busy host never holds up requests to the others.
+
+Dependencies:
+    - requests
+    - httpx[http2] (optional, enables HTTP/2)
+"""
+
+import hashlib
+import itertools
+import os
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+    import h2  # noqa: F401  (httpx only negotiates HTTP/2 when h2 is importable)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+try:
+    from .asset_store import file_sha256
+    from .http_cache import HttpCache
+    from .metrics import ASSETS_FETCHED, DOWNLOAD_BYTES
+except ImportError:
+    from asset_store import file_sha256
+    from http_cache import HttpCache
+    from metrics import ASSETS_FETCHED, DOWNLOAD_BYTES
+
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+CHUNK_SIZE = 64 * 1024
+
+# Content-Type -> extension
+CONTENT_TYPE_EXTENSIONS = {
+    'image/jpeg': '.jpg',
+    'image/jpg': '.jpg',
+    'image/pjpeg': '.jpg',
+    'image/png': '.png',
+    'image/gif': '.gif',
+    'image/webp': '.webp',
+    'image/avif': '.avif',
+    'image/svg+xml': '.svg',
+    'image/bmp': '.bmp',
+    'image/x-icon': '.ico',
+    'image/vnd.microsoft.icon': '.ico',
+    'application/javascript': '.js',
+    'application/x-javascript': '.js',
+    'text/javascript': '.js',
+    'text/css': '.css',
+    'font/woff': '.woff',
+    'font/woff2': '.woff2',
+    'font/ttf': '.ttf',
+    'font/otf': '.otf',
+}
+
+# Extensions that name the same format
+EXTENSION_ALIASES = {'.jpeg': '.jpg', '.jpe': '.jpg', '.mjs': '.js'}
+
+
+class AssetTooLarge(Exception):
+    """Raised when an asset exceeds the engine's max_asset_bytes."""
+
+
+def sniff_extension(head):
+    """Guess a file extension from the first bytes of a body, or None."""
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return '.png'
+    if head.startswith(b'\xff\xd8\xff'):
+        return '.jpg'
+    if head.startswith((b'GIF87a', b'GIF89a')):
+        return '.gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return '.webp'
+    if head[4:12] in (b'ftypavif', b'ftypavis'):
+        return '.avif'
+    if head.startswith(b'BM'):
+        return '.bmp'
+    if head.startswith(b'\x00\x00\x01\x00'):
+        return '.ico'
+    if head.startswith(b'wOFF'):
+        return '.woff'
+    if head.startswith(b'wOF2'):
+        return '.woff2'
+    text = head[:512].lstrip().lower()
+    if text.startswith(b'<svg') or (text.startswith(b'<?xml') and b'<svg' in text):
+        return '.svg'
+    return None
+
+
+def url_filename(url, fallback_prefix):
+    """
+    Stable, filesystem-safe name for an asset URL.
+
+    Uses the URL's basename; URLs without one (``/loader?v=2``) get a name
+    derived from a hash of the URL, so re-scrapes map to the same file.
+    """
+    name = os.path.basename(urlparse(url).path)
+    name = "".join([c for c in name if c.isalpha() or c.isdigit() or c in (' ', '.', '_', '-')]).strip()
+    if not name.strip('.'):
+        name = f"{fallback_prefix}_{hashlib.sha1(url.encode()).hexdigest()[:10]}"
+    return name
+
+
+def count_cache(stats, result):
+    """Tally a download result into {"hits": n, "misses": n} (fresh, resumed and 304 count as hits)."""
+    if result and result.get('cache') in ('fresh', 'resumed', 'revalidated'):
+        stats['hits'] += 1
+    elif result and result.get('cache') == 'miss':
+        stats['misses'] += 1
+    return stats
+
+
+def content_type_extension(content_type):
+    if not content_type:
+        return None
+    return CONTENT_TYPE_EXTENSIONS.get(content_type.split(';')[0].strip().lower())
+
+
+class FetchEngine:
+    """
+    Shared HTTP client for scrapers.
+
+    Args:
+        max_workers (int): Global number of concurrent asset fetches.
+        per_host (int): Concurrent fetches allowed against a single host.
+        timeout (float): Per-request timeout in seconds.
+        http2 (bool): Use HTTP/2 when httpx[http2] is installed.
+        max_asset_bytes (int): Abort asset downloads larger than this (None = no limit).
+        store (AssetStore): Optional content-addressed store for deduplicated downloads.
+        cache (HttpCache): Optional validator cache over ``store``.
+    """
+
+    def __init__(self, max_workers=16, per_host=6, timeout=10, http2=True, user_agent=DEFAULT_USER_AGENT,
+                 max_asset_bytes=50 * 1024 * 1024, store=None, cache=None):
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.timeout = timeout
+        self.max_asset_bytes = max_asset_bytes
+        self.store = store or (cache.store if cache else None)
+        # A store always gets validator handling; without an explicit cache there is no size budget
+        self.cache = cache or (HttpCache(self.store, max_bytes=None) if self.store else None)
+        self.headers = {'User-Agent': user_agent}
+        self.http2 = http2 and HTTP2_AVAILABLE
+
+        if self.http2:
+            limits = httpx.Limits(max_connections=max_workers, max_keepalive_connections=max_workers)
+            self.session = httpx.Client(http2=True, headers=self.headers, limits=limits, follow_redirects=True)
+        else:
+            self.session = requests.Session()
+            self.session.headers.update(self.headers)
+            adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+            self.session.mount('http://', adapter)
+            self.session.mount('https://', adapter)
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='fetch')
+        # host -> [calls running, deque of (future, func, item) waiting for a slot]
+        self._hosts = {}
+        self._host_lock = threading.Lock()
+
+    def get(self, url, headers=None, timeout=None):
+        """GET through the pooled session. Host limits are applied by ``submit``, not here."""
+        return self.session.get(url, headers=headers, timeout=timeout or self.timeout)
+
+    @contextmanager
+    def stream(self, url, headers=None):
+        """Open a streaming GET. Yields ``(status_code, headers, chunk_iterator)``."""
+        if self.http2:
+            with self.session.stream('GET', url, headers=headers, timeout=self.timeout) as res:
+                yield res.status_code, res.headers, res.iter_bytes(CHUNK_SIZE)
+        else:
+            res = self.session.get(url, headers=headers, timeout=self.timeout, stream=True)
+            try:
+                yield res.status_code, res.headers, res.iter_content(CHUNK_SIZE)
+            finally:
+                res.close()
+
+    def download(self, url, output_dir, name, default_ext='', headers=None, resume=False, accept=None):
+        """
+        Stream ``url`` into ``output_dir`` without holding the body in memory.
+
+        The body goes to a temp file and is renamed into place once complete,
+        so readers never see a partial asset. The extension comes from the
+        body's magic bytes, then the Content-Type, then ``name``'s own
+        extension, then ``default_ext``.
+
+        With an asset store attached, the body is hashed while streaming and
+        kept once as a blob, and the friendly file is linked to it. The HTTP
+        cache over the store serves fresh entries without any request and
+        revalidates stale ones conditionally; a 304 relinks the stored blob
+        instead of downloading the body again. With ``resume`` (a job picked
+        up after a restart) any stored body is reused without a request.
+
+        ``accept`` limits the asset to a set of extensions: a body whose type
+        (sniffed, else Content-Type) is not among them is dropped after its
+        first chunk, so a URL can be judged by what it serves, not its name.
+
+        Returns a dict with filename, path, size, content_type, sha256, cached
+        and cache ('fresh', 'resumed', 'revalidated', 'miss', or None without a cache),
+        or None for non-200 responses and rejected types. Raises AssetTooLarge past
+        ``max_asset_bytes``.
+        """
+        request_headers = dict(headers or {})
+        entry = self.cache.lookup(url) if self.cache else None
+        if entry and accept and (entry['ext'] or '') not in accept:
+            return None
+        if entry and (entry['fresh'] or resume):
+            reused = self._reuse(entry, url, output_dir, name, default_ext, 'fresh' if entry['fresh'] else 'resumed')
+            if reused:
+                self.cache.hit(url)
+                return reused
+            # The blob was evicted since the lookup; fetch the body again
+            entry = None
+        request_headers.update(self.cache.conditional_headers(entry) if entry else {})
+
+        with self.stream(url, headers=request_headers) as (status, res_headers, chunks):
+            if status == 304 and entry:
+                reused = self._reuse(entry, url, output_dir, name, default_ext, 'revalidated')
+                if reused:
+                    self.cache.revalidated(url, res_headers)
+                    return reused
+                # Evicted while revalidating; the lookup now misses, so this fetches the body
+                return self.download(url, output_dir, name, default_ext, headers, resume, accept)
+            if status != 200:
+                return None
+            declared = res_headers.get('Content-Length')
+            if self.max_asset_bytes and declared and declared.isdigit() and int(declared) > self.max_asset_bytes:
+                raise AssetTooLarge(f"{url} is {declared} bytes (limit {self.max_asset_bytes})")
+
+            content_type = res_headers.get('Content-Type')
+            chunks = iter(chunks)
+            head = next((chunk for chunk in chunks if chunk), b'')
+            ext = sniff_extension(head) or content_type_extension(content_type) or ''
+            if accept and ext not in accept:
+                return None
+
+            # no-store bodies bypass the blob store and land as plain files
+            store = self.store if self.store and self.cache.storable(res_headers) else None
+            if store:
+                tmp_path = store.temp_path()
+                f = open(tmp_path, 'wb')
+            else:
+                fd, tmp_path = tempfile.mkstemp(dir=output_dir, prefix='.', suffix='.part')
+                f = os.fdopen(fd, 'wb')
+            digest = hashlib.sha256()
+            size = 0
+            try:
+                with f:
+                    for chunk in itertools.chain((head,), chunks):
+                        if not chunk:
+                            continue
+                        size += len(chunk)
+                        if self.max_asset_bytes and size > self.max_asset_bytes:
+                            raise AssetTooLarge(f"{url} exceeded {self.max_asset_bytes} bytes")
+                        digest.update(chunk)
+                        f.write(chunk)
+                DOWNLOAD_BYTES.inc(size, source='http')
+
+                sha256 = digest.hexdigest()
+                filename = self._final_name(name, ext, default_ext)
+                if store:
+                    # Pinned until the index points at the blob, so eviction cannot remove it first
+                    with store.pinned(sha256):
+                        self.store.add_blob(tmp_path, sha256)
+                        path = self._place_blob(sha256, output_dir, filename, url)
+                        self.cache.save(url, sha256, size, content_type, ext, res_headers)
+                else:
+                    path = self._free_path(output_dir, filename, sha256)
+                    os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+        return self._result(path, size, content_type, sha256, cache='miss' if self.cache else None)
+
+    def _reuse(self, entry, url, output_dir, name, default_ext, cache):
+        """Link a stored body into place, or return None if its blob has been evicted."""
+        filename = self._final_name(name, entry['ext'], default_ext)
+        with self.store.pinned(entry['sha256']) as present:
+            if not present:
+                return None
+            path = self._place_blob(entry['sha256'], output_dir, filename, url)
+        return self._result(path, entry['size'], entry['content_type'], entry['sha256'], cached=True, cache=cache)
+
+    @staticmethod
+    def _result(path, size, content_type, sha256, cached=False, cache=None):
+        ASSETS_FETCHED.inc(cache=cache or 'none')
+        return {
+            'filename': os.path.basename(path),
+            'path': path,
+            'size': size,
+            'content_type': content_type,
+            'sha256': sha256,
+            'cached': cached,
+            'cache': cache,
+        }
+
+    @staticmethod
+    def _final_name(name, ext, default_ext):
+        stem, name_ext = os.path.splitext(name)
+        if not ext:
+            return name if name_ext else stem + default_ext
+        if EXTENSION_ALIASES.get(name_ext.lower(), name_ext.lower()) == ext:
+            # Keep the URL's spelling (.jpeg) when it agrees with the sniffed type
+            return name
+        return stem + ext
+
+    def _free_path(self, output_dir, filename, sha256):
+        """
+        Destination for content ``sha256``: ``filename`` if it is free or already
+        holds the same bytes, otherwise the name with a short hash suffix.
+        """
+        path = os.path.join(output_dir, filename)
+        if not os.path.exists(path):
+            return path
+        existing = (self.store.linked_sha256(path) if self.store else None) or file_sha256(path)
+        if existing == sha256:
+            return path
+        stem, ext = os.path.splitext(filename)
+        return os.path.join(output_dir, f"{stem}_{sha256[:8]}{ext}")
+
+    def _place_blob(self, sha256, output_dir, filename, url):
+        path = self._free_path(output_dir, filename, sha256)
+        if not (os.path.exists(path) and self.store.linked_sha256(path) == sha256):
+            self.store.link(sha256, path, url=url)
+        return path
+
+    def submit(self, func, item, url_of=lambda item: item):
+        """
+        Run ``func(item)`` on the pool once its host has a free slot. Returns a Future.
+
+        Calls beyond ``per_host`` for one host wait in that host's queue, not
+        on a pool thread, and start as the host's running calls finish.
+        """
+        future = Future()
+        host = urlparse(url_of(item)).netloc.lower()
+        with self._host_lock:
+            state = self._hosts.setdefault(host, [0, deque()])
+            if state[0] >= self.per_host:
+                state[1].append((future, func, item))
+                return future
+            state[0] += 1
+        if not self._dispatch(host, future, func, item):
+            self._release(host)
+        return future
+
+    def _dispatch(self, host, future, func, item):
+        """Start a call holding one of ``host``'s slots; False if the pool is shut down."""
+        def run():
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(func(item))
+                    except BaseException as e:
+                        future.set_exception(e)
+            finally:
+                self._release(host)
+        try:
+            self._executor.submit(run)
+            return True
+        except RuntimeError as e:
+            if future.set_running_or_notify_cancel():
+                future.set_exception(e)
+            return False
+
+    def _release(self, host):
+        """A call for ``host`` finished: hand its slot to the next queued call."""
+        while True:
+            with self._host_lock:
+                state = self._hosts[host]
+                if not state[1]:
+                    state[0] -= 1
+                    if not state[0]:
+                        del self._hosts[host]
+                    return
+                future, func, item = state[1].popleft()
+            if self._dispatch(host, future, func, item):
+                return
+
+    def map(self, func, items, url_of=lambda item: item):
+        """
+        Run ``func(item)`` concurrently for every item.
+
+        The global pool bounds total concurrency and ``submit`` applies the
+        per-host limit. Yields ``(item, result, error)`` as calls complete.
+        """
+        futures = {self.submit(func, item, url_of): item for item in items}
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                yield item, future.result(), None
+            except Exception as e:
+                yield item, None, e
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
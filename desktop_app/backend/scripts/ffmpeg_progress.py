@@ -0,0 +1,168 @@
+"""
+FFmpeg Progress
+
+Runs ffmpeg with its machine-readable ``-progress`` stream on stdout and
+turns each key=value block into a telemetry snapshot (position, fps,
+speed multiplier, bitrate, output size, ETA). stderr is drained in the
+background into a bounded tail so failures can report what ffmpeg said.
+"""
+
+import subprocess
+import threading
+import time
+from collections import deque
+
+try:
+    from .metrics import FFMPEG_RUNNING, FFMPEG_RUNS, FFMPEG_SPEED
+except ImportError:
+    from metrics import FFMPEG_RUNNING, FFMPEG_RUNS, FFMPEG_SPEED
+
+STDERR_TAIL_LINES = 20
+
+
+class FFmpegError(RuntimeError):
+    """ffmpeg exited non-zero; ``stderr_tail`` holds its last lines of output."""
+
+    def __init__(self, returncode, stderr_tail):
+        self.returncode = returncode
+        self.stderr_tail = list(stderr_tail)
+        detail = ''.join(self.stderr_tail[-3:]).strip() or 'no output'
+        super().__init__(f"FFmpeg failed (exit {returncode}): {detail}")
+
+
+def _number(value):
+    try:
+        return float(str(value).strip().rstrip('x'))
+    except (TypeError, ValueError):
+        return None
+
+
+class FFmpegProgress:
+    """
+    Incremental parser for ffmpeg's ``-progress`` output.
+
+    Feed it lines; every ``progress=continue|end`` line completes a block
+    and produces a snapshot dict, passed to ``on_update`` and kept as
+    ``latest``.
+
+    Args:
+        duration (float): Expected output duration in seconds, for percent and ETA.
+        on_update (callable): Called with each snapshot.
+    """
+
+    def __init__(self, duration=None, on_update=None):
+        self.duration = duration or None
+        self.on_update = on_update
+        self.started = time.time()
+        self.latest = None
+        self._block = {}
+
+    def feed(self, line):
+        key, sep, value = line.strip().partition('=')
+        if not sep:
+            return None
+        if key != 'progress':
+            self._block[key] = value
+            return None
+        snapshot = self._snapshot(self._block, done=(value == 'end'))
+        self._block = {}
+        self.latest = snapshot
+        if self.on_update:
+            self.on_update(snapshot)
+        return snapshot
+
+    def _snapshot(self, block, done):
+        # out_time_us is the current name; older builds only have out_time_ms (also microseconds)
+        micros = _number(block.get('out_time_us')) or _number(block.get('out_time_ms')) or 0
+        seconds = max(0.0, micros / 1_000_000)
+        speed = _number(block.get('speed'))
+        bitrate = block.get('bitrate', '')
+        elapsed = time.time() - self.started
+
+        percent = eta = None
+        if self.duration:
+            percent = 100.0 if done else min(99.9, seconds / self.duration * 100)
+            remaining = max(0.0, self.duration - seconds)
+            if speed:
+                eta = remaining / speed
+            elif seconds > 0:
+                eta = remaining * elapsed / seconds
+            if done:
+                eta = 0.0
+
+        return {
+            'out_seconds': seconds,
+            'frame': int(_number(block.get('frame')) or 0),
+            'fps': _number(block.get('fps')) or 0.0,
+            'speed': speed or 0.0,
+            'bitrate_kbps': _number(bitrate.replace('kbits/s', '')) if 'kbits/s' in bitrate else None,
+            'total_size': int(_number(block.get('total_size')) or 0),
+            'percent': percent,
+            'eta': eta,
+            'elapsed': elapsed,
+            'done': done,
+        }
+
+
+def run_ffmpeg(cmd, duration=None, on_progress=None, procs=None, tail_lines=STDERR_TAIL_LINES):
+    """
+    Run an ffmpeg command, streaming telemetry to ``on_progress``.
+
+    ``cmd`` is a normal ffmpeg argument list; the progress flags are added
+    here. ``procs`` (a list) receives the Popen object so callers can kill
+    it. Raises FFmpegError with the stderr tail on failure and returns the
+    final snapshot on success.
+    """
+    cmd = [cmd[0], '-hide_banner', '-nostats', '-progress', 'pipe:1'] + list(cmd[1:])
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, errors='replace')
+    if procs is not None:
+        procs.append(process)
+    FFMPEG_RUNNING.inc()
+
+    try:
+        # Drain stderr in the background so a chatty encoder cannot block on a full pipe
+        stderr_tail = deque(maxlen=tail_lines)
+        drain = threading.Thread(target=stderr_tail.extend, args=(process.stderr,), daemon=True)
+        drain.start()
+
+        parser = FFmpegProgress(duration, on_progress)
+        for line in process.stdout:
+            parser.feed(line)
+        returncode = process.wait()
+        drain.join()
+    finally:
+        FFMPEG_RUNNING.dec()
+    if returncode != 0:
+        FFMPEG_RUNS.inc(status='failed')
+        raise FFmpegError(returncode, stderr_tail)
+    FFMPEG_RUNS.inc(status='ok')
+    final = parser.latest
+    if final and final['out_seconds'] > 0 and final['elapsed'] > 0:
+        FFMPEG_SPEED.observe(final['out_seconds'] / final['elapsed'])
+    return final
+
+
+def progress_event(snapshot, status='converting', label='Converting'):
+    """Job progress event carrying the telemetry of one snapshot."""
+    percent = snapshot['percent'] or 0
+    return {
+        "status": status,
+        "percent": percent,
+        "fps": snapshot['fps'],
+        "speed": snapshot['speed'],
+        "bitrate_kbps": snapshot['bitrate_kbps'],
+        "size_bytes": snapshot['total_size'],
+        "eta": format_eta(snapshot['eta']),
+        "eta_seconds": snapshot['eta'],
+        "message": f"{label}... {percent:.1f}% ({snapshot['speed']:.2f}x, {snapshot['fps']:.0f} fps)"
+    }
+
+
+def format_eta(seconds):
+    """MM:SS (or HH:MM:SS) for progress messages."""
+    if seconds is None:
+        return '--:--'
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
@@ -0,0 +1,112 @@
+"""
+HTTP Cache
+
+Persistent validator cache for scraped assets, layered on the AssetStore.
+
+Fresh entries (within Cache-Control max-age or Expires) are served from the
+store without touching the network. Stale entries are revalidated with
+If-None-Match / If-Modified-Since, and a 304 counts as a hit. no-cache
+responses are stored but revalidated on every use; no-store responses are
+never written to the store. The store is kept under a byte budget by
+evicting the least-recently-used URLs.
+"""
+
+import time
+from email.utils import parsedate_to_datetime
+
+
+def parse_cache_control(value):
+    """Parse a Cache-Control header into {directive: value or True}."""
+    directives = {}
+    for part in (value or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        key, _, arg = part.partition('=')
+        directives[key.strip().lower()] = arg.strip().strip('"') if arg else True
+    return directives
+
+
+def _http_date(value):
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def expires_at(headers, now=None):
+    """
+    Absolute time until which a response may be reused without revalidation.
+
+    Returns ``now`` (i.e. already stale) for no-cache responses or when the
+    server gives no freshness information.
+    """
+    now = time.time() if now is None else now
+    cc = parse_cache_control(headers.get('Cache-Control'))
+    if 'no-cache' in cc:
+        return now
+    max_age = cc.get('max-age')
+    if max_age not in (None, True):
+        try:
+            age = int(headers.get('Age') or 0)
+            return now + max(0, int(max_age) - age)
+        except ValueError:
+            pass
+    expires = _http_date(headers.get('Expires'))
+    if expires is not None:
+        date = _http_date(headers.get('Date')) or now
+        return now + max(0.0, expires - date)
+    return now
+
+
+class HttpCache:
+    """
+    Freshness and revalidation policy over an AssetStore.
+
+    Args:
+        store (AssetStore): Where bodies and validators are persisted.
+        max_bytes (int): Blob budget; LRU URLs are evicted beyond it.
+    """
+
+    def __init__(self, store, max_bytes=2 * 1024 * 1024 * 1024):
+        self.store = store
+        self.max_bytes = max_bytes
+
+    def lookup(self, url):
+        """Cached entry for ``url`` with a ``fresh`` flag, or None."""
+        entry = self.store.lookup(url)
+        if entry:
+            entry['fresh'] = bool(entry.get('expires_at')) and entry['expires_at'] > time.time()
+        return entry
+
+    @staticmethod
+    def conditional_headers(entry):
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def hit(self, url):
+        """A fresh entry was served without a request."""
+        self.store.touch(url)
+
+    def revalidated(self, url, headers):
+        """The server answered 304; refresh the entry's lifetime."""
+        self.store.touch(url, expires_at=expires_at(headers))
+
+    @staticmethod
+    def storable(headers):
+        """False for responses marked Cache-Control: no-store."""
+        return 'no-store' not in parse_cache_control(headers.get('Cache-Control'))
+
+    def save(self, url, sha256, size, content_type, ext, headers):
+        """Record a full 200 response and enforce the size budget; no-store responses are skipped."""
+        if not self.storable(headers):
+            return
+        self.store.record(url, sha256, size, content_type, ext,
+                          etag=headers.get('ETag'), last_modified=headers.get('Last-Modified'),
+                          expires_at=expires_at(headers))
+        if self.max_bytes:
+            self.store.evict_lru(self.max_bytes)
@@ -4,105 +4,121 @@ Web Image Scraper
 This script downloads all images from a specified website URL.
 It handles both regular image tags and background images in CSS.
 Refactored for API usage.
+
+Responsive images (<img srcset>, <picture>) are one logical image offered
+at several widths and formats; only one variant of each is downloaded,
+chosen by a policy: the largest, the largest up to a max width, or the
+smallest, optionally preferring formats such as AVIF or WebP. Whether a
+URL is an image is decided by what it serves, not by its extension, so
+CDN URLs such as ``/photo?w=800&fm=webp`` are kept.
 """
 
-import requests
-from bs4 import BeautifulSoup
 import os
-from urllib.parse import urljoin, urlparse
 import time
 
+try:
+    from .fetch_engine import FetchEngine, count_cache, url_filename
+    from .metrics import SCRAPE_RATE
+    from .page_assets import VARIANT_POLICIES, fetch_page_assets
+except ImportError:
+    from fetch_engine import FetchEngine, count_cache, url_filename
+    from metrics import SCRAPE_RATE
+    from page_assets import VARIANT_POLICIES, fetch_page_assets
+
+# Response types kept as images (sniffed from the body, else the Content-Type)
+IMAGE_EXTENSIONS = ('.jpg', '.png', '.gif', '.webp', '.avif', '.svg', '.bmp', '.ico')
+
+
 class ImageScraper:
-    def __init__(self, output_dir="images"):
+    """
+    Args:
+        output_dir (str): Directory to save images.
+        fetcher (FetchEngine): Shared HTTP client.
+        variant_policy (str): Default variant choice for srcset/<picture>
+            groups: 'largest', 'smallest' or 'src' (the fallback only).
+        max_width (int): Default width cap for the 'largest' policy.
+        formats (list): Default preferred formats, best first, e.g. ['avif', 'webp'].
+    """
+
+    def __init__(self, output_dir="images", fetcher=None, variant_policy="largest", max_width=None, formats=()):
         self.output_dir = output_dir
+        # Shared pooled client; main.py passes one engine to every scraper
+        self.fetcher = fetcher or FetchEngine()
+        self.variant_policy = self._check_policy(variant_policy)
+        self.max_width = max_width
+        self.formats = tuple(formats or ())
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
 
-    def is_valid_image_url(self, url):
-        image_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg']
-        return any(url.lower().endswith(ext) for ext in image_extensions)
+    @staticmethod
+    def _check_policy(policy):
+        if policy not in VARIANT_POLICIES:
+            raise ValueError(f"Unknown variant policy {policy!r}; expected one of {', '.join(VARIANT_POLICIES)}")
+        return policy
 
-    def download_images(self, url, progress_callback=None):
+    def image_urls(self, assets, variant_policy=None, max_width=None, formats=None):
         """
-        Download all images from a specified URL.
+        Image URLs to download from a page's PageAssets: one variant per
+        srcset/<picture> group. Arguments left as None use the scraper's defaults.
+        """
+        return assets.select_images(
+            self._check_policy(variant_policy or self.variant_policy),
+            max_width or self.max_width,
+            self.formats if formats is None else tuple(formats))
+
+    def fetch_image(self, img_url, resume=False):
+        # Stable URL-derived name; the extension is settled from the response body,
+        # and a body that is not an image is dropped after its first chunk
+        return self.fetcher.download(img_url, self.output_dir, url_filename(img_url, 'image'), default_ext='.jpg',
+                                     resume=resume, accept=IMAGE_EXTENSIONS)
+
+    def download_images(self, url, progress_callback=None, resume=False, variant_policy=None, max_width=None,
+                        formats=None):
+        """
+        Download all images from a specified URL, one variant per responsive image.
+        With ``resume`` (after a restart), images already in the store are not fetched again.
         """
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-
         downloaded_files = []
         
+        started = time.perf_counter()
         try:
             if progress_callback:
                 progress_callback({"status": "scanning", "message": f"Scanning {url}..."})
 
-            response = requests.get(url, headers=headers, timeout=15)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
-
-            img_tags = soup.find_all('img')
-            bg_elements = soup.find_all(lambda tag: tag.get('style') and 'background-image' in tag.get('style'))
+            # 1. Collect all URLs first (one streaming lxml pass over the page)
+            found_urls = self.image_urls(fetch_page_assets(self.fetcher, url), variant_policy, max_width, formats)
 
-            found_urls = set()
-            
-            # 1. Collect all URLs first
-            for img in img_tags:
-                src = img.get('src') or img.get('data-src')
-                if src:
-                    full_url = urljoin(url, src)
-                    if self.is_valid_image_url(full_url):
-                        found_urls.add(full_url)
-
-            for element in bg_elements:
-                style = element.get('style')
-                if 'url(' in style:
-                    try:
-                        bg_url = style.split('url(')[1].split(')')[0].strip("'").strip('"')
-                        full_url = urljoin(url, bg_url)
-                        if self.is_valid_image_url(full_url):
-                            found_urls.add(full_url)
-                    except:
-                        pass
-            
             total_images = len(found_urls)
             if progress_callback:
                 progress_callback({"status": "found", "count": total_images, "message": f"Found {total_images} images."})
 
-            # 2. Download loop
-            count = 0
-            for i, img_url in enumerate(found_urls):
-                try:
-                    filename = f"image_{count}_{os.path.basename(urlparse(img_url).path)}"
-                    # Sanitize filename
-                    filename = "".join([c for c in filename if c.isalpha() or c.isdigit() or c in (' ', '.', '_')]).rstrip()
-                    
-                    if not any(filename.lower().endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.gif', '.webp']):
-                         filename += '.jpg'
-
-                    filepath = os.path.join(self.output_dir, filename)
-
-                    if progress_callback:
-                        progress_callback({
-                            "status": "downloading", 
-                            "current": i+1, 
-                            "total": total_images, 
-                            "filename": filename
-                        })
-
-                    img_response = requests.get(img_url, headers=headers, timeout=10)
-                    if img_response.status_code == 200:
-                        with open(filepath, 'wb') as f:
-                            f.write(img_response.content)
-                        
-                        downloaded_files.append(filename)
-                        count += 1
-                        time.sleep(0.1) # Gentle delay
-
-                except Exception as e:
-                    print(f"Failed to download {img_url}: {e}")
-
+            # 2. Concurrent download through the shared fetch engine
+            done = 0
+            skipped = 0
+            cache_stats = {"hits": 0, "misses": 0}
+            for img_url, result, error in self.fetcher.map(lambda u: self.fetch_image(u, resume=resume), found_urls):
+                done += 1
+                if error:
+                    print(f"Failed to download {img_url}: {error}")
+                elif result:
+                    downloaded_files.append(result['filename'])
+                    count_cache(cache_stats, result)
+                else:
+                    # Not an image, or not a 200
+                    skipped += 1
+
+                if progress_callback:
+                    progress_callback({
+                        "status": "downloading",
+                        "current": done,
+                        "total": total_images,
+                        "filename": result['filename'] if result else url_filename(img_url, 'image')
+                    })
+
+            SCRAPE_RATE.observe(len(downloaded_files) / max(time.perf_counter() - started, 1e-6), tool='images')
             if progress_callback:
-                progress_callback({"status": "completed", "count": count, "files": downloaded_files})
+                progress_callback({"status": "completed", "count": len(downloaded_files), "files": downloaded_files,
+                                   "skipped": skipped, "cache": cache_stats})
             
             return downloaded_files
 
@@ -3,73 +3,65 @@ Web JavaScript Scraper
 Refactored for API usage.
 """
 
-import requests
-from bs4 import BeautifulSoup
 import os
-import random
-from urllib.parse import urljoin, urlparse
 import time
 
+try:
+    from .fetch_engine import FetchEngine, count_cache, url_filename
+    from .metrics import SCRAPE_RATE
+    from .page_assets import fetch_page_assets
+except ImportError:
+    from fetch_engine import FetchEngine, count_cache, url_filename
+    from metrics import SCRAPE_RATE
+    from page_assets import fetch_page_assets
+
 class JavascriptScraper:
-    def __init__(self, output_dir="js_files"):
+    def __init__(self, output_dir="js_files", fetcher=None):
         self.output_dir = output_dir
+        # Shared pooled client; main.py passes one engine to every scraper
+        self.fetcher = fetcher or FetchEngine()
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
 
-    def download_javascript(self, url, progress_callback=None):
-        user_agents = [
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        ]
-        
+    def fetch_script(self, js_url, resume=False):
+        # Bytes are written through unchanged (no decode/re-encode)
+        return self.fetcher.download(js_url, self.output_dir, url_filename(js_url, 'script'), default_ext='.js', resume=resume)
+
+    def download_javascript(self, url, progress_callback=None, resume=False):
         downloaded_files = []
         
+        started = time.perf_counter()
         try:
             if progress_callback:
                 progress_callback({"status": "scanning", "message": f"Scanning {url}..."})
 
-            headers = {'User-Agent': random.choice(user_agents)}
-            response = requests.get(url, headers=headers, timeout=15)
-            response.raise_for_status()
+            script_urls = fetch_page_assets(self.fetcher, url)['scripts']
 
-            soup = BeautifulSoup(response.text, 'html.parser')
-            scripts = soup.find_all('script', src=True)
-            
-            total = len(scripts)
+            total = len(script_urls)
             if progress_callback:
                 progress_callback({"status": "found", "count": total, "message": f"Found {total} scripts."})
 
-            for i, script in enumerate(scripts):
-                js_url = urljoin(url, script['src'])
-                
-                try:
-                    filename = os.path.basename(urlparse(js_url).path)
-                    if not filename.endswith('.js'):
-                        filename = f"script_{i}.js"
-                    
-                    # Sanitize
-                    filename = "".join([c for c in filename if c.isalpha() or c.isdigit() or c in (' ', '.', '_')]).rstrip()
-                    filepath = os.path.join(self.output_dir, filename)
-
-                    if progress_callback:
-                        progress_callback({
-                            "status": "downloading",
-                            "current": i+1,
-                            "total": total,
-                            "filename": filename
-                        })
-                    
-                    js_res = requests.get(js_url, headers={'User-Agent': random.choice(user_agents)}, timeout=10)
-                    if js_res.status_code == 200:
-                        with open(filepath, 'w', encoding='utf-8', errors='ignore') as f:
-                            f.write(js_res.text)
-                        downloaded_files.append(filename)
-                        time.sleep(0.1)
+            done = 0
+            cache_stats = {"hits": 0, "misses": 0}
+            for js_url, result, error in self.fetcher.map(lambda u: self.fetch_script(u, resume=resume), script_urls):
+                done += 1
+                if error:
+                    print(f"Error downloading {js_url}: {error}")
+                elif result:
+                    downloaded_files.append(result['filename'])
+                    count_cache(cache_stats, result)
 
-                except Exception as e:
-                    print(f"Error downloading {js_url}: {e}")
+                if progress_callback:
+                    progress_callback({
+                        "status": "downloading",
+                        "current": done,
+                        "total": total,
+                        "filename": result['filename'] if result else url_filename(js_url, 'script')
+                    })
 
+            SCRAPE_RATE.observe(len(downloaded_files) / max(time.perf_counter() - started, 1e-6), tool='scripts')
             if progress_callback:
-                progress_callback({"status": "completed", "count": len(downloaded_files), "files": downloaded_files})
+                progress_callback({"status": "completed", "count": len(downloaded_files), "files": downloaded_files, "cache": cache_stats})
             
             return downloaded_files
 
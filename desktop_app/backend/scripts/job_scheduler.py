@@ -0,0 +1,278 @@
+"""
+Job Scheduler
+
+Bounded, priority-ordered execution for backend jobs.
+Each tool family (yt-dlp, ffmpeg, scrapers) gets its own fixed-size worker
+pool, so a burst of requests is queued instead of starting an unbounded
+number of downloads or encodes at once.
+
+A job that fans out work of its own (a batch) runs on a separate pool and
+takes a slot of the target family for each item (see ``slots``), so its
+items count against the same cap as single jobs.
+
+With a JobStore attached, every job is journaled so that unfinished work
+can be re-queued after a restart (see ``resume``).
+"""
+
+import itertools
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+try:
+    from .job_store import MAX_ATTEMPTS
+    from .metrics import JOB_DURATION, JOB_WAIT, JOBS_FINISHED, JOBS_QUEUED, JOBS_RUNNING, JOBS_STARTED, POOL_WORKERS
+except ImportError:
+    from job_store import MAX_ATTEMPTS
+    from metrics import JOB_DURATION, JOB_WAIT, JOBS_FINISHED, JOBS_QUEUED, JOBS_RUNNING, JOBS_STARTED, POOL_WORKERS
+
+# Default number of concurrent jobs per tool family
+DEFAULT_POOL_SIZES = {
+    'ytdlp': 4,
+    'ffmpeg': 2,
+    'scraper': 16,
+}
+
+TERMINAL_STATES = ('completed', 'failed')
+
+
+class Job:
+    """A single unit of work tracked by the scheduler."""
+
+    def __init__(self, tool, func, args, kwargs, priority=0, label=None, job_id=None):
+        self.id = job_id or uuid.uuid4().hex
+        self.tool = tool
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.label = label or getattr(func, '__name__', 'job')
+        self.status = 'queued'
+        self.progress = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        # created_at survives a restart; queued_at is when this process queued the job
+        self.queued_at = self.created_at
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'tool': self.tool,
+            'label': self.label,
+            'priority': self.priority,
+            'status': self.status,
+            'progress': self.progress,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class JobScheduler:
+    """
+    Priority job queue with one bounded worker pool per tool.
+
+    Jobs with a higher ``priority`` run first; equal priorities run in
+    submission order. Target functions are called with an injected
+    ``progress_callback`` keyword, like the old ``run_in_thread`` helper.
+    """
+
+    def __init__(self, pool_sizes=None, progress_sink=None, history_limit=500, store=None):
+        self.pool_sizes = dict(DEFAULT_POOL_SIZES)
+        if pool_sizes:
+            self.pool_sizes.update(pool_sizes)
+        self.progress_sink = progress_sink
+        self.history_limit = history_limit
+        self.store = store
+
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+        self._queues = {}
+        self._running = {}
+        self._slots = {}
+        self._workers = []
+
+        for tool, size in self.pool_sizes.items():
+            self._queues[tool] = queue.PriorityQueue()
+            self._running[tool] = 0
+            self._slots[tool] = threading.BoundedSemaphore(max(1, int(size)))
+            for n in range(max(1, int(size))):
+                t = threading.Thread(target=self._worker, args=(tool,), name=f"{tool}-worker-{n}", daemon=True)
+                t.start()
+                self._workers.append(t)
+
+    def submit(self, tool, func, *args, priority=0, label=None, job_id=None, **kwargs):
+        """Queue ``func(*args, **kwargs)`` on the pool for ``tool`` and return its Job."""
+        if tool not in self._queues:
+            raise ValueError(f"Unknown tool pool: {tool}")
+
+        job = Job(tool, func, args, kwargs, priority=priority, label=label, job_id=job_id)
+        if self.store and not self.store.add(job):
+            print(f"Job {job.id} ({job.label}) has non-JSON arguments; it will not survive a restart")
+        with self._lock:
+            self._jobs[job.id] = job
+            self._trim_history()
+        self._queues[tool].put((-priority, next(self._counter), job))
+        return job
+
+    def resume(self, actions):
+        """
+        Reload the journal: finished jobs become history and unfinished ones
+        are queued again under their old ids.
+
+        ``actions`` maps a job label to the callable that runs it. Jobs with
+        no action, or that already died ``MAX_ATTEMPTS`` times, are marked
+        failed. Returns the resumed jobs.
+        """
+        if not self.store:
+            return []
+        with self._lock:
+            # Jobs submitted by this process before the resume ran are already live
+            live = set(self._jobs)
+        pending = []
+        for record in self.store.unfinished():
+            if record['id'] in live:
+                continue
+            if record['label'] not in actions or record['tool'] not in self._queues:
+                print(f"Cannot resume job {record['id']} ({record['label']}); marking it failed")
+                self.store.fail(record['id'], f"Interrupted by backend restart; {record['label']} is unavailable")
+            elif record['attempts'] >= MAX_ATTEMPTS:
+                self.store.fail(record['id'], f"Gave up after {record['attempts']} interrupted attempts")
+            else:
+                pending.append(record)
+
+        with self._lock:
+            for record in self.store.history(self.history_limit):
+                if record['id'] in self._jobs:
+                    continue
+                job = Job(record['tool'], None, record['args'], record['kwargs'], priority=record['priority'],
+                          label=record['label'], job_id=record['id'])
+                for field in ('status', 'progress', 'result', 'error', 'created_at', 'started_at', 'finished_at'):
+                    setattr(job, field, record[field])
+                self._jobs[job.id] = job
+
+        resumed = []
+        for record in pending:
+            print(f"Resuming job {record['id']} ({record['label']})")
+            job = self.submit(record['tool'], actions[record['label']], *record['args'], priority=record['priority'],
+                              label=record['label'], job_id=record['id'], **record['kwargs'])
+            job.created_at = record['created_at']
+            resumed.append(job)
+        self.store.prune(self.history_limit)
+        return resumed
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self, tool=None, status=None):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [j for j in jobs if (tool is None or j.tool == tool) and (status is None or j.status == status)]
+
+    def stats(self):
+        """Queue depth and active workers per pool."""
+        with self._lock:
+            running = dict(self._running)
+        return {
+            tool: {
+                'workers': self.pool_sizes[tool],
+                'running': running[tool],
+                'queued': self._queues[tool].qsize(),
+            }
+            for tool in self._queues
+        }
+
+    def collect_metrics(self):
+        """Refresh the queue and pool gauges; registered as a metrics collector."""
+        for tool, stats in self.stats().items():
+            JOBS_QUEUED.set(stats['queued'], tool=tool)
+            JOBS_RUNNING.set(stats['running'], tool=tool)
+            POOL_WORKERS.set(stats['workers'], tool=tool)
+
+    def _trim_history(self):
+        # Drop the oldest finished jobs once the history limit is exceeded
+        if len(self._jobs) <= self.history_limit:
+            return
+        for job_id in [j.id for j in self._jobs.values() if j.status in TERMINAL_STATES]:
+            if len(self._jobs) <= self.history_limit:
+                break
+            del self._jobs[job_id]
+
+    def _emit(self, job, data):
+        job.progress = data
+        if self.progress_sink:
+            try:
+                self.progress_sink(job, data)
+            except Exception as e:
+                print(f"Progress sink error for job {job.id}: {e}")
+
+    def slots(self, tool):
+        """
+        Semaphore bounding concurrent work of ``tool`` to its pool size. Every
+        job of that pool holds one slot while it runs; batch jobs hold one per
+        item in flight, e.g. ``with scheduler.slots('ytdlp'): ...``.
+        """
+        return self._slots[tool]
+
+    def _worker(self, tool):
+        q = self._queues[tool]
+        while True:
+            _, _, job = q.get()
+            try:
+                # Waits while batch items hold this family's slots
+                with self._slots[tool]:
+                    with self._lock:
+                        self._running[tool] += 1
+                    try:
+                        self._run(job)
+                    finally:
+                        with self._lock:
+                            self._running[tool] -= 1
+            finally:
+                q.task_done()
+
+    def _run(self, job):
+        job.status = 'running'
+        job.started_at = time.time()
+        JOBS_STARTED.inc(tool=job.tool)
+        JOB_WAIT.observe(job.started_at - job.queued_at, tool=job.tool)
+        if self.store:
+            self.store.started(job)
+
+        def progress_callback(data):
+            self._emit(job, data)
+
+        try:
+            job.result = job.func(*job.args, **job.kwargs, progress_callback=progress_callback)
+            # Several tools report errors through the callback instead of raising
+            if job.progress and job.progress.get('status') == 'error':
+                job.status = 'failed'
+                job.error = job.progress.get('error')
+            else:
+                job.status = 'completed'
+                if not job.progress or job.progress.get('status') != 'completed':
+                    self._emit(job, {"status": "completed"})
+        except Exception as e:
+            print(f"Job {job.id} ({job.label}) failed: {e}")
+            job.status = 'failed'
+            job.error = str(e)
+            if not job.progress or job.progress.get('status') != 'error':
+                self._emit(job, {"status": "error", "error": str(e)})
+        finally:
+            job.finished_at = time.time()
+            JOBS_FINISHED.inc(tool=job.tool, status=job.status)
+            JOB_DURATION.observe(job.finished_at - job.started_at, tool=job.tool)
+            if self.store:
+                try:
+                    self.store.finished(job)
+                except Exception as e:
+                    print(f"Job store error for job {job.id}: {e}")
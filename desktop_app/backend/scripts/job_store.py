@@ -0,0 +1,142 @@
+"""
+Job Store
+
+SQLite journal of scheduler jobs, so work survives a backend restart.
+
+Each job is recorded with the action it runs (its label), its JSON
+arguments, priority, state, result and last progress. After a restart,
+jobs that were still queued or running are handed back to the scheduler
+under their old ids. The tools resume from what is already on disk:
+yt-dlp ``.part`` files, batch manifests and the asset store. Finished
+jobs are reloaded as history.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    tool TEXT NOT NULL,
+    label TEXT NOT NULL,
+    args TEXT NOT NULL,
+    kwargs TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    progress TEXT,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+"""
+
+# A job that was running when the backend died this many times is not retried again
+MAX_ATTEMPTS = 3
+
+
+def _dumps(value):
+    return json.dumps(value, default=str)
+
+
+def _loads(value):
+    return json.loads(value) if value else None
+
+
+class JobStore:
+    """
+    Args:
+        path (str): SQLite database file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock:
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.executescript(SCHEMA)
+            self._db.commit()
+
+    def add(self, job):
+        """
+        Record a queued job. Returns False (and keeps the job in memory
+        only) when its arguments are not JSON.
+        """
+        try:
+            args, kwargs = json.dumps(list(job.args)), json.dumps(job.kwargs)
+        except (TypeError, ValueError):
+            return False
+        with self._lock:
+            # A resumed job keeps its row and attempt count
+            self._db.execute(
+                'INSERT INTO jobs (id, tool, label, args, kwargs, priority, status, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT(id) DO UPDATE SET status = excluded.status',
+                (job.id, job.tool, job.label, args, kwargs, job.priority, job.status, job.created_at),
+            )
+            self._db.commit()
+        return True
+
+    def started(self, job):
+        with self._lock:
+            self._db.execute('UPDATE jobs SET status = ?, started_at = ?, attempts = attempts + 1 WHERE id = ?',
+                             (job.status, job.started_at, job.id))
+            self._db.commit()
+
+    def finished(self, job):
+        with self._lock:
+            self._db.execute(
+                'UPDATE jobs SET status = ?, progress = ?, result = ?, error = ?, finished_at = ? WHERE id = ?',
+                (job.status, _dumps(job.progress), _dumps(job.result), job.error, job.finished_at, job.id),
+            )
+            self._db.commit()
+
+    def fail(self, job_id, error):
+        with self._lock:
+            self._db.execute('UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?',
+                             ('failed', error, time.time(), job_id))
+            self._db.commit()
+
+    def unfinished(self):
+        """Jobs left queued or running by the previous process, oldest first."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at").fetchall()
+        return [self._record(row) for row in rows]
+
+    def history(self, limit=500):
+        """The most recent finished jobs, oldest first."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM jobs WHERE status IN ('completed', 'failed') ORDER BY finished_at DESC LIMIT ?",
+                (limit,)).fetchall()
+        return [self._record(row) for row in reversed(rows)]
+
+    def prune(self, keep=500):
+        """Delete finished jobs beyond the newest ``keep``."""
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM jobs WHERE status IN ('completed', 'failed') AND id NOT IN "
+                "(SELECT id FROM jobs WHERE status IN ('completed', 'failed') ORDER BY finished_at DESC LIMIT ?)",
+                (keep,))
+            self._db.commit()
+
+    @staticmethod
+    def _record(row):
+        record = dict(row)
+        record['args'] = json.loads(record['args'])
+        record['kwargs'] = json.loads(record['kwargs'])
+        record['progress'] = _loads(record['progress'])
+        record['result'] = _loads(record['result'])
+        return record
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,111 @@
+"""
+Lazy Tools
+
+Deferred construction of the backend's tool objects.
+
+Importing yt-dlp, lxml and the HTTP stack costs far more than binding the
+API port, so main.py registers a factory per tool instead of building
+the tools at import time. A tool is built on first use, or earlier by a
+background warm-up thread started once the server is up. ``status()``
+reports which tools are warm for the readiness endpoint.
+"""
+
+import threading
+import time
+
+
+class LazyTool:
+    """
+    Proxy that builds its tool on first attribute access.
+
+    Args:
+        name (str): Tool name used in status reports.
+        factory (callable): Builds and returns the tool.
+    """
+
+    def __init__(self, name, factory):
+        self.name = name
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+        self.seconds = None
+        self.error = None
+
+    @property
+    def ready(self):
+        return self._instance is not None
+
+    def get(self):
+        """The tool, building it now if no one has yet."""
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    started = time.perf_counter()
+                    try:
+                        instance = self._factory()
+                        # Optional hook for work the constructor leaves to first use
+                        if hasattr(instance, 'warm'):
+                            instance.warm()
+                    except Exception as e:
+                        self.error = str(e)
+                        raise
+                    self.seconds = time.perf_counter() - started
+                    self.error = None
+                    self._instance = instance
+        return self._instance
+
+    def __getattr__(self, attr):
+        return getattr(self.get(), attr)
+
+
+class ToolRegistry:
+    """Named LazyTools plus a one-shot background warm-up."""
+
+    def __init__(self):
+        self.tools = {}
+        self.started = time.time()
+        self.warm_seconds = None
+        self._warm_thread = None
+
+    def register(self, name, factory):
+        tool = LazyTool(name, factory)
+        self.tools[name] = tool
+        return tool
+
+    def warm(self, then=None):
+        """
+        Build every tool in registration order on a background thread,
+        then call ``then()``. Returns immediately; later calls do nothing.
+        """
+        if self._warm_thread is not None:
+            return self._warm_thread
+
+        def run():
+            started = time.perf_counter()
+            for tool in self.tools.values():
+                try:
+                    tool.get()
+                except Exception as e:
+                    print(f"[Warmup] {tool.name} failed: {e}")
+            self.warm_seconds = time.perf_counter() - started
+            print(f"[Warmup] Tools ready in {self.warm_seconds:.2f}s")
+            if then:
+                then()
+
+        self._warm_thread = threading.Thread(target=run, name="tool-warmup", daemon=True)
+        self._warm_thread.start()
+        return self._warm_thread
+
+    @property
+    def ready(self):
+        return all(tool.ready for tool in self.tools.values())
+
+    def status(self):
+        return {
+            name: {
+                'ready': tool.ready,
+                'seconds': round(tool.seconds, 3) if tool.seconds is not None else None,
+                'error': tool.error,
+            }
+            for name, tool in self.tools.items()
+        }
@@ -0,0 +1,232 @@
+"""
+Metrics
+
+In-process counters, gauges and histograms, rendered in the Prometheus
+text exposition format for ``GET /metrics``.
+
+Tools update the module-level metrics below directly; values that are
+cheaper to read than to track (queue depth, thread count) come from
+collectors registered with ``REGISTRY.add_collector`` and run at scrape
+time. No client library is needed.
+"""
+
+import math
+import threading
+
+DURATION_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900, 1800, 3600)
+SPEED_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)
+RATE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} takes labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, (), value) for key, value in sorted(self._values.items())]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for name, key, extra, value in self.samples():
+            lines.append(f"{name}{_labels(self.label_names, key, extra)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][i] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    def samples(self):
+        out = []
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, state['counts']):
+                    cumulative += count
+                    out.append((f"{self.name}_bucket", key, (('le', _format_value(bound)),), cumulative))
+                out.append((f"{self.name}_sum", key, (), state['sum']))
+                out.append((f"{self.name}_count", key, (), state['count']))
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._add(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()):
+        return self._add(Gauge(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=DURATION_BUCKETS):
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def add_collector(self, collect):
+        """``collect()`` runs before each render, to refresh gauges from live state."""
+        self._collectors.append(collect)
+
+    def render(self):
+        for collect in self._collectors:
+            try:
+                collect()
+            except Exception as e:
+                print(f"Metrics collector error: {e}")
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Jobs (job_scheduler)
+JOBS_STARTED = REGISTRY.counter('turbodl_jobs_started_total', 'Jobs that started running.', ['tool'])
+JOBS_FINISHED = REGISTRY.counter('turbodl_jobs_finished_total', 'Jobs that finished, by outcome.', ['tool', 'status'])
+JOB_DURATION = REGISTRY.histogram('turbodl_job_duration_seconds', 'Run time of finished jobs.', ['tool'])
+JOB_WAIT = REGISTRY.histogram('turbodl_job_queue_wait_seconds', 'Time jobs spent queued before a worker took them.',
+                              ['tool'])
+JOBS_QUEUED = REGISTRY.gauge('turbodl_jobs_queued', 'Jobs waiting for a worker.', ['tool'])
+JOBS_RUNNING = REGISTRY.gauge('turbodl_jobs_running', 'Jobs currently running.', ['tool'])
+POOL_WORKERS = REGISTRY.gauge('turbodl_pool_workers', 'Worker threads per tool pool.', ['tool'])
+THREADS = REGISTRY.gauge('turbodl_threads', 'Live Python threads in the backend.')
+
+# Downloads and scrapes
+DOWNLOAD_BYTES = REGISTRY.counter('turbodl_download_bytes_total', 'Bytes received, by source.', ['source'])
+ASSETS_FETCHED = REGISTRY.counter('turbodl_assets_fetched_total', 'Scraped assets written, by cache outcome.',
+                                  ['cache'])
+SCRAPE_RATE = REGISTRY.histogram('turbodl_scrape_assets_per_second', 'Asset throughput of finished scrape jobs.',
+                                 ['tool'], buckets=RATE_BUCKETS)
+
+# ffmpeg
+FFMPEG_RUNNING = REGISTRY.gauge('turbodl_ffmpeg_processes', 'ffmpeg processes currently running.')
+FFMPEG_RUNS = REGISTRY.counter('turbodl_ffmpeg_runs_total', 'ffmpeg runs, by outcome.', ['status'])
+FFMPEG_SPEED = REGISTRY.histogram('turbodl_ffmpeg_speed_ratio', 'Media seconds processed per wall second, per run.',
+                                  buckets=SPEED_BUCKETS)
+
+# Progress delivery (progress_channel)
+WS_CLIENTS = REGISTRY.gauge('turbodl_websocket_clients', 'Connected WebSocket clients.')
+WS_FRAMES_SENT = REGISTRY.counter('turbodl_websocket_frames_sent_total', 'Frames written to WebSocket clients.')
+WS_FRAMES_DROPPED = REGISTRY.counter('turbodl_websocket_frames_dropped_total',
+                                     'Frames dropped before sending: replaced by a newer frame or outbox overflow.',
+                                     ['reason'])
+PROGRESS_COALESCED = REGISTRY.counter('turbodl_progress_frames_coalesced_total',
+                                      'Progress updates replaced inside the throttle window.')
+
+
+def download_byte_hook(source):
+    """
+    yt-dlp progress hook adding each file's newly downloaded bytes to
+    ``turbodl_download_bytes_total``.
+
+    Downloads are keyed by video id and format id, which 'downloading' and
+    'finished' events both carry (the file name changes from tmpfilename to
+    filename in between). A 'finished' event only adds what the last update
+    missed; one for a download never seen in progress (already on disk) adds
+    nothing.
+    """
+    seen = {}
+
+    def key(d):
+        info = d.get('info_dict') or {}
+        if info.get('id') is not None:
+            return info.get('id'), info.get('format_id')
+        return d.get('tmpfilename') or d.get('filename')
+
+    def hook(d):
+        name = key(d)
+        downloaded = d.get('downloaded_bytes')
+        if not name:
+            return
+        if d.get('status') == 'finished':
+            previous = seen.pop(name, None)
+            if previous is None or downloaded is None:
+                return
+            delta = downloaded - previous
+        elif downloaded is None:
+            return
+        else:
+            delta = downloaded - seen.get(name, 0)
+            seen[name] = downloaded
+        if delta > 0:
+            DOWNLOAD_BYTES.inc(delta, source=source)
+    return hook
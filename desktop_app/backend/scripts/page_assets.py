@@ -0,0 +1,507 @@
+"""
+Page Assets
+
+One fetch and one parse for every asset a page references.
+
+The page is streamed through lxml's pull parser while it downloads, so
+parsing overlaps the transfer and finished elements are freed as it goes.
+A single pass collects:
+
+    images    <img> src/data-src, <video poster>, icons, inline style and
+              <style> url(), preloads with as=image
+    image_sets  srcset candidates of <img> and <picture>/<source>; each
+              group is one logical image, reduced to a single variant
+              by ``select_variant``
+    scripts   <script src>, modulepreload, preloads with as=script
+    styles    <link rel=stylesheet>, @import in <style>, preloads with as=style
+    fonts     <style> url() of font files, preloads with as=font
+    links     <a>/<area> href and <iframe> src, for crawling
+
+``PageAssetScraper`` downloads every kind at once through the shared
+fetch engine, each into its own tool's directory, for a full-page archive.
+
+Dependencies:
+    - lxml
+"""
+
+import os
+import re
+import time
+from urllib.parse import parse_qs, parse_qsl, quote, urlencode, urljoin, urlparse, urlsplit, urlunsplit
+
+from lxml import etree
+
+try:
+    from .fetch_engine import FetchEngine, count_cache
+    from .metrics import SCRAPE_RATE
+except ImportError:
+    from fetch_engine import FetchEngine, count_cache
+    from metrics import SCRAPE_RATE
+
+KINDS = ('images', 'scripts', 'styles', 'fonts')
+FONT_EXTENSIONS = ('.woff', '.woff2', '.ttf', '.otf', '.eot')
+PRELOAD_KINDS = {'image': 'images', 'script': 'scripts', 'style': 'styles', 'font': 'fonts'}
+ICON_RELS = {'icon', 'apple-touch-icon', 'apple-touch-icon-precomposed', 'mask-icon'}
+HTML_TYPES = {'text/html', 'application/xhtml+xml'}
+SKIP_SCHEMES = ('data:', 'javascript:', 'about:', 'blob:', 'mailto:', '#')
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+# Query parameters that only track the visitor; dropped so the same page is not fetched twice
+TRACKING_PARAMS = {'fbclid', 'gclid', 'dclid', 'msclkid', 'mc_cid', 'mc_eid', '_ga', 'igshid'}
+PERCENT_ESCAPE = re.compile(r'%([0-9A-Fa-f]{2})|%')
+UNRESERVED = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~')
+# How one variant of a srcset/<picture> group is chosen; 'src' is what a browser without srcset loads
+VARIANT_POLICIES = ('largest', 'smallest', 'src')
+# CSS width assumed for a 1x candidate when the <img> has no width attribute
+NOMINAL_IMAGE_WIDTH = 1280
+# Query parameters image CDNs take the output format from (?fm=webp, ?format=avif)
+FORMAT_PARAMS = ('fm', 'format')
+
+CSS_IMPORT = re.compile(r'@import\s+(?:url\(\s*)?([\'"]?)([^\'")\s;]+)\1', re.I)
+CSS_IMPORT_RULE = re.compile(r'@import[^;]*;?', re.I)
+CSS_URL = re.compile(r'url\(\s*([\'"]?)(.*?)\1\s*\)', re.I | re.S)
+CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+# Either reference form in one pattern (target in group 2 or 4), for rewriting in a single pass
+CSS_REFERENCE = re.compile(r'@import\s+(?:url\(\s*)?([\'"]?)([^\'")\s;]+)\1|url\(\s*([\'"]?)(.*?)\3\s*\)', re.I | re.S)
+
+
+def css_references(text):
+    """``(imports, urls)`` referenced by a stylesheet, in order; @import targets are not repeated in urls."""
+    text = CSS_COMMENT.sub('', text)
+    imports = [m.group(2) for m in CSS_IMPORT.finditer(text)]
+    urls = [m.group(2).strip() for m in CSS_URL.finditer(CSS_IMPORT_RULE.sub('', text))]
+    return imports, [u for u in urls if u]
+
+
+def is_font_url(url):
+    return urlparse(url).path.lower().endswith(FONT_EXTENSIONS)
+
+
+def parse_srcset(value):
+    """
+    ``[(url, descriptor), ...]`` from a srcset attribute. URLs may contain
+    commas (CDN transforms such as ``w_300,h_200``); a candidate ends at a
+    comma that follows whitespace-separated descriptors or ends the URL.
+    """
+    candidates = []
+    pos, n = 0, len(value)
+    while pos < n:
+        while pos < n and (value[pos].isspace() or value[pos] == ','):
+            pos += 1
+        start = pos
+        while pos < n and not value[pos].isspace():
+            pos += 1
+        url, descriptor = value[start:pos], ''
+        if url.endswith(','):
+            url = url.rstrip(',')
+        else:
+            start = pos
+            while pos < n and value[pos] != ',':
+                pos += 1
+            descriptor = value[start:pos].strip()
+        if url:
+            candidates.append((url, descriptor))
+    return candidates
+
+
+def descriptor_size(descriptor):
+    """
+    ``(width, density)`` of a srcset descriptor: ``800w`` -> (800, None),
+    ``2x`` -> (None, 2.0). No descriptor means 1x.
+    """
+    descriptor = (descriptor or '').strip().lower()
+    try:
+        if descriptor.endswith('w'):
+            return int(descriptor[:-1]), None
+        if descriptor.endswith('x'):
+            return None, float(descriptor[:-1])
+    except ValueError:
+        pass
+    return None, 1.0
+
+
+def effective_width(candidate, display_width=None):
+    """
+    Pixel width of a candidate on one scale for both descriptor kinds: ``w``
+    as given, ``x`` times the <img> width (or ``NOMINAL_IMAGE_WIDTH``).
+    """
+    width, density = descriptor_size(candidate['descriptor'])
+    if width is not None:
+        return width
+    return density * (display_width or NOMINAL_IMAGE_WIDTH)
+
+
+def image_format(candidate):
+    """Format of a candidate (``'webp'``, ``'jpg'``...) from its <source type>, CDN query or extension, or None."""
+    if candidate.get('type'):
+        return candidate['type'].split('/')[-1].split('+')[0].lower().replace('jpeg', 'jpg')
+    parsed = urlparse(candidate['url'])
+    query = parse_qs(parsed.query)
+    for param in FORMAT_PARAMS:
+        if query.get(param):
+            return query[param][0].lower().replace('jpeg', 'jpg')
+    ext = os.path.splitext(parsed.path)[1].lower().lstrip('.')
+    return ext.replace('jpeg', 'jpg') or None
+
+
+def select_variant(image_set, policy='largest', max_width=None, formats=()):
+    """
+    The one URL to download for an <img srcset> or <picture>.
+
+    Candidates in the first of ``formats`` (e.g. ``('avif', 'webp')``) that
+    the group offers are preferred; then ``policy`` picks the largest or
+    smallest by ``effective_width``, so ``w`` and ``x`` candidates compare on
+    one scale. ``max_width`` caps the largest: the widest candidate not above
+    it, or the narrowest one if all are wider. The ``src`` policy ignores
+    srcset and takes the fallback.
+    """
+    candidates = image_set['candidates']
+    if policy == 'src' or not candidates:
+        return image_set['src'] or candidates[0]['url']
+
+    for fmt in formats or ():
+        preferred = [c for c in candidates if image_format(c) == fmt.lower().lstrip('.')]
+        if preferred:
+            candidates = preferred
+            break
+
+    sized = [(effective_width(c, image_set.get('width')), c) for c in candidates]
+    if max_width and policy == 'largest':
+        fitting = [(width, c) for width, c in sized if width <= max_width]
+        if not fitting:
+            return min(sized, key=lambda item: item[0])[1]['url']
+        sized = fitting
+    pick = min if policy == 'smallest' else max
+    return pick(sized, key=lambda item: item[0])[1]['url']
+
+
+def resolve_url(base_url, ref):
+    """Absolute http(s) URL of ``ref`` without its fragment, or None for data:, javascript: and the like."""
+    ref = (ref or '').strip()
+    if not ref or ref.lower().startswith(SKIP_SCHEMES):
+        return None
+    full = urljoin(base_url, ref).split('#')[0]
+    return full if urlparse(full).scheme in ('http', 'https') else None
+
+
+def _remove_dot_segments(path):
+    out = []
+    for segment in path.split('/'):
+        if segment == '..':
+            if len(out) > 1:
+                out.pop()
+        elif segment != '.':
+            out.append(segment)
+    if path.endswith(('/.', '/..')):
+        out.append('')
+    return '/'.join(out) or '/'
+
+
+def _normalize_escapes(path):
+    """Decode escapes of unreserved characters, upper-case the rest, and escape a stray ``%``."""
+    def fix(match):
+        if match.group(1) is None:
+            return '%25'
+        char = chr(int(match.group(1), 16))
+        return char if char in UNRESERVED else f'%{match.group(1).upper()}'
+    return PERCENT_ESCAPE.sub(fix, path)
+
+
+def canonical_url(url):
+    """
+    Canonical form of an http(s) URL, or None for anything else.
+
+    Lowercases the scheme and host, drops userinfo, default ports and the
+    fragment, normalizes percent-escapes (unreserved characters decoded,
+    hex digits upper-cased), resolves ``.``/``..`` segments, and sorts the
+    query after removing tracking parameters (``utm_*`` and click ids).
+    """
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return None
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').rstrip('.')
+    if scheme not in DEFAULT_PORTS or not host:
+        return None
+    try:
+        host = host.encode('idna').decode('ascii')
+    except UnicodeError:
+        pass
+    netloc = host if port is None or port == DEFAULT_PORTS[scheme] else f'{host}:{port}'
+    # Escapes first, so %2E%2E segments are resolved like ..
+    path = _remove_dot_segments(_normalize_escapes(quote(parts.path or '/', safe="/%:@!$&'()*+,;=-._~")))
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+             if not k.lower().startswith('utm_') and k.lower() not in TRACKING_PARAMS]
+    return urlunsplit((scheme, netloc, path, urlencode(sorted(query)), ''))
+
+
+def _charset(content_type):
+    match = re.search(r'charset=["\']?([\w.:-]+)', content_type or '', re.I)
+    return match.group(1) if match else None
+
+
+class PageAssets:
+    """Asset URLs found on one page, by kind, in document order and without duplicates."""
+
+    def __init__(self, base_url):
+        self.page_url = base_url
+        self.base_url = base_url
+        self.urls = {kind: {} for kind in KINDS}
+        self.image_sets = []
+        self.links = {}
+
+    def resolve(self, ref):
+        return resolve_url(self.base_url, ref)
+
+    def add(self, kind, ref):
+        full = self.resolve(ref)
+        if full:
+            self.urls[kind].setdefault(full, None)
+        return full
+
+    def add_link(self, ref):
+        full = self.resolve(ref)
+        if full:
+            self.links.setdefault(full, None)
+
+    def add_css(self, text):
+        imports, urls = css_references(text)
+        for ref in imports:
+            self.add('styles', ref)
+        for ref in urls:
+            self.add('fonts' if is_font_url(ref) else 'images', ref)
+
+    def add_image_set(self, image_set):
+        """Record an <img srcset> or <picture>; its fallback (or first candidate) joins ``images``."""
+        if not image_set['candidates'] and not image_set['src']:
+            return
+        self.image_sets.append(image_set)
+        self.add('images', image_set['src'] or image_set['candidates'][0]['url'])
+
+    def select_images(self, policy='largest', max_width=None, formats=()):
+        """
+        ``images`` with each srcset/<picture> group reduced to the one variant
+        ``select_variant`` picks, in place of its fallback.
+        """
+        groups = {}
+        for image_set in self.image_sets:
+            groups.setdefault(image_set['src'] or image_set['candidates'][0]['url'], []).append(image_set)
+        out = {}
+        for url in self.urls['images']:
+            for image_set in groups.get(url, ()):
+                out.setdefault(select_variant(image_set, policy, max_width, formats), None)
+            if url not in groups:
+                out.setdefault(url, None)
+        return list(out)
+
+    def candidates(self, srcset, type_=None, media=None):
+        out = []
+        for ref, descriptor in parse_srcset(srcset or ''):
+            full = self.resolve(ref)
+            if full:
+                out.append({'url': full, 'descriptor': descriptor, 'type': type_, 'media': media})
+        return out
+
+    def __getitem__(self, kind):
+        return list(self.urls[kind])
+
+    def counts(self):
+        return {kind: len(urls) for kind, urls in self.urls.items()}
+
+    def to_dict(self):
+        return {'url': self.page_url, **{kind: self[kind] for kind in KINDS}, 'image_sets': self.image_sets,
+                'links': list(self.links)}
+
+
+def extract_assets(chunks, base_url, encoding=None):
+    """
+    Collect a page's assets in one streaming pass.
+
+    Args:
+        chunks: Iterable of HTML bytes as they arrive (a str is also accepted).
+        base_url (str): URL the page was fetched from; ``<base href>`` overrides it.
+        encoding (str): Charset from the Content-Type header, if any; otherwise
+            lxml detects it from a BOM or ``<meta charset>``.
+
+    Returns:
+        PageAssets
+    """
+    if isinstance(chunks, str):
+        chunks, encoding = [chunks.encode('utf-8')], 'utf-8'
+    assets = PageAssets(base_url)
+    parser = etree.HTMLPullParser(events=('start', 'end'), encoding=encoding)
+    state = {'picture': None, 'base': False}
+
+    def on_start(el, tag):
+        style = el.get('style')
+        if style and 'url(' in style:
+            assets.add_css(style)
+
+        if tag == 'img':
+            src = assets.resolve(el.get('src') or el.get('data-src'))
+            srcset = el.get('srcset') or el.get('data-srcset')
+            width = (el.get('width') or '').strip()
+            width = int(width) if width.isdigit() else None
+            picture = state['picture']
+            if picture is not None:
+                picture['src'] = picture['src'] or src
+                picture['width'] = picture['width'] or width
+                picture['candidates'] += assets.candidates(srcset)
+            elif srcset:
+                assets.add_image_set({'src': src, 'width': width, 'candidates': assets.candidates(srcset)})
+            elif src:
+                assets.add('images', src)
+        elif tag == 'source':
+            if state['picture'] is not None:
+                state['picture']['candidates'] += assets.candidates(
+                    el.get('srcset') or el.get('data-srcset'), el.get('type'), el.get('media'))
+        elif tag == 'picture':
+            state['picture'] = {'src': None, 'width': None, 'candidates': []}
+        elif tag == 'script':
+            if el.get('src'):
+                assets.add('scripts', el.get('src'))
+        elif tag == 'link':
+            rels = set((el.get('rel') or '').lower().split())
+            href = el.get('href')
+            if not href:
+                return
+            if 'stylesheet' in rels:
+                assets.add('styles', href)
+            elif 'modulepreload' in rels:
+                assets.add('scripts', href)
+            elif 'preload' in rels and (el.get('as') or '').lower() in PRELOAD_KINDS:
+                assets.add(PRELOAD_KINDS[el.get('as').lower()], href)
+            elif rels & ICON_RELS:
+                assets.add('images', href)
+        elif tag in ('a', 'area'):
+            if el.get('href'):
+                assets.add_link(el.get('href'))
+        elif tag == 'iframe':
+            if el.get('src'):
+                assets.add_link(el.get('src'))
+        elif tag == 'video':
+            if el.get('poster'):
+                assets.add('images', el.get('poster'))
+        elif tag == 'base' and not state['base'] and el.get('href'):
+            # Only the first <base> counts
+            state['base'] = True
+            assets.base_url = urljoin(base_url, el.get('href'))
+
+    def on_end(el, tag):
+        if tag == 'style':
+            assets.add_css(el.text or '')
+        elif tag == 'picture' and state['picture'] is not None:
+            assets.add_image_set(state['picture'])
+            state['picture'] = None
+        # Drop finished subtrees so memory stays flat on large pages
+        el.clear(keep_tail=True)
+
+    def drain():
+        for event, el in parser.read_events():
+            if not isinstance(el.tag, str):
+                continue
+            tag = el.tag.lower()
+            if event == 'start':
+                on_start(el, tag)
+            else:
+                on_end(el, tag)
+
+    for chunk in chunks:
+        if chunk:
+            parser.feed(chunk)
+            drain()
+    parser.close()
+    drain()
+    return assets
+
+
+def fetch_page_assets(fetcher, url, headers=None, html_only=False):
+    """
+    Stream ``url`` through ``fetcher`` and return its PageAssets. With
+    ``html_only``, a response that is not HTML returns None unread.
+    """
+    with fetcher.stream(url, headers=headers) as (status, res_headers, chunks):
+        if status != 200:
+            raise Exception(f"HTTP {status} fetching {url}")
+        content_type = (res_headers.get('Content-Type') or '').split(';')[0].strip().lower()
+        if html_only and content_type not in HTML_TYPES:
+            return None
+        return extract_assets(chunks, url, encoding=_charset(res_headers.get('Content-Type')))
+
+
+class PageAssetScraper:
+    """
+    Downloads every asset of a page from one fetch and one parse.
+
+    Each kind is fetched by its tool, into that tool's directory: images by
+    ``image_tool``, scripts by ``script_tool``, stylesheets and fonts by
+    ``style_tool``. All downloads share one pass over the fetch engine's pool.
+    """
+
+    def __init__(self, image_tool, script_tool, style_tool, fetcher=None):
+        self.image_tool = image_tool
+        self.script_tool = script_tool
+        self.style_tool = style_tool
+        self.fetcher = fetcher or FetchEngine()
+
+    def downloaders(self):
+        """Asset kind -> (fetch function, file name prefix)."""
+        return {
+            'images': (self.image_tool.fetch_image, 'image'),
+            'scripts': (self.script_tool.fetch_script, 'script'),
+            'styles': (self.style_tool.fetch_stylesheet, 'style'),
+            'fonts': (self.style_tool.fetch_font, 'font'),
+        }
+
+    def scrape_page(self, url, progress_callback=None, resume=False):
+        """
+        Download every image, script, stylesheet and font ``url`` references.
+        With ``resume`` (after a restart), assets already in the store are not fetched again.
+        """
+        started = time.perf_counter()
+        try:
+            if progress_callback:
+                progress_callback({"status": "scanning", "message": f"Scanning {url}..."})
+
+            assets = fetch_page_assets(self.fetcher, url)
+            work = [('images', u) for u in self.image_tool.image_urls(assets)]
+            work += [(kind, u) for kind in ('scripts', 'styles', 'fonts') for u in assets[kind]]
+            counts = {kind: sum(1 for k, _ in work if k == kind) for kind in KINDS}
+            total = len(work)
+            if progress_callback:
+                summary = ", ".join(f"{n} {kind}" for kind, n in counts.items() if n) or "no assets"
+                progress_callback({"status": "found", "count": total, "counts": counts, "message": f"Found {summary}."})
+
+            downloaders = self.downloaders()
+            files = {kind: [] for kind in KINDS}
+            cache_stats = {"hits": 0, "misses": 0}
+            done = 0
+            for (kind, asset_url), result, error in self.fetcher.map(
+                    lambda item: downloaders[item[0]][0](item[1], resume=resume), work, url_of=lambda item: item[1]):
+                done += 1
+                if error:
+                    print(f"Failed to download {asset_url}: {error}")
+                elif result:
+                    files[kind].append(result['filename'])
+                    count_cache(cache_stats, result)
+
+                if progress_callback:
+                    progress_callback({
+                        "status": "downloading",
+                        "current": done,
+                        "total": total,
+                        "kind": kind,
+                        "filename": result['filename'] if result else os.path.basename(urlparse(asset_url).path)
+                    })
+
+            count = sum(len(names) for names in files.values())
+            SCRAPE_RATE.observe(count / max(time.perf_counter() - started, 1e-6), tool='pages')
+            if progress_callback:
+                progress_callback({"status": "completed", "count": count, "files": files, "cache": cache_stats})
+            return files
+
+        except Exception as e:
+            if progress_callback:
+                progress_callback({"status": "error", "error": str(e)})
+            raise e
@@ -0,0 +1,228 @@
+"""
+Parallel Download
+
+Multi-connection transfers for single videos.
+
+Segmented formats (DASH/HLS) already have a parallel path in yt-dlp
+(``concurrent_fragment_downloads``). Progressive files do not: yt-dlp's
+HttpFD reads them over one connection, which on high-latency links stays
+far below line rate. RangeSplitFD splits such a file into byte ranges and
+fetches them over several connections into one preallocated ``.part``
+file, reporting a single aggregated progress stream.
+
+Dependencies:
+    - yt-dlp
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+
+import yt_dlp
+from yt_dlp.downloader import get_suitable_downloader
+from yt_dlp.downloader.common import FileDownloader
+from yt_dlp.downloader.http import HttpFD
+from yt_dlp.networking import Request
+from yt_dlp.networking.exceptions import HTTPError, TransportError
+from yt_dlp.utils import ContentTooShortError, parse_http_range
+
+MIN_SEGMENT_BYTES = 1024 * 1024
+BLOCK_SIZE = 256 * 1024
+REPORT_INTERVAL = 0.5
+
+
+def parallel_opts(connections):
+    """yt-dlp options enabling parallel fragments and range splitting."""
+    connections = max(1, int(connections or 1))
+    return {
+        'concurrent_fragment_downloads': connections,
+        'range_connections': connections,
+    }
+
+
+class _Segment:
+    __slots__ = ('start', 'end', 'pos')
+
+    def __init__(self, start, end, pos=None):
+        self.start = start
+        self.end = end
+        self.pos = start if pos is None else pos
+
+    @property
+    def done(self):
+        return self.pos > self.end
+
+
+class RangeSplitFD(FileDownloader):
+    """
+    Download a progressive HTTP file over several ranged connections.
+
+    Falls back to yt-dlp's HttpFD when the server does not honour ranges
+    or the file is too small to be worth splitting. Finished ranges are
+    checkpointed next to the ``.part`` file, so an interrupted download
+    resumes where each range stopped.
+    """
+
+    FD_NAME = 'rangesplit'
+
+    @staticmethod
+    def can_split(info_dict, params):
+        if (params.get('range_connections') or 1) < 2:
+            return False
+        if info_dict.get('is_live') or info_dict.get('impersonate') or info_dict.get('request_data'):
+            return False
+        return get_suitable_downloader(info_dict, params) is HttpFD
+
+    def _fallback(self, filename, info_dict):
+        fd = HttpFD(self.ydl, self.params)
+        for ph in self._progress_hooks:
+            fd.add_progress_hook(ph)
+        return fd.real_download(filename, info_dict)
+
+    def _probe(self, url, headers):
+        """Total size if the server answers a one-byte range request, else None."""
+        try:
+            response = self.ydl.urlopen(Request(url, None, {**headers, 'Range': 'bytes=0-0'}))
+        except (TransportError, HTTPError):
+            return None
+        try:
+            if response.status != 206:
+                return None
+            _, _, total = parse_http_range(response.headers.get('Content-Range'))
+            return total
+        finally:
+            response.close()
+
+    def _plan(self, total, connections, state_path):
+        """Ranges to fetch, restored from a checkpoint when one matches."""
+        if state_path and os.path.exists(state_path):
+            try:
+                with open(state_path, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+                if state.get('total') == total:
+                    return [_Segment(*seg) for seg in state['segments']]
+            except (OSError, ValueError, TypeError, KeyError):
+                pass
+        count = max(1, min(connections, total // MIN_SEGMENT_BYTES))
+        size = -(-total // count)
+        return [_Segment(start, min(start + size, total) - 1) for start in range(0, total, size)]
+
+    @staticmethod
+    def _checkpoint(state_path, total, segments):
+        tmp = f"{state_path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'total': total, 'segments': [[s.start, s.end, s.pos] for s in segments]}, f)
+        os.replace(tmp, state_path)
+
+    def real_download(self, filename, info_dict):
+        url = info_dict['url']
+        headers = dict(info_dict.get('http_headers') or {})
+        connections = self.params.get('range_connections') or 1
+
+        total = self._probe(url, headers)
+        if not total or total < 2 * MIN_SEGMENT_BYTES:
+            return self._fallback(filename, info_dict)
+
+        tmpfilename = self.temp_name(filename)
+        state_path = f"{tmpfilename}.ranges"
+        resume = self.params.get('continuedl', True) and os.path.exists(tmpfilename)
+        segments = self._plan(total, connections, state_path if resume else None)
+        resumed = sum(s.pos - s.start for s in segments)
+        if resumed:
+            self.report_resuming_byte(resumed)
+
+        self.report_destination(filename)
+        with open(tmpfilename, 'r+b' if os.path.exists(tmpfilename) else 'wb') as f:
+            f.truncate(total)
+
+        lock = threading.Lock()
+        cancel = threading.Event()
+        retries = self.params.get('retries', 10)
+
+        def fetch(seg):
+            attempt = 0
+            while not seg.done and not cancel.is_set():
+                try:
+                    response = self.ydl.urlopen(Request(url, None, {**headers, 'Range': f'bytes={seg.pos}-{seg.end}'}))
+                    try:
+                        if response.status != 206:
+                            raise ContentTooShortError(seg.pos - seg.start, seg.end - seg.start + 1)
+                        with open(tmpfilename, 'r+b') as out:
+                            out.seek(seg.pos)
+                            while not seg.done and not cancel.is_set():
+                                chunk = response.read(min(BLOCK_SIZE, seg.end - seg.pos + 1))
+                                if not chunk:
+                                    break
+                                out.write(chunk)
+                                with lock:
+                                    seg.pos += len(chunk)
+                    finally:
+                        response.close()
+                    if not seg.done and not cancel.is_set():
+                        raise ContentTooShortError(seg.pos - seg.start, seg.end - seg.start + 1)
+                except (TransportError, HTTPError, ContentTooShortError) as e:
+                    attempt += 1
+                    if attempt > retries:
+                        raise
+                    self.report_retry(e, attempt, retries, fatal=False)
+
+        start = time.time()
+        workers = sum(1 for s in segments if not s.done) or 1
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='range') as pool:
+            futures = [pool.submit(fetch, s) for s in segments if not s.done]
+            pending = set(futures)
+            try:
+                while pending:
+                    finished, pending = wait(pending, timeout=REPORT_INTERVAL, return_when=FIRST_EXCEPTION)
+                    for future in finished:
+                        future.result()
+                    with lock:
+                        downloaded = sum(s.pos - s.start for s in segments)
+                        active = sum(1 for s in segments if not s.done)
+                    self._checkpoint(state_path, total, segments)
+                    speed = self.calc_speed(start, time.time(), downloaded - resumed)
+                    self._hook_progress({
+                        'status': 'downloading',
+                        'downloaded_bytes': downloaded,
+                        'total_bytes': total,
+                        'tmpfilename': tmpfilename,
+                        'filename': filename,
+                        'eta': self.calc_eta(speed, total - downloaded),
+                        'speed': speed,
+                        'elapsed': time.time() - start,
+                        'connections': active,
+                    }, info_dict)
+            except BaseException:
+                cancel.set()
+                with lock:
+                    self._checkpoint(state_path, total, segments)
+                raise
+
+        if os.path.exists(state_path):
+            os.remove(state_path)
+        self.try_rename(tmpfilename, filename)
+        self._hook_progress({
+            'downloaded_bytes': total,
+            'total_bytes': total,
+            'filename': filename,
+            'status': 'finished',
+            'elapsed': time.time() - start,
+        }, info_dict)
+        return True
+
+
+class ParallelYoutubeDL(yt_dlp.YoutubeDL):
+    """YoutubeDL that routes progressive HTTP formats through RangeSplitFD."""
+
+    def dl(self, name, info, subtitle=False, test=False):
+        if test or subtitle or name == '-' or not RangeSplitFD.can_split(info, self.params):
+            return super().dl(name, info, subtitle=subtitle, test=test)
+        fd = RangeSplitFD(self, self.params)
+        for ph in self._progress_hooks:
+            fd.add_progress_hook(ph)
+        new_info = self._copy_infodict(info)
+        if new_info.get('http_headers') is None:
+            new_info['http_headers'] = self._calc_headers(new_info)
+        return fd.download(name, new_info, subtitle)
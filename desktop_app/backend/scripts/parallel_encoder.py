@@ -0,0 +1,157 @@
+"""
+Parallel Encoder
+
+Segment-parallel H.264 encoding for long videos.
+
+One libx264 process stops scaling well long before a many-core machine
+is busy, especially on the slower presets. The input is split at
+keyframes into chunks, the chunks are encoded by concurrent ffmpeg
+processes, and the encoded chunks are joined losslessly (concat demuxer,
+stream copy) with the audio into the final MP4 with +faststart. Chunks
+start on source keyframes and are trimmed by decoded timestamps, so no
+frame is duplicated or dropped at the joins.
+
+Dependencies:
+    - ffmpeg / ffprobe
+"""
+
+import bisect
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+
+try:
+    from .ffmpeg_progress import format_eta, run_ffmpeg
+    from .smart_cut import KeyframeIndex
+except ImportError:
+    from ffmpeg_progress import format_eta, run_ffmpeg
+    from smart_cut import KeyframeIndex
+
+# Chunks shorter than this cost more in process start-up and lookahead than they save
+MIN_CHUNK_SECONDS = 20
+
+
+def chunk_bounds(keyframes, duration, chunks, min_chunk=MIN_CHUNK_SECONDS):
+    """
+    Split [0, duration] into at most ``chunks`` pieces at keyframes.
+
+    Each cut is the keyframe nearest to an even split point. Returns the
+    list of boundaries, starting with 0 and ending with ``duration``.
+    """
+    chunks = max(1, min(chunks, int(duration // min_chunk) or 1))
+    bounds = [0.0]
+    for i in range(1, chunks):
+        target = duration * i / chunks
+        pos = bisect.bisect_left(keyframes, target)
+        candidates = keyframes[max(0, pos - 1):pos + 1]
+        if not candidates:
+            continue
+        cut = min(candidates, key=lambda k: abs(k - target))
+        if cut - bounds[-1] >= min_chunk and duration - cut >= min_chunk:
+            bounds.append(cut)
+    bounds.append(duration)
+    return bounds
+
+
+class ParallelEncoder:
+    """
+    Args:
+        workers (int): Concurrent chunk encoders (default: one per core, at most 8).
+        index (KeyframeIndex): Keyframe cache shared with other cutters.
+    """
+
+    def __init__(self, workers=None, index=None):
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self.index = index or KeyframeIndex()
+
+    def encode(self, input_path, output_path, crf='18', preset='slow', audio='encode',
+               duration=None, threads=None, progress_callback=None):
+        """
+        Encode ``input_path`` to an H.264 MP4 in parallel chunks.
+
+        ``audio`` is ``'copy'``, ``'encode'`` or None (no audio). ``threads``
+        is the CPU budget of the whole job (default: every core); chunk
+        encoders and their ``-threads`` are sized to fit inside it. Returns a
+        summary with the chunk boundaries used.
+        """
+        info = self.index.get(input_path)
+        duration = duration or info['duration']
+        budget = threads or os.cpu_count() or 1
+        workers = max(1, min(self.workers, budget))
+        bounds = chunk_bounds(info['keyframes'], duration, workers * 2)
+        chunks = list(zip(bounds[:-1], bounds[1:]))
+        workers = min(workers, len(chunks))
+        threads = max(1, budget // workers)
+
+        # Latest -progress snapshot per chunk, summed into one job-level report
+        snapshots = [None] * len(chunks)
+        lock = threading.Lock()
+        procs = []
+        started = time.time()
+
+        def report(i, snapshot):
+            with lock:
+                snapshots[i] = snapshot
+                live = [s for s in snapshots if s]
+                encoded = sum(min(s['out_seconds'], end - start) for s, (start, end) in zip(snapshots, chunks) if s)
+                fps = sum(s['fps'] for s in live if not s['done'])
+                size = sum(s['total_size'] for s in live)
+            if progress_callback:
+                elapsed = time.time() - started
+                percent = encoded / duration * 100 if duration else 0
+                speed = encoded / elapsed if elapsed > 0 else 0.0
+                eta = (duration - encoded) / speed if speed else None
+                progress_callback({
+                    "status": "converting",
+                    "percent": min(percent, 99.9),
+                    "fps": fps,
+                    "speed": speed,
+                    "size_bytes": size,
+                    "eta": format_eta(eta),
+                    "eta_seconds": eta,
+                    "chunks": len(chunks),
+                    "message": f"Encoding {len(chunks)} chunks in parallel... {percent:.1f}% ({speed:.2f}x)"
+                })
+
+        with tempfile.TemporaryDirectory(prefix='.chunks-', dir=os.path.dirname(os.path.abspath(output_path))) as tmp:
+            def encode_chunk(i):
+                start, end = chunks[i]
+                cmd = ['ffmpeg', '-y', '-ss', str(start), '-i', str(input_path)]
+                if i < len(chunks) - 1:
+                    cmd += ['-t', str(end - start)]
+                cmd += ['-map', '0:v:0', '-c:v', 'libx264', '-crf', str(crf), '-preset', preset,
+                        '-threads', str(threads), os.path.join(tmp, f"{i:04d}.mkv")]
+                run_ffmpeg(cmd, on_progress=lambda snapshot: report(i, snapshot), procs=procs)
+
+            def encode_audio():
+                cmd = ['ffmpeg', '-y', '-i', str(input_path), '-map', '0:a:0', '-vn']
+                cmd += ['-c:a', 'copy'] if audio == 'copy' else ['-c:a', 'aac', '-b:a', '192k']
+                run_ffmpeg(cmd + [os.path.join(tmp, 'audio.mka')], procs=procs)
+
+            with ThreadPoolExecutor(max_workers=workers + 1, thread_name_prefix='encode') as pool:
+                # Audio first, so it takes the spare thread rather than an extra chunk encoder
+                futures = [pool.submit(encode_audio)] if audio else []
+                futures += [pool.submit(encode_chunk, i) for i in range(len(chunks))]
+                finished, pending = wait(futures, return_when=FIRST_EXCEPTION)
+                failed = next((f for f in finished if f.exception()), None)
+                if failed:
+                    for future in pending:
+                        future.cancel()
+                    for process in procs:
+                        if process.poll() is None:
+                            process.kill()
+                    raise failed.exception()
+
+            concat_list = os.path.join(tmp, 'chunks.txt')
+            with open(concat_list, 'w', encoding='utf-8') as f:
+                f.writelines(f"file '{os.path.join(tmp, f'{i:04d}.mkv')}'\n" for i in range(len(chunks)))
+
+            cmd = ['ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', concat_list]
+            if audio:
+                cmd += ['-i', os.path.join(tmp, 'audio.mka'), '-map', '0:v:0', '-map', '1:a:0']
+            cmd += ['-c', 'copy', '-movflags', '+faststart', str(output_path)]
+            run_ffmpeg(cmd)
+
+        return {"chunks": len(chunks), "workers": workers, "threads_per_chunk": threads, "bounds": bounds}
@@ -0,0 +1,231 @@
+"""
+Progress Channel
+
+Rate-limited progress delivery from worker threads to WebSocket clients.
+
+ProgressThrottle runs on the worker side and coalesces bursts of progress
+updates per job, so the event loop only sees a bounded frame rate.
+ConnectionManager runs on the event loop and keeps one bounded outbox per
+client, so a slow socket only ever delays itself.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    from .metrics import PROGRESS_COALESCED, WS_CLIENTS, WS_FRAMES_DROPPED, WS_FRAMES_SENT
+except ImportError:
+    from metrics import PROGRESS_COALESCED, WS_CLIENTS, WS_FRAMES_DROPPED, WS_FRAMES_SENT
+
+TERMINAL_STATUSES = ('completed', 'error')
+
+# Frames that carry data of their own (e.g. one resolved playlist entry) rather
+# than a replaceable progress state; never coalesced or dropped as stale
+EVENT_STATUSES = ('entry',)
+
+
+def is_terminal(data):
+    return bool(data) and data.get('status') in TERMINAL_STATUSES
+
+
+def is_event(data):
+    return bool(data) and data.get('status') in EVENT_STATUSES
+
+
+class ProgressThrottle:
+    """
+    Coalesce progress updates to at most ``max_rate`` frames per second per job.
+
+    Frames whose status differs from the last one sent (e.g. "found",
+    "merging"), terminal frames and event frames go out immediately;
+    repeated frames of the same status inside the window are replaced by
+    the newest one, which a background flusher delivers when the window
+    opens.
+    """
+
+    def __init__(self, emit, max_rate=10.0):
+        self.emit = emit
+        self.interval = 1.0 / max_rate if max_rate > 0 else 0
+        self._state = {}
+        self._cond = threading.Condition()
+        self._flusher = threading.Thread(target=self._flush_loop, name="progress-flusher", daemon=True)
+        self._flusher.start()
+
+    def __call__(self, job, data):
+        now = time.monotonic()
+        # Emitting under the lock keeps a flushed frame from overtaking a terminal one
+        with self._cond:
+            state = self._state.setdefault(job.id, {'last_sent': 0.0, 'last_status': None, 'pending': None})
+            if is_terminal(data):
+                self._state.pop(job.id, None)
+                self.emit(job, data)
+            elif is_event(data):
+                self.emit(job, data)
+            elif data.get('status') != state['last_status'] or now - state['last_sent'] >= self.interval:
+                state['last_sent'] = now
+                state['last_status'] = data.get('status')
+                state['pending'] = None
+                self.emit(job, data)
+            else:
+                if state['pending']:
+                    PROGRESS_COALESCED.inc()
+                state['pending'] = (job, data)
+                self._cond.notify()
+
+    def _flush_loop(self):
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                wait = None
+                for state in self._state.values():
+                    if not state['pending']:
+                        continue
+                    ready_at = state['last_sent'] + self.interval
+                    if ready_at <= now:
+                        job, data = state['pending']
+                        state['pending'] = None
+                        state['last_sent'] = now
+                        self.emit(job, data)
+                    else:
+                        wait = ready_at - now if wait is None else min(wait, ready_at - now)
+                self._cond.wait(timeout=wait)
+
+
+class ClientChannel:
+    """
+    One WebSocket client with its subscriptions and a bounded outbox.
+
+    The outbox is keyed by job, so a newer frame for a job replaces a stale
+    one that has not been sent yet. When the outbox is full the oldest
+    non-terminal frame is dropped.
+    """
+
+    def __init__(self, websocket, job_ids=None, max_pending=64, send_timeout=10.0):
+        self.websocket = websocket
+        self.job_ids = set(job_ids) if job_ids else None  # None = all jobs
+        self.max_pending = max_pending
+        self.send_timeout = send_timeout
+        self.dropped = 0
+        self.task = None
+        self._outbox = OrderedDict()
+        self._wakeup = asyncio.Event()
+        self._seq = 0
+
+    def wants(self, job_id):
+        return self.job_ids is None or job_id in self.job_ids
+
+    def enqueue(self, key, message, terminal=False):
+        if terminal:
+            # Keep terminal/event frames distinct so later frames never overwrite them
+            self._seq += 1
+            key = (key, 'final', self._seq)
+        if key in self._outbox:
+            self.dropped += 1
+            WS_FRAMES_DROPPED.inc(reason='replaced')
+            del self._outbox[key]
+        self._outbox[key] = (message, terminal)
+        while len(self._outbox) > self.max_pending:
+            victim = next((k for k, (_, final) in self._outbox.items() if not final), None)
+            if victim is None:
+                victim = next(iter(self._outbox))
+            del self._outbox[victim]
+            self.dropped += 1
+            WS_FRAMES_DROPPED.inc(reason='overflow')
+        self._wakeup.set()
+
+    async def run(self):
+        """Send queued frames until the socket fails or stalls."""
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._outbox:
+                _, (message, _) = self._outbox.popitem(last=False)
+                await asyncio.wait_for(self.websocket.send_text(message), timeout=self.send_timeout)
+                WS_FRAMES_SENT.inc()
+
+
+class ConnectionManager:
+    """
+    Tracks WebSocket clients and routes job frames to their subscribers.
+
+    ``snapshot_provider(job_ids)`` returns the current state of the given jobs
+    (or all jobs for None); it is sent to clients when they connect or
+    subscribe so a reconnecting UI can catch up without replaying history.
+    """
+
+    def __init__(self, snapshot_provider=None, max_pending=64):
+        self.snapshot_provider = snapshot_provider
+        self.max_pending = max_pending
+        self.clients = {}
+
+    async def connect(self, websocket, job_ids=None):
+        await websocket.accept()
+        client = ClientChannel(websocket, job_ids=job_ids, max_pending=self.max_pending)
+        self.clients[websocket] = client
+        WS_CLIENTS.set(len(self.clients))
+        client.task = asyncio.create_task(self._pump(client))
+        self.send_snapshot(client, job_ids)
+        return client
+
+    def disconnect(self, websocket):
+        client = self.clients.pop(websocket, None)
+        WS_CLIENTS.set(len(self.clients))
+        if client and not client.task.done():
+            client.task.cancel()
+
+    def subscribe(self, websocket, job_ids):
+        client = self.clients.get(websocket)
+        if not client:
+            return
+        if client.job_ids is None:
+            client.job_ids = set()
+        client.job_ids.update(job_ids)
+        self.send_snapshot(client, job_ids)
+
+    def unsubscribe(self, websocket, job_ids):
+        client = self.clients.get(websocket)
+        if client and client.job_ids is not None:
+            client.job_ids.difference_update(job_ids)
+
+    def send_snapshot(self, client, job_ids=None):
+        if not self.snapshot_provider:
+            return
+        jobs = self.snapshot_provider(job_ids)
+        client.enqueue('snapshot', json.dumps({"type": "snapshot", "jobs": jobs}, default=str))
+
+    def publish(self, job_id, message, terminal=False):
+        """Queue a serialized frame for every client subscribed to ``job_id``. Loop thread only."""
+        for client in self.clients.values():
+            if client.wants(job_id):
+                client.enqueue(job_id, message, terminal)
+
+    async def handle_message(self, websocket, text):
+        """Apply a client control message: {"action": "subscribe"|"unsubscribe", "job_ids": [...]}"""
+        try:
+            msg = json.loads(text)
+        except ValueError:
+            return
+        if not isinstance(msg, dict):
+            return
+        job_ids = msg.get('job_ids') or ([msg['job_id']] if msg.get('job_id') else [])
+        if msg.get('action') == 'subscribe':
+            self.subscribe(websocket, job_ids)
+        elif msg.get('action') == 'unsubscribe':
+            self.unsubscribe(websocket, job_ids)
+
+    async def _pump(self, client):
+        try:
+            await client.run()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Dropping slow or broken WebSocket client: {e}")
+            self.clients.pop(client.websocket, None)
+            WS_CLIENTS.set(len(self.clients))
+            try:
+                await client.websocket.close()
+            except Exception:
+                pass
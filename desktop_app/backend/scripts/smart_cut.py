@@ -0,0 +1,232 @@
+"""
+Smart Cut
+
+Frame-accurate cuts without re-encoding the whole range.
+
+Every whole GOP inside the cut is stream-copied. Only the partial GOPs
+at the two edges are re-encoded. The pieces are joined as MPEG-TS, which
+carries the codec parameter sets in-band, so re-encoded and copied GOPs
+concatenate cleanly. Audio is re-encoded across the whole cut because it
+is cheap and keeps sync exact. Cut time therefore depends on GOP length,
+not clip length.
+
+Keyframe positions come from ffprobe and are cached per file.
+
+Dependencies:
+    - ffmpeg / ffprobe
+"""
+
+import bisect
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+import threading
+from collections import OrderedDict
+
+try:
+    from .ffmpeg_progress import run_ffmpeg
+except ImportError:
+    from ffmpeg_progress import run_ffmpeg
+
+# Codecs whose GOPs can be copied and joined with re-encoded edges:
+# codec_name -> (edge encoder, Annex B bitstream filter for MPEG-TS pieces)
+SMART_CUT_CODECS = {
+    'h264': ('libx264', 'h264_mp4toannexb'),
+    'hevc': ('libx265', 'hevc_mp4toannexb'),
+}
+
+# Tolerance (seconds) when comparing cut points with keyframe timestamps
+EPSILON = 0.001
+
+
+def _probe(cmd):
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{cmd[0]} failed: {result.stderr.strip()[-500:]}")
+    return result.stdout
+
+
+class KeyframeIndex:
+    """
+    Video keyframe positions per file, cached by path, size and mtime.
+
+    Positions are seconds from the start of the file, the same reference
+    ffmpeg's ``-ss`` uses.
+
+    Args:
+        cache_dir (str): Optional directory for persisting probes across runs.
+        max_entries (int): In-memory LRU size.
+    """
+
+    def __init__(self, cache_dir=None, max_entries=256):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def _key(path):
+        st = os.stat(path)
+        return f"{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}"
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, f"{hashlib.sha1(key.encode()).hexdigest()}.json")
+
+    def get(self, path):
+        """Probe result for ``path``: codec, pix_fmt, start_time, duration and keyframes."""
+        key = self._key(path)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        info = None
+        if self.cache_dir and os.path.exists(self._disk_path(key)):
+            try:
+                with open(self._disk_path(key), 'r', encoding='utf-8') as f:
+                    info = json.load(f)
+            except (OSError, ValueError):
+                info = None
+        if info is None:
+            info = self.probe(path)
+            if self.cache_dir:
+                tmp = f"{self._disk_path(key)}.tmp"
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(info, f)
+                os.replace(tmp, self._disk_path(key))
+
+        with self._lock:
+            self._cache[key] = info
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return info
+
+    @staticmethod
+    def probe(path):
+        meta = json.loads(_probe([
+            'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+            '-show_entries', 'stream=codec_name,pix_fmt:format=start_time,duration',
+            '-of', 'json', str(path),
+        ]))
+        stream = (meta.get('streams') or [{}])[0]
+        fmt = meta.get('format') or {}
+        start_time = float(fmt.get('start_time') or 0)
+
+        # Packet flags only: no decoding, so this is fast even for long files
+        packets = _probe([
+            'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+            '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', str(path),
+        ])
+        keyframes = []
+        for line in packets.splitlines():
+            pts, _, flags = line.partition(',')
+            if 'K' in flags and pts not in ('', 'N/A'):
+                keyframes.append(round(float(pts) - start_time, 6))
+
+        return {
+            'codec': stream.get('codec_name'),
+            'pix_fmt': stream.get('pix_fmt'),
+            'start_time': start_time,
+            'duration': float(fmt.get('duration') or 0),
+            'keyframes': sorted(set(keyframes)),
+        }
+
+
+def plan_cut(keyframes, start, end):
+    """
+    Split [start, end] into ``('encode' | 'copy', from, to)`` pieces.
+
+    Whole GOPs between the first and last keyframe inside the range are
+    copied; the partial GOPs before and after them are encoded.
+    """
+    lo = bisect.bisect_left(keyframes, start - EPSILON)
+    hi = bisect.bisect_right(keyframes, end + EPSILON)
+    inside = keyframes[lo:hi]
+    if len(inside) < 2:
+        return [('encode', start, end)]
+
+    first, last = inside[0], inside[-1]
+    plan = []
+    if first - start > EPSILON:
+        plan.append(('encode', start, first))
+    plan.append(('copy', first, last))
+    if end - last > EPSILON:
+        plan.append(('encode', last, end))
+    return plan
+
+
+DEFAULT_INDEX = KeyframeIndex()
+
+
+def smart_cut(src, start, end, output, index=None, crf=18, preset='veryfast', progress_callback=None):
+    """
+    Cut [start, end] (seconds from the start of ``src``) into ``output``.
+
+    Falls back to a full re-encode when the codec cannot be smart-cut or
+    the range holds less than one whole GOP. Returns a summary with the
+    seconds copied and the seconds encoded.
+    """
+    info = (index or DEFAULT_INDEX).get(src)
+    codec = SMART_CUT_CODECS.get(info['codec'])
+    plan = plan_cut(info['keyframes'], start, end) if codec else [('encode', start, end)]
+    duration = end - start
+    encoder, bsf = codec or ('libx264', None)
+    encode_args = ['-c:v', encoder, '-preset', preset, '-crf', str(crf)]
+    if info.get('pix_fmt'):
+        encode_args += ['-pix_fmt', info['pix_fmt']]
+
+    summary = {
+        'output': output,
+        'mode': 'smart' if any(mode == 'copy' for mode, _, _ in plan) else 'encode',
+        'copied': sum(b - a for mode, a, b in plan if mode == 'copy'),
+        'encoded': sum(b - a for mode, a, b in plan if mode == 'encode'),
+        'pieces': len(plan),
+    }
+
+    # Written inside the temp dir and renamed into place, so ``output`` only ever exists complete
+    with tempfile.TemporaryDirectory(prefix='.smartcut-', dir=os.path.dirname(os.path.abspath(output))) as tmp:
+        result = os.path.join(tmp, 'out.mp4')
+        if summary['mode'] == 'encode':
+            run_ffmpeg(['ffmpeg', '-y', '-ss', str(start), '-i', str(src), '-t', str(duration),
+                        '-map', '0:v:0', '-map', '0:a:0?', '-c:v', 'libx264', '-preset', preset, '-crf', str(crf),
+                        '-c:a', 'aac', '-b:a', '192k', '-movflags', '+faststart', result])
+            os.replace(result, output)
+            if progress_callback:
+                progress_callback(1.0)
+            return summary
+
+        pieces = []
+        for i, (mode, a, b) in enumerate(plan):
+            piece = os.path.join(tmp, f"{i:03d}.ts")
+            if mode == 'copy':
+                # Seek just past the keyframe so the demuxer lands on it, and
+                # stop before the keyframe that opens the tail
+                seek = a + EPSILON
+                cmd = ['ffmpeg', '-y', '-ss', str(seek), '-i', str(src), '-t', str(b - seek),
+                       '-map', '0:v:0', '-c', 'copy', '-bsf:v', bsf, '-f', 'mpegts', piece]
+            else:
+                cmd = ['ffmpeg', '-y', '-ss', str(a), '-i', str(src), '-t', str(b - a),
+                       '-map', '0:v:0', *encode_args, '-f', 'mpegts', piece]
+            run_ffmpeg(cmd)
+            pieces.append(piece)
+            if progress_callback:
+                progress_callback((i + 1) / (len(plan) + 1))
+
+        concat_list = os.path.join(tmp, 'pieces.txt')
+        with open(concat_list, 'w', encoding='utf-8') as f:
+            f.writelines(f"file '{piece}'\n" for piece in pieces)
+
+        run_ffmpeg(['ffmpeg', '-y',
+                    '-f', 'concat', '-safe', '0', '-i', concat_list,
+                    '-ss', str(start), '-t', str(duration), '-i', str(src),
+                    '-map', '0:v:0', '-map', '1:a:0?', '-c:v', 'copy', '-c:a', 'aac', '-b:a', '192k',
+                    *(['-tag:v', 'hvc1'] if info['codec'] == 'hevc' else []),
+                    '-movflags', '+faststart', result])
+        os.replace(result, output)
+        if progress_callback:
+            progress_callback(1.0)
+    return summary
@@ -1,25 +1,47 @@
 """
 Web CSS Scraper
 
-This script downloads all CSS files from a specified website URL.
-It handles both <link> stylesheet references and @import rules.
-The script uses rotating user agents and respects server load with delays.
+This script downloads all CSS files from a specified website URL, with
+everything they depend on.
+It handles both <link> stylesheet references and @import rules, and
+follows @import and url() inside the downloaded stylesheets recursively
+(nested sheets, fonts, images). Sub-resources are fetched concurrently
+through the shared fetch engine and the references are rewritten to the
+local copies, so the saved styles work offline.
+The script uses rotating user agents.
+
+Output layout, per site:
+
+    <output_dir>/<host>/*.css       stylesheets (references rewritten)
+    <output_dir>/<host>/fonts/      fonts
+    <output_dir>/<host>/images/     images and other url() targets
 
 Dependencies:
     - requests: For making HTTP requests
-    - beautifulsoup4: For parsing HTML content
+    - lxml: For parsing HTML content (see page_assets)
     - random: For rotating user agents
 
 Author: IvanSS22030
 Date: May 2025
 """
 
-import requests
-from bs4 import BeautifulSoup
+import hashlib
 import os
 import random
-from urllib.parse import urljoin
+import shutil
+import tempfile
 import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from urllib.parse import urlparse
+
+try:
+    from .fetch_engine import FetchEngine, count_cache, url_filename
+    from .metrics import SCRAPE_RATE
+    from .page_assets import CSS_REFERENCE, canonical_url, css_references, fetch_page_assets, is_font_url, resolve_url
+except ImportError:
+    from fetch_engine import FetchEngine, count_cache, url_filename
+    from metrics import SCRAPE_RATE
+    from page_assets import CSS_REFERENCE, canonical_url, css_references, fetch_page_assets, is_font_url, resolve_url
 
 # List of common user agents for request rotation
 user_agents = [
@@ -41,80 +63,238 @@ def get_random_user_agent():
     return random.choice(user_agents)
 
 
-def download_css(url, output_dir=None):
+class StyleScraper:
+    """
+    Stylesheets and everything they reference.
+
+    Args:
+        output_dir (str): Directory to save CSS, font and image files.
+        fetcher (FetchEngine, optional): Shared fetch engine; pass one with an
+            asset store to deduplicate files across runs.
+    """
+
+    def __init__(self, output_dir="style files", fetcher=None):
+        self.output_dir = output_dir
+        self.fetcher = fetcher or FetchEngine()
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+
+    def fetch_stylesheet(self, css_url, resume=False, output_dir=None):
+        # Use a different user agent for each request
+        headers = {'User-Agent': get_random_user_agent()}
+        # Stable URL-derived filename; content is stored once per hash
+        return self.fetcher.download(css_url, output_dir or self.output_dir, url_filename(css_url, 'style'),
+                                     default_ext='.css', headers=headers, resume=resume)
+
+    def fetch_font(self, font_url, resume=False, output_dir=None):
+        return self.fetcher.download(font_url, output_dir or self.output_dir, url_filename(font_url, 'font'),
+                                     resume=resume)
+
+    def fetch_image(self, img_url, resume=False, output_dir=None):
+        return self.fetcher.download(img_url, output_dir or self.output_dir, url_filename(img_url, 'image'),
+                                     resume=resume)
+
+    def download_styles(self, url, progress_callback=None, resume=False):
+        """
+        Download the stylesheets of the page at ``url``, recursively with
+        their imports, fonts and images, and rewrite references to the local files.
+        With ``resume`` (after a restart), files already in the store are not fetched again.
+        """
+        started = time.perf_counter()
+        try:
+            if progress_callback:
+                progress_callback({"status": "scanning", "message": f"Scanning {url}..."})
+            headers = {'User-Agent': get_random_user_agent()}
+            roots = fetch_page_assets(self.fetcher, url, headers=headers)['styles']
+            if progress_callback:
+                progress_callback({"status": "found", "count": len(roots), "message": f"Found {len(roots)} stylesheets."})
+
+            site = urlparse(url).hostname or 'site'
+            summary = self.download_stylesheets(roots, os.path.join(self.output_dir, site),
+                                                progress_callback=progress_callback, resume=resume)
+            SCRAPE_RATE.observe(summary['count'] / max(time.perf_counter() - started, 1e-6), tool='styles')
+            if progress_callback:
+                progress_callback({"status": "completed", **summary})
+            return summary
+
+        except Exception as e:
+            if progress_callback:
+                progress_callback({"status": "error", "error": str(e)})
+            raise e
+
+    def download_stylesheets(self, css_urls, site_dir, progress_callback=None, resume=False):
+        """
+        Fetch ``css_urls`` and, as each sheet arrives, the sheets it imports
+        and the fonts and images it uses, all concurrently. Sheets are
+        written to ``site_dir`` once everything is in, with @import and
+        url() pointing at the local copies; a reference that failed to
+        download keeps its original URL.
+
+        A sheet is saved under its URL's basename. Sheets of one page that
+        share a basename get a suffix hashed from their canonical URL, so
+        names do not depend on download order and re-runs overwrite them.
+        """
+        dirs = {'fonts': os.path.join(site_dir, 'fonts'), 'images': os.path.join(site_dir, 'images')}
+        for path in dirs.values():
+            os.makedirs(path, exist_ok=True)
+        # Sheets land here first, one directory per URL, and stay until all are in;
+        # the saved copy is rewritten, the fetched one is left to the store
+        staging = tempfile.mkdtemp(prefix='.fetch-', dir=site_dir)
+
+        fetchers = {
+            'styles': lambda u: self._fetch_sheet(u, staging, resume),
+            'fonts': lambda u: self.fetch_font(u, resume=resume, output_dir=dirs['fonts']),
+            'images': lambda u: self.fetch_image(u, resume=resume, output_dir=dirs['images']),
+        }
+        futures = {}
+        seen = set()
+        local = {}
+        sheets = {}
+        cache_stats = {"hits": 0, "misses": 0}
+        failed = 0
+
+        def submit(kind, asset_url):
+            if asset_url and asset_url not in seen:
+                seen.add(asset_url)
+                futures[self.fetcher.submit(fetchers[kind], asset_url)] = (kind, asset_url)
+
+        try:
+            for css_url in css_urls:
+                submit('styles', css_url)
+            done_count = 0
+            while futures:
+                done, _ = wait(list(futures), return_when=FIRST_COMPLETED)
+                for future in done:
+                    kind, asset_url = futures.pop(future)
+                    done_count += 1
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = None
+                        print(f"Error downloading {asset_url}: {e}")
+                    if not result:
+                        failed += 1
+                        continue
+                    if kind == 'styles':
+                        result, text = result
+                        sheets[asset_url] = (result, text)
+                        # Follow the sheet's own references while the rest is still downloading
+                        imports, urls = css_references(text)
+                        for ref in imports:
+                            submit('styles', resolve_url(asset_url, ref))
+                        for ref in urls:
+                            submit('fonts' if is_font_url(ref) else 'images', resolve_url(asset_url, ref))
+                    else:
+                        local[asset_url] = os.path.relpath(result['path'], site_dir).replace(os.sep, '/')
+                    count_cache(cache_stats, result)
+
+                    if progress_callback:
+                        progress_callback({
+                            "status": "downloading",
+                            "current": done_count,
+                            "total": done_count + len(futures),
+                            "kind": kind,
+                            "filename": result['filename'],
+                        })
+
+            local.update(sheet_names({css_url: result['filename'] for css_url, (result, _) in sheets.items()}))
+            files = []
+            for css_url, (result, text) in sheets.items():
+                path = os.path.join(site_dir, local[css_url])
+                tmp = f"{path}.part"
+                with open(tmp, 'w', encoding='utf-8', errors='surrogateescape', newline='') as f:
+                    f.write(rewrite_css(text, css_url, local))
+                os.replace(tmp, path)
+                files.append(local[css_url])
+        finally:
+            if self.fetcher.store:
+                for result, _ in sheets.values():
+                    self.fetcher.store.unlink(result['path'])
+            shutil.rmtree(staging, ignore_errors=True)
+
+        return {
+            "count": len(local),
+            "files": files,
+            "stylesheets": len(sheets),
+            "fonts": sum(1 for p in local.values() if p.startswith('fonts/')),
+            "images": sum(1 for p in local.values() if p.startswith('images/')),
+            "failed": failed,
+            "cache": cache_stats,
+        }
+
+    def _fetch_sheet(self, css_url, staging, resume):
+        # A directory per URL: sheets with equal names or bytes never share a staged file
+        sheet_dir = os.path.join(staging, _url_hash(css_url))
+        os.makedirs(sheet_dir, exist_ok=True)
+        result = self.fetch_stylesheet(css_url, resume=resume, output_dir=sheet_dir)
+        if result is None:
+            return None
+        with open(result['path'], encoding='utf-8', errors='surrogateescape', newline='') as f:
+            text = f.read()
+        return result, text
+
+
+def _url_hash(url):
+    return hashlib.sha1(canonical_url(url).encode()).hexdigest()
+
+
+def sheet_names(names):
+    """
+    Map ``{css_url: fetched filename}`` to unique local names: a name shared
+    by several URLs gets a suffix hashed from each URL.
     """
-    Download all CSS files from a specified URL.
+    counts = {}
+    for name in names.values():
+        counts[name.lower()] = counts.get(name.lower(), 0) + 1
+    unique = {}
+    for css_url, name in names.items():
+        if counts[name.lower()] > 1:
+            stem, ext = os.path.splitext(name)
+            name = f"{stem}_{_url_hash(css_url)[:8]}{ext}"
+        unique[css_url] = name
+    return unique
+
+
+def rewrite_css(text, css_url, local):
+    """
+    ``text`` with every @import and url() that resolves (against ``css_url``)
+    to a key of ``local`` replaced by its local path.
+    """
+    def swap(match):
+        group = 2 if match.group(2) is not None else 4
+        target = local.get(resolve_url(css_url, match.group(group)))
+        if target is None:
+            return match.group(0)
+        start, end = match.start(group) - match.start(), match.end(group) - match.start()
+        return match.group(0)[:start] + target + match.group(0)[end:]
+
+    return CSS_REFERENCE.sub(swap, text)
+
+
+def download_css(url, output_dir=None, fetcher=None):
+    """
+    Download all CSS files from a specified URL, with the stylesheets,
+    fonts and images they reference.
 
     Args:
         url (str): Website URL to scrape CSS files from
-        output_dir (str, optional): Directory to save CSS files. Defaults to 'downloads/css files'.
+        output_dir (str, optional): Directory to save CSS files. Defaults to 'downloads/style files'.
+        fetcher (FetchEngine, optional): Shared fetch engine; pass one with an
+            asset store to deduplicate stylesheets across runs.
 
     Note:
         This function handles both <link> stylesheets and @import rules.
-        It uses rotating user agents and adds delays between downloads.
+        It uses rotating user agents.
     """
     if output_dir is None:
-        # Default to 'downloads/css files' in the current working directory or ensure absolute path
+        # Default to 'downloads/style files' in the current working directory or ensure absolute path
         output_dir = os.path.join(os.getcwd(), 'downloads', 'style files')
-    
-    # Create a directory to store CSS files if it doesn't exist
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
 
     try:
-        # Get the webpage with a random user agent
-        headers = {'User-Agent': get_random_user_agent()}
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-
-        # Parse the HTML content
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        # Find all CSS links
-        css_links = []
-
-        # Look for <link> tags with rel="stylesheet"
-        for link in soup.find_all('link', rel='stylesheet'):
-            if 'href' in link.attrs:
-                css_url = urljoin(url, link.attrs['href'])
-                css_links.append(css_url)
-
-        # Look for <style> tags that might have @import
-        for style in soup.find_all('style'):
-            if '@import' in style.text:
-                # Basic parsing of @import rules
-                imports = style.text.split('@import')
-                for imp in imports:
-                    if 'url(' in imp:
-                        css_url = imp.split('url(')[1].split(')')[
-                            0].strip("'").strip('"')
-                        css_url = urljoin(url, css_url)
-                        css_links.append(css_url)
-
-        print(f"Found {len(css_links)} CSS files")
-
-        # Download each CSS file
-        for i, css_url in enumerate(css_links):
-            try:
-                # Use a different user agent for each request
-                headers = {'User-Agent': get_random_user_agent()}
-                css_response = requests.get(css_url, headers=headers)
-                css_response.raise_for_status()
-
-                # Generate a filename from the URL
-                filename = f"css_file_{i}.css"
-                filepath = os.path.join(output_dir, filename)
-
-                # Save the CSS content
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    f.write(css_response.text)
-                print(f"Downloaded: {filename}")
-
-                # Add a small delay between requests
-                time.sleep(1)
-
-            except Exception as e:
-                print(f"Error downloading {css_url}: {str(e)}")
+        summary = StyleScraper(output_dir, fetcher).download_styles(url)
+        print(f"Downloaded {summary['stylesheets']} CSS files, {summary['fonts']} fonts, {summary['images']} images")
+        print(f"HTTP cache: {summary['cache']['hits']} hits, {summary['cache']['misses']} misses")
+        return summary
 
     except Exception as e:
         print(f"Error fetching the webpage: {str(e)}")
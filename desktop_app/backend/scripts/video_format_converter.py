@@ -1,30 +1,161 @@
 """
 Video Format Converter
 Refactored for API usage.
+
+Inputs are probed first. Each stream is copied when MP4 can hold it
+as is and re-encoded only when it cannot, so an MKV with H.264/AAC is
+remuxed in seconds instead of being transcoded.
 """
 
+import glob
+import json
 import os
 import subprocess
 import sys
 from pathlib import Path
+import threading
 import time
-import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+
+try:
+    from .adaptive_preset import (RESTART_AFTER_PERCENT, RESTART_BEFORE_PERCENT, DeadlineTracker, choose_preset,
+                                  faster_preset, measure_speed, required_speed)
+    from .ffmpeg_progress import FFmpegError, progress_event, run_ffmpeg
+    from .parallel_encoder import MIN_CHUNK_SECONDS, ParallelEncoder
+except ImportError:
+    from adaptive_preset import (RESTART_AFTER_PERCENT, RESTART_BEFORE_PERCENT, DeadlineTracker, choose_preset,
+                                 faster_preset, measure_speed, required_speed)
+    from ffmpeg_progress import FFmpegError, progress_event, run_ffmpeg
+    from parallel_encoder import MIN_CHUNK_SECONDS, ParallelEncoder
+
+# Codecs MP4 can carry without re-encoding
+MP4_VIDEO_CODECS = {'h264', 'hevc', 'av1'}
+MP4_AUDIO_CODECS = {'aac', 'mp3', 'ac3', 'eac3', 'alac'}
+
+# Video encodes at least this long (seconds) are split into parallel chunks
+PARALLEL_MIN_DURATION = 120
+# Share of linear scaling the chunked encoder reaches, for predicting its speed from one sample
+PARALLEL_SCALING = 0.8
 
 class VideoFormatConverter:
-    def __init__(self, output_dir=None):
+    """
+    Args:
+        output_dir (str): Where converted files go (default: next to the input).
+        encode_workers (int): Chunk encoders for the parallel path.
+        slots (threading.Semaphore): ffmpeg slots shared with the scheduler
+            (``JobScheduler.slots('ffmpeg')``); a batch takes extra free ones.
+        slot_threads (int): CPU threads one slot may use (default: every core).
+    """
+
+    def __init__(self, output_dir=None, encode_workers=None, slots=None, slot_threads=None):
         self.output_dir = output_dir
+        self.parallel_encoder = ParallelEncoder(workers=encode_workers)
+        self.slots = slots
+        self.slot_threads = slot_threads or os.cpu_count() or 1
         self.supported_formats = {'.mkv', '.avi', '.mov', '.wmv', '.flv', '.webm', '.m4v', '.3gp', '.mp4'}
 
-    def get_duration(self, input_path):
-        """Get duration in seconds using ffprobe"""
+    def probe(self, input_path):
+        """Streams and format of ``input_path`` from ffprobe, or None if it cannot be read"""
+        cmd = ['ffprobe', '-v', 'error', '-show_streams', '-show_format', '-of', 'json', str(input_path)]
         try:
-            cmd = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1', str(input_path)]
             result = subprocess.run(cmd, capture_output=True, text=True)
-            return float(result.stdout)
-        except:
+            return json.loads(result.stdout) if result.returncode == 0 else None
+        except (OSError, ValueError):
+            return None
+
+    def get_duration(self, input_path, probe=None):
+        """Get duration in seconds using ffprobe"""
+        probe = probe or self.probe(input_path)
+        try:
+            return float(probe['format']['duration'])
+        except (TypeError, KeyError, ValueError):
             return 0
 
-    def convert_to_mp4(self, input_path, output_path=None, quality_preset='high', progress_callback=None):
+    @staticmethod
+    def plan_streams(probe):
+        """
+        Cheapest valid MP4 plan for the first video and audio stream.
+
+        Returns {"mode": remux | audio | video | full, "video": copy | encode | None,
+        "audio": copy | encode | None, plus the stream indexes and codecs}.
+        Without a probe every stream is encoded, as before.
+        """
+        streams = (probe or {}).get('streams') or []
+        video = next((st for st in streams if st.get('codec_type') == 'video'
+                      and not (st.get('disposition') or {}).get('attached_pic')), None)
+        audio = next((st for st in streams if st.get('codec_type') == 'audio'), None)
+
+        plan = {'video': None, 'audio': None}
+        if video is not None or probe is None:
+            plan['video'] = 'copy' if video and video.get('codec_name') in MP4_VIDEO_CODECS else 'encode'
+            plan['video_codec'] = video.get('codec_name') if video else None
+            plan['video_index'] = video.get('index') if video else None
+        if audio is not None or probe is None:
+            plan['audio'] = 'copy' if audio and audio.get('codec_name') in MP4_AUDIO_CODECS else 'encode'
+            plan['audio_index'] = audio.get('index') if audio else None
+
+        encoded = {kind for kind in ('video', 'audio') if plan[kind] == 'encode'}
+        plan['mode'] = {frozenset(): 'remux', frozenset({'audio'}): 'audio',
+                        frozenset({'video'}): 'video'}.get(frozenset(encoded), 'full')
+        return plan
+
+    def _build_cmd(self, input_path, output_path, plan, settings, threads=None):
+        cmd = ['ffmpeg', '-i', str(input_path)]
+        if plan['video'] is not None:
+            cmd += ['-map', f"0:{plan['video_index']}" if plan.get('video_index') is not None else '0:v:0?']
+            if plan['video'] == 'copy':
+                cmd += ['-c:v', 'copy']
+                if plan['video_codec'] == 'hevc':
+                    cmd += ['-tag:v', 'hvc1']
+            else:
+                cmd += ['-c:v', 'libx264', '-crf', settings['crf'], '-preset', settings['preset']]
+        if plan['audio'] is not None:
+            cmd += ['-map', f"0:{plan['audio_index']}" if plan.get('audio_index') is not None else '0:a:0?']
+            cmd += ['-c:a', 'copy'] if plan['audio'] == 'copy' else ['-c:a', 'aac', '-b:a', '192k']
+        if threads:
+            cmd += ['-threads', str(threads)]
+        cmd += ['-movflags', '+faststart', '-y', str(output_path)]
+        return cmd
+
+    def _adaptive_settings(self, input_path, duration, tracker, time_budget, min_speed, parallel, threads,
+                           progress_callback=None):
+        """Measure a sample of the input and pick the preset/CRF that meets the budget."""
+        if progress_callback:
+            progress_callback({"status": "sampling", "message": f"Measuring encode speed on {input_path.name}..."})
+        if parallel:
+            # Each chunk encoder gets a share of the cores; scale the one-chunk sample by the
+            # chunks that actually run side by side
+            concurrent = max(1, min(self.parallel_encoder.workers, threads, int(duration // MIN_CHUNK_SECONDS) or 1))
+            sample = measure_speed(input_path, duration, threads=max(1, threads // concurrent))
+            sample *= concurrent * PARALLEL_SCALING
+        else:
+            sample = measure_speed(input_path, duration, threads=threads)
+        required = required_speed(duration, time_budget, min_speed, elapsed=time.time() - tracker.started)
+        choice = choose_preset(sample, required)
+        choice['sample_speed'] = round(sample, 3)
+        choice['restarts'] = 0
+        print(f"[Adaptive] {input_path.name}: sample {sample:.2f}x, need {required:.2f}x -> "
+              f"{choice['preset']} crf {choice['crf']}")
+        return choice
+
+    def convert_to_mp4(self, input_path, output_path=None, quality_preset='high', progress_callback=None, parallel=None,
+                       threads=None, probe=None, time_budget=None, min_speed=None):
+        """
+        Convert ``input_path`` to MP4 using the cheapest plan for its streams.
+
+        Long video encodes are split into chunks encoded in parallel; pass
+        ``parallel=True`` / ``False`` to force either path. ``threads`` caps
+        ffmpeg's threads across all chunks (default: one slot's share of the
+        cores); ``probe`` reuses an earlier ``probe()`` result.
+
+        ``quality_preset='adaptive'`` picks the slowest x264 preset that
+        finishes within ``time_budget`` seconds and/or encodes at
+        ``min_speed`` x realtime or faster (realtime if neither is given),
+        based on a sample encode of the input. A single-process encode
+        that falls behind early is restarted on a faster preset.
+        """
+        started = time.time()
         # Determine paths
         input_path = Path(input_path)
         if output_path is None:
@@ -36,6 +167,9 @@ class VideoFormatConverter:
                  output_path = input_path.parent / f"{input_path.stem}_converted.mp4"
         else:
             output_path = Path(output_path)
+        # Encoded under a hidden name and renamed when done, so a crash never
+        # leaves a truncated file that looks converted
+        part_path = output_path.with_name(f".{output_path.stem}.part{output_path.suffix}")
         
         # Presets (Simplifed)
         presets = {
@@ -46,52 +180,259 @@ class VideoFormatConverter:
         }
         settings = presets.get(quality_preset, presets['high'])
 
-        cmd = [
-            'ffmpeg', '-i', str(input_path),
-            '-c:v', 'libx264', '-crf', settings['crf'], '-preset', settings['preset'],
-            '-c:a', 'aac', '-b:a', '192k',
-            '-movflags', '+faststart', '-y',
-            str(output_path)
-        ]
+        probe = probe or self.probe(input_path)
+        plan = self.plan_streams(probe)
+
+        total_duration = self.get_duration(input_path, probe)
+        # One ffmpeg slot's share of the cores, whichever path encodes
+        threads = threads or self.slot_threads
+        if parallel is None:
+            parallel = total_duration >= PARALLEL_MIN_DURATION and min(self.parallel_encoder.workers, threads) > 1
+        plan['parallel'] = bool(parallel and plan['video'] == 'encode')
 
-        total_duration = self.get_duration(input_path)
+        tracker = None
+        if quality_preset == 'adaptive':
+            if not time_budget and not min_speed:
+                min_speed = 1.0
+            tracker = DeadlineTracker(started + time_budget if time_budget else None, started)
         
         try:
+            if tracker and plan['video'] == 'encode' and total_duration:
+                plan['adaptive'] = self._adaptive_settings(input_path, total_duration, tracker, time_budget, min_speed,
+                                                           plan['parallel'], threads, progress_callback)
+                settings = {'crf': plan['adaptive']['crf'], 'preset': plan['adaptive']['preset']}
+                plan['adaptive']['deadline'] = tracker.check(None)['deadline']
+
             if progress_callback:
-                progress_callback({"status": "starting", "message": f"Converting {input_path.name}..."})
+                progress_callback({"status": "starting", "plan": plan, "message": f"Converting {input_path.name} ({plan['mode']})..."})
 
-            # Run FFmpeg and parse output for progress
-            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, universal_newlines=True)
-            
-            while True:
-                line = process.stderr.readline()
-                if not line and process.poll() is not None:
-                    break
-                
-                if line and "time=" in line:
-                    # Parse time=00:00:05.12
-                    time_match = re.search(r'time=(\d{2}):(\d{2}):(\d{2}\.\d+)', line)
-                    if time_match and total_duration > 0:
-                        h, m, s = map(float, time_match.groups())
-                        current_seconds = h*3600 + m*60 + s
-                        percent = (current_seconds / total_duration) * 100
-                        if progress_callback:
-                            progress_callback({
-                                "status": "converting", 
-                                "percent": percent,
-                                "message": f"Converting... {percent:.1f}%"
-                            })
+            if plan['parallel']:
+                def on_chunk_progress(event):
+                    if tracker and event.get('status') == 'converting':
+                        event.update(tracker.check(event.get('eta_seconds')))
+                    progress_callback(event)
 
-            if process.returncode == 0:
+                plan['encoder'] = self.parallel_encoder.encode(
+                    input_path, part_path, crf=settings['crf'], preset=settings['preset'],
+                    audio=plan['audio'], duration=total_duration, threads=threads,
+                    progress_callback=on_chunk_progress if progress_callback else None)
+                os.replace(part_path, output_path)
                 if progress_callback:
-                     progress_callback({"status": "completed", "percent": 100, "output": str(output_path)})
+                    progress_callback({"status": "completed", "percent": 100, "output": str(output_path), "plan": plan})
                 return True
-            else:
-                if progress_callback:
-                    progress_callback({"status": "error", "error": "FFmpeg process failed"})
-                return False
+
+            while True:
+                cmd = self._build_cmd(input_path, part_path, plan, settings, threads)
+                procs = []
+                restart = {}
+
+                # Run FFmpeg with its machine-readable progress stream
+                def on_progress(snapshot):
+                    event = progress_event(snapshot)
+                    if tracker:
+                        event.update(tracker.check(snapshot['eta']))
+                        percent = snapshot['percent'] or 0
+                        if (event['on_track'] is False and not restart and 'adaptive' in plan
+                                and RESTART_AFTER_PERCENT <= percent < RESTART_BEFORE_PERCENT
+                                and faster_preset(settings['preset'])):
+                            # Too slow for the deadline and little done yet: start over on a faster preset
+                            restart['speed'] = snapshot['speed']
+                            for process in procs:
+                                process.kill()
+                            return
+                    if progress_callback:
+                        progress_callback(event)
+
+                try:
+                    final = run_ffmpeg(cmd, duration=total_duration, on_progress=on_progress, procs=procs)
+                except FFmpegError as e:
+                    if restart:
+                        required = required_speed(total_duration, time_budget, min_speed,
+                                                  elapsed=time.time() - started)
+                        choice = choose_preset(restart['speed'] or plan['adaptive']['predicted_speed'], required,
+                                               reference=settings['preset'],
+                                               fastest_first=faster_preset(settings['preset']))
+                        plan['adaptive'].update(preset=choice['preset'], crf=choice['crf'], meets=choice['meets'],
+                                                predicted_speed=choice['predicted_speed'],
+                                                required_speed=choice['required_speed'],
+                                                restarts=plan['adaptive']['restarts'] + 1)
+                        print(f"[Adaptive] Behind deadline at {settings['preset']} "
+                              f"({restart['speed']:.2f}x < {required:.2f}x), restarting on {choice['preset']}")
+                        settings = {'crf': choice['crf'], 'preset': choice['preset']}
+                        if progress_callback:
+                            progress_callback({"status": "converting", "percent": 0,
+                                               "message": f"Behind deadline, restarting with preset {choice['preset']}..."})
+                        continue
+                    print(f"[Error] {e}")
+                    part_path.unlink(missing_ok=True)
+                    if progress_callback:
+                        progress_callback({"status": "error", "error": str(e), "stderr_tail": e.stderr_tail})
+                    return False
+                break
+            os.replace(part_path, output_path)
+
+            if progress_callback:
+                 progress_callback({"status": "completed", "percent": 100, "output": str(output_path), "plan": plan,
+                                    "size_bytes": final['total_size'] if final else None,
+                                    "seconds": round(final['elapsed'], 2) if final else None})
+            return True
 
         except Exception as e:
+            part_path.unlink(missing_ok=True)
             if progress_callback:
                 progress_callback({"status": "error", "error": str(e)})
             raise e
+
+    @contextmanager
+    def _batch_slots(self, wanted):
+        """
+        Concurrent files a batch may run: its own slot plus up to ``wanted - 1``
+        ffmpeg slots that are free right now, released when the batch ends.
+        """
+        extra = 0
+        try:
+            while self.slots is not None and extra < wanted - 1 and self.slots.acquire(blocking=False):
+                extra += 1
+            yield wanted if self.slots is None else 1 + extra
+        finally:
+            for _ in range(extra):
+                self.slots.release()
+
+    def find_inputs(self, source, recursive=False):
+        """Supported video files in a directory, or matching a glob pattern."""
+        if os.path.isdir(source):
+            pattern = os.path.join(glob.escape(source), '**', '*') if recursive else os.path.join(glob.escape(source), '*')
+        else:
+            pattern = source
+        return sorted(
+            Path(path) for path in glob.glob(pattern, recursive=recursive or '**' in pattern)
+            if os.path.isfile(path) and Path(path).suffix.lower() in self.supported_formats
+            and not Path(path).stem.endswith('_converted')
+        )
+
+    def _default_output(self, input_path):
+        output_dir = Path(self.output_dir) if self.output_dir else input_path.parent
+        return output_dir / f"{input_path.stem}_converted.mp4"
+
+    def convert_batch(self, source, quality_preset='high', workers=None, recursive=False, progress_callback=None):
+        """
+        Convert every supported file in a directory or glob.
+
+        With scheduler slots, the batch runs on its own ffmpeg slot plus up
+        to ``workers - 1`` more that are free when it starts, each file
+        getting one slot's thread budget; without them the machine's cores
+        are split across ``workers`` concurrent jobs via ffmpeg ``-threads``.
+        Files whose output exists and is newer than the input are skipped.
+        Progress and the final summary report aggregate throughput. When
+        every file to convert failed, the summary is an error frame.
+        """
+        inputs = self.find_inputs(source, recursive)
+        if self.output_dir:
+            Path(self.output_dir).mkdir(parents=True, exist_ok=True)
+
+        todo, skipped = [], []
+        for input_path in inputs:
+            output_path = self._default_output(input_path)
+            if output_path.exists() and output_path.stat().st_mtime >= input_path.stat().st_mtime:
+                skipped.append(str(input_path))
+            else:
+                todo.append((input_path, output_path))
+
+        if self.slots is None:
+            cores = os.cpu_count() or 1
+            wanted = max(1, min(workers or max(1, cores // 4), len(todo) or 1, cores))
+        else:
+            wanted = max(1, min(workers or len(todo) or 1, len(todo) or 1))
+        with self._batch_slots(wanted) as workers:
+            threads = self.slot_threads if self.slots is not None else max(1, (os.cpu_count() or 1) // workers)
+
+            if progress_callback:
+                progress_callback({
+                    "status": "found",
+                    "count": len(inputs),
+                    "message": f"{len(todo)} files to convert, {len(skipped)} up to date "
+                               f"({workers} jobs x {threads} threads)."
+                })
+
+            # Probe up front: durations weight the aggregate progress
+            probes = {input_path: self.probe(input_path) for input_path, _ in todo}
+            durations = {input_path: self.get_duration(input_path, probes[input_path]) for input_path, _ in todo}
+            total_seconds = sum(durations.values()) or 1
+            total_bytes = sum(input_path.stat().st_size for input_path, _ in todo)
+            done_seconds = {input_path: 0.0 for input_path, _ in todo}
+            lock = threading.Lock()
+            started = time.time()
+            results = {'converted': [], 'failed': []}
+
+            def report(finished_files):
+                if not progress_callback:
+                    return
+                with lock:
+                    encoded = sum(done_seconds.values())
+                elapsed = max(time.time() - started, 1e-6)
+                percent = min(99.9, encoded / total_seconds * 100)
+                progress_callback({
+                    "status": "converting",
+                    "percent": percent,
+                    "files_done": finished_files,
+                    "files_total": len(todo),
+                    "speed": encoded / elapsed,
+                    "message": f"[{finished_files}/{len(todo)}] Converting... {percent:.1f}% ({encoded / elapsed:.2f}x)"
+                })
+
+            def convert_one(input_path, output_path):
+                def on_progress(event):
+                    # Per-file events only feed the aggregate; their completed/error
+                    # frames must not end the batch job
+                    if event.get('status') == 'converting':
+                        with lock:
+                            done_seconds[input_path] = durations[input_path] * min(event.get('percent') or 0, 100) / 100
+                        report(len(results['converted']) + len(results['failed']))
+                return self.convert_to_mp4(input_path, output_path, quality_preset=quality_preset, parallel=False,
+                                           threads=threads, probe=probes[input_path], progress_callback=on_progress)
+
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='convert') as pool:
+                futures = {pool.submit(convert_one, i, o): (i, o) for i, o in todo}
+                for future in as_completed(futures):
+                    input_path, output_path = futures[future]
+                    try:
+                        ok = future.result()
+                        error = None if ok else "FFmpeg process failed"
+                    except Exception as e:
+                        error = str(e)
+                    with lock:
+                        done_seconds[input_path] = durations[input_path]
+                        if error:
+                            results['failed'].append({'input': str(input_path), 'error': error})
+                        else:
+                            results['converted'].append(str(output_path))
+                    if error:
+                        print(f"[Error] Conversion failed: {input_path}: {error}")
+                    report(len(results['converted']) + len(results['failed']))
+
+        elapsed = time.time() - started
+        summary = {
+            "status": "completed",
+            "percent": 100,
+            "files_total": len(inputs),
+            "converted": results['converted'],
+            "skipped": skipped,
+            "failed": results['failed'],
+            "workers": workers,
+            "threads_per_job": threads,
+            "seconds": round(elapsed, 2),
+            "media_seconds": round(sum(durations.values()), 2),
+            "speed": sum(durations.values()) / elapsed if elapsed > 0 else 0.0,
+            "throughput_mb": total_bytes / elapsed / 1024 / 1024 if elapsed > 0 else 0.0,
+        }
+        if results['failed'] and not results['converted']:
+            # The per-file failures stay in the payload; the job is marked failed
+            summary['status'] = 'error'
+            summary['error'] = f"All {len(results['failed'])} conversions failed: {results['failed'][0]['error']}"
+            print(f"[Error] {summary['error']}")
+        else:
+            print(f"[Success] Converted {len(results['converted'])} files in {elapsed:.1f}s "
+                  f"({summary['speed']:.2f}x realtime, {summary['throughput_mb']:.1f} MB/s).")
+        if progress_callback:
+            progress_callback(summary)
+        return summary
@@ -1,47 +1,126 @@
 """
 YouTube Clip Downloader
 Refactored for API usage.
+
+Each source video is extracted once; the info dict is reused for reading
+clip ranges and for the download itself. Clips of one source are grouped
+into spans, so overlapping or nearby clips share one read of the media:
+by default every clip of a span is re-encoded from a single decode of it.
+
+With ``smart_cut`` (opt-in, TURBODL_SMART_CUT=1) each span is instead
+stream-copied once to a local file and every clip is smart-cut from it
+(whole GOPs copied, only the edges re-encoded). That path is experimental
+until it has been verified across H.264/HEVC sources with open GOPs and
+B-frames; the clips benchmark checks its output with ffprobe.
 """
 
 import yt_dlp
+from yt_dlp.utils import sanitize_filename
+import copy
 import os
-import re
+import tempfile
 from urllib.parse import parse_qs, urlparse
 from datetime import datetime
 
+try:
+    from .ffmpeg_progress import run_ffmpeg
+    from .metrics import download_byte_hook
+    from .smart_cut import KeyframeIndex, smart_cut
+except ImportError:
+    from ffmpeg_progress import run_ffmpeg
+    from metrics import download_byte_hook
+    from smart_cut import KeyframeIndex, smart_cut
+
+# Clips closer together than this (seconds) are read from the source in one span
+MERGE_GAP = 10
+# Extra seconds fetched past each span so the last GOP can be decoded to its end
+SPAN_TAIL = 1
+
+
+def query_clip_range(url):
+    """(start, end) from ``start``/``end`` query parameters, or None."""
+    query_params = parse_qs(urlparse(url).query)
+    if 'start' in query_params and 'end' in query_params:
+        return int(query_params['start'][0]), int(query_params['end'][0])
+    return None
+
+
+def merge_spans(ranges, gap=MERGE_GAP):
+    """
+    Merge (start, end) ranges that overlap or lie within ``gap`` seconds.
+
+    Returns [(span_start, span_end, [indexes into ranges])] in source order.
+    """
+    spans = []
+    for idx in sorted(range(len(ranges)), key=lambda i: ranges[i]):
+        start, end = ranges[idx]
+        if spans and start <= spans[-1][1] + gap:
+            spans[-1][1] = max(spans[-1][1], end)
+            spans[-1][2].append(idx)
+        else:
+            spans.append([start, end, [idx]])
+    return [tuple(span) for span in spans]
+
+
+def _timestamp_label(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}h{seconds % 3600 // 60:02d}m{seconds % 60:02d}s"
+
+
 class YTClipsDownloader:
-    def __init__(self, output_dir="downloads"):
+    def __init__(self, output_dir="downloads", video_tool=None, smart_cut=False):
         self.output_dir = output_dir
+        # Optional VideoDownloader whose analysis cache is shared with /analyze
+        self.video_tool = video_tool
+        self.smart_cut = smart_cut
+        self.keyframes = KeyframeIndex()
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
 
-    def parse_clip_url(self, url):
-        try:
-            ydl_opts = {'quiet': True}
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                if 'chapters' in info:
-                    for chapter in info['chapters']:
-                        if chapter.get('is_clip'):
-                            return chapter['start_time'], chapter['end_time']
-                if info.get('clip_start_time') is not None and info.get('clip_end_time') is not None:
-                    return info['clip_start_time'], info['clip_end_time']
-        except Exception:
-            parsed_url = urlparse(url)
-            query_params = parse_qs(parsed_url.query)
-            if 'start' in query_params and 'end' in query_params:
-                return int(query_params.get('start', [0])[0]), int(query_params.get('end', [0])[0])
-        return 0, None
-
-    def download_clip(self, url, progress_callback=None):
+    def _extract(self, url):
+        if self.video_tool:
+            return self.video_tool.extract_info(url)
+        with yt_dlp.YoutubeDL({'quiet': True}) as ydl:
+            return ydl.extract_info(url, download=False)
+
+    def parse_clip_url(self, url, info=None):
+        """Clip (start, end) in seconds; pass ``info`` to avoid extracting again."""
+        if info is None:
+            try:
+                info = self._extract(url)
+            except Exception:
+                info = None
+        if info:
+            for chapter in info.get('chapters') or []:
+                if chapter.get('is_clip'):
+                    return chapter['start_time'], chapter['end_time']
+            if info.get('clip_start_time') is not None and info.get('clip_end_time') is not None:
+                return info['clip_start_time'], info['clip_end_time']
+            if info.get('section_start') is not None and info.get('section_end') is not None:
+                return info['section_start'], info['section_end']
+        return query_clip_range(url) or (0, None)
+
+    def download_clip(self, url, progress_callback=None, timestamp=None):
+        """Download one clip; ``timestamp`` fixes the output name (see download_clips)."""
         try:
             if progress_callback:
                 progress_callback({"status": "analyzing", "message": "Analyzing clip range..."})
 
-            start_time, end_time = self.parse_clip_url(url)
-            
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            
+            info = self._extract(url)
+            start_time, end_time = self.parse_clip_url(url, info)
+
+            timestamp = timestamp or datetime.now().strftime('%Y%m%d_%H%M%S')
+
+            if end_time is not None and self.smart_cut:
+                # Smart cut: fetch the range once, copy whole GOPs, re-encode only the edges
+                title = sanitize_filename(info.get('title') or info.get('id') or 'clip')
+                path = os.path.join(self.output_dir, f"{title} - Clip_{timestamp}.mp4")
+                jobs = self._plan_spans(info, [(start_time, end_time)], [path])
+                cuts = self._run_spans(jobs, progress_callback)
+                if progress_callback:
+                    progress_callback({"status": "completed", "percent": 100, "output": path, "cuts": cuts})
+                return True
+
             # Progress Hook for yt-dlp
             def ydl_progress_hook(d):
                 if d['status'] == 'downloading':
@@ -58,8 +137,9 @@ class YTClipsDownloader:
                 'format': 'best[ext=mp4]/best',
                 'outtmpl': os.path.join(self.output_dir, f'%(title)s - Clip_{timestamp}.%(ext)s'),
                 'quiet': True,
-                'progress_hooks': [ydl_progress_hook],
-                'force_overwrites': True
+                'progress_hooks': [ydl_progress_hook, download_byte_hook('ytdlp')],
+                # A resumed job reuses its timestamped name: finish or skip the file, never restart it
+                'continuedl': True
             }
 
             if end_time is not None:
@@ -69,14 +149,215 @@ class YTClipsDownloader:
                 })
 
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
-            
+                ydl.process_ie_result(copy.deepcopy(info), download=True)
+
             if progress_callback:
                 progress_callback({"status": "completed", "percent": 100})
-            
+
             return True
 
         except Exception as e:
             if progress_callback:
                 progress_callback({"status": "error", "error": str(e)})
             raise e
+
+    def _select_formats(self, info):
+        """Media URLs (with request headers) of the format clips are cut from."""
+        with yt_dlp.YoutubeDL({'quiet': True, 'format': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best'}) as ydl:
+            selected = ydl.process_ie_result(copy.deepcopy(info), download=False)
+        return selected.get('requested_formats') or [selected]
+
+    def _plan_spans(self, info, ranges, paths):
+        """[(formats, span_start, span_end, [(start, end, path)])] for one source."""
+        formats = self._select_formats(info)
+        return [
+            (formats, span_start, span_end, [(*ranges[i], paths[i]) for i in members])
+            for span_start, span_end, members in merge_spans(ranges)
+        ]
+
+    def _fetch_span(self, formats, span_start, span_end, path, on_progress=None):
+        """
+        Stream-copy [span_start, span_end] of the source into a local file.
+
+        The copy starts at the keyframe before span_start. Timestamps stay
+        relative to the source start, so clip times map onto the span file
+        through its start_time.
+        """
+        cmd = ['ffmpeg', '-y', '-copyts', '-start_at_zero']
+        for fmt in formats:
+            headers = ''.join(f"{k}: {v}\r\n" for k, v in (fmt.get('http_headers') or {}).items())
+            if headers:
+                cmd += ['-headers', headers]
+            cmd += ['-ss', str(span_start), '-t', str(span_end - span_start + SPAN_TAIL), '-i', fmt['url']]
+        for i, fmt in enumerate(formats):
+            if fmt.get('vcodec') != 'none':
+                cmd += ['-map', f'{i}:v:0?']
+            if fmt.get('acodec') != 'none':
+                cmd += ['-map', f'{i}:a:0?']
+        cmd += ['-c', 'copy', path]
+
+        # With -copyts the reported position is source time, so count from span_start
+        def on_snapshot(snapshot):
+            if on_progress:
+                on_progress(max(0.0, snapshot['out_seconds'] - span_start))
+
+        run_ffmpeg(cmd, on_progress=on_snapshot)
+
+    def _cut_span(self, formats, span_start, span_end, outputs, on_progress=None):
+        """
+        Read [span_start, span_end] of the source once and write every clip in
+        ``outputs`` ([(start, end, path)]) from that single decode. Clips are
+        encoded under hidden names and renamed into place once all are done.
+        """
+        cmd = ['ffmpeg', '-y']
+        for fmt in formats:
+            headers = ''.join(f"{k}: {v}\r\n" for k, v in (fmt.get('http_headers') or {}).items())
+            if headers:
+                cmd += ['-headers', headers]
+            cmd += ['-ss', str(span_start), '-t', str(span_end - span_start), '-i', fmt['url']]
+
+        maps = []
+        for i, fmt in enumerate(formats):
+            if fmt.get('vcodec') != 'none':
+                maps += ['-map', f'{i}:v:0?']
+            if fmt.get('acodec') != 'none':
+                maps += ['-map', f'{i}:a:0?']
+
+        parts = []
+        for start, end, path in outputs:
+            stem, ext = os.path.splitext(os.path.basename(path))
+            part = os.path.join(os.path.dirname(path), f".{stem}.part{ext}")
+            parts.append((part, path))
+            # Input timestamps restart at span_start, so clip offsets are span-relative
+            cmd += maps + [
+                '-ss', str(start - span_start), '-t', str(end - start),
+                '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '20',
+                '-c:a', 'aac', '-b:a', '192k',
+                '-movflags', '+faststart', part,
+            ]
+
+        try:
+            run_ffmpeg(cmd, on_progress=lambda snapshot: on_progress and on_progress(snapshot['out_seconds']))
+            for part, path in parts:
+                os.replace(part, path)
+        finally:
+            for part, _ in parts:
+                if os.path.exists(part):
+                    os.remove(part)
+
+    def _run_spans(self, jobs, progress_callback=None):
+        """
+        Cut each span's clips: from one re-encoding decode of the span, or with
+        ``smart_cut`` from a stream-copied local copy of it.
+        """
+        total_seconds = sum(end - start for _, start, end, _ in jobs) or 1
+        done_seconds = 0
+        cuts = []
+
+        def report(position):
+            if progress_callback:
+                percent = min(100, (done_seconds + position) / total_seconds * 100)
+                progress_callback({
+                    "status": "downloading",
+                    "percent": percent,
+                    "message": f"Cutting clips... {percent:.1f}%"
+                })
+
+        with tempfile.TemporaryDirectory(prefix='.spans-', dir=self.output_dir) as tmp:
+            for n, (formats, span_start, span_end, outputs) in enumerate(jobs):
+                span_seconds = span_end - span_start
+                # Clips are renamed into place only when complete, so an existing file is done
+                cuts.extend({'output': path, 'mode': 'existing'} for _, _, path in outputs if os.path.exists(path))
+                outputs = [(start, end, path) for start, end, path in outputs if not os.path.exists(path)]
+                if not outputs:
+                    done_seconds += span_seconds
+                    report(0)
+                    continue
+                if not self.smart_cut:
+                    self._cut_span(formats, span_start, span_end, outputs,
+                                   lambda pos: report(min(pos, span_seconds)))
+                    cuts.extend({'output': path, 'mode': 'encode'} for _, _, path in outputs)
+                    done_seconds += span_seconds
+                    continue
+                span_path = os.path.join(tmp, f"span{n}.mkv")
+                # Fetching dominates; the smart cuts take the last tenth of each span
+                self._fetch_span(formats, span_start, span_end, span_path,
+                                 lambda pos: report(0.9 * min(pos, span_seconds)))
+                offset = self.keyframes.get(span_path)['start_time']
+                for k, (start, end, path) in enumerate(outputs):
+                    cut = smart_cut(span_path, start - offset, end - offset, path, index=self.keyframes)
+                    print(f"[Clip] {os.path.basename(path)}: copied {cut['copied']:.1f}s, re-encoded {cut['encoded']:.1f}s")
+                    cuts.append(cut)
+                    report(span_seconds * (0.9 + 0.1 * (k + 1) / len(outputs)))
+                done_seconds += span_seconds
+        return cuts
+
+    def download_clips(self, clips, progress_callback=None, timestamp=None):
+        """
+        Download several clips, extracting each source once.
+
+        ``clips`` holds clip URLs as dicts: ``{"url": ...}`` for clip links
+        or ``{"url": ..., "start": s, "end": e}`` for explicit ranges.
+        Clips of the same source are grouped and cut from shared spans;
+        a range requested twice is cut once.
+        ``timestamp`` fixes the output names, so a job resumed after a
+        restart skips the clips it already wrote.
+        """
+        try:
+            if progress_callback:
+                progress_callback({"status": "analyzing", "message": f"Analyzing {len(clips)} clips..."})
+
+            # Group clips by source video; each distinct URL is extracted once
+            infos = {}
+            sources = {}
+            for clip in clips:
+                url = clip['url']
+                if url not in infos:
+                    infos[url] = self._extract(url)
+                info = infos[url]
+                if clip.get('start') is not None and clip.get('end') is not None:
+                    start, end = float(clip['start']), float(clip['end'])
+                else:
+                    start, end = self.parse_clip_url(url, info)
+                    if end is None:
+                        end = info.get('duration')
+                if end is None or end <= start:
+                    raise ValueError(f"No clip range for {url}")
+                key = (info.get('extractor_key'), info.get('id'))
+                source = sources.setdefault(key, {'info': info, 'ranges': []})
+                # The same range twice is one clip
+                if (start, end) not in source['ranges']:
+                    source['ranges'].append((start, end))
+
+            timestamp = timestamp or datetime.now().strftime('%Y%m%d_%H%M%S')
+            jobs = []
+            for source in sources.values():
+                info = source['info']
+                title = sanitize_filename(info.get('title') or info.get('id') or 'clip')
+                # The range's position keeps names unique when labels round to the same seconds
+                paths = [
+                    os.path.join(self.output_dir,
+                                 f"{title} - Clip {n:02d} {_timestamp_label(s)}-{_timestamp_label(e)}_{timestamp}.mp4")
+                    for n, (s, e) in enumerate(source['ranges'], 1)
+                ]
+                jobs.extend(self._plan_spans(info, source['ranges'], paths))
+
+            if progress_callback:
+                progress_callback({
+                    "status": "found",
+                    "count": len(clips),
+                    "message": f"{len(clips)} clips from {len(sources)} sources in {len(jobs)} spans."
+                })
+
+            cuts = self._run_spans(jobs, progress_callback)
+            written = [cut['output'] for cut in cuts]
+
+            print(f"[Success] {len(written)} clips written from {len(jobs)} spans.")
+            if progress_callback:
+                progress_callback({"status": "completed", "percent": 100, "outputs": written, "cuts": cuts})
+            return written
+
+        except Exception as e:
+            if progress_callback:
+                progress_callback({"status": "error", "error": str(e)})
+            raise e
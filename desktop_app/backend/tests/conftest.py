@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The tests import the tool modules the way main.py's dev fallback does
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
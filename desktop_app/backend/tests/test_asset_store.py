@@ -0,0 +1,56 @@
+import hashlib
+import os
+
+from asset_store import AssetStore
+
+
+def put(store, url, data):
+    tmp = store.temp_path()
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    sha256 = hashlib.sha256(data).hexdigest()
+    store.add_blob(tmp, sha256)
+    store.record(url, sha256, len(data))
+    return sha256
+
+
+def test_blob_evicted_while_pinned_is_deleted_on_unpin(tmp_path):
+    store = AssetStore(str(tmp_path))
+    sha256 = put(store, 'http://a.test/1', b'a' * 100)
+    with store.pinned(sha256) as present:
+        assert present
+        store.record('http://a.test/1', put(store, 'http://a.test/2', b'b' * 50), 50)
+        # No URL references the old blob now, but the pin keeps it on disk
+        assert os.path.exists(store.blob_path(sha256))
+    assert not os.path.exists(store.blob_path(sha256))
+    assert store.total_size() == 50
+
+
+def test_blob_recorded_again_while_pinned_is_kept(tmp_path):
+    store = AssetStore(str(tmp_path))
+    sha256 = put(store, 'http://a.test/1', b'a' * 100)
+    put(store, 'http://a.test/other', b'c' * 10)
+    with store.pinned(sha256):
+        store.record('http://a.test/1', hashlib.sha256(b'c' * 10).hexdigest(), 10)
+        store.record('http://a.test/3', sha256, 100)
+    assert os.path.exists(store.blob_path(sha256))
+    assert store.total_size() == 110
+
+
+def test_eviction_skips_pinned_blobs(tmp_path):
+    store = AssetStore(str(tmp_path))
+    old = put(store, 'http://a.test/old', b'a' * 100)
+    new = put(store, 'http://a.test/new', b'b' * 100)
+    with store.pinned(old):
+        assert store.evict_lru(100) == 100
+    assert os.path.exists(store.blob_path(old))
+    assert not os.path.exists(store.blob_path(new))
+    assert store.total_size() == 100
+
+
+def test_orphaned_temp_files_are_swept_on_open(tmp_path):
+    store = AssetStore(str(tmp_path))
+    with open(store.temp_path(), 'wb') as f:
+        f.write(b'partial')
+    store = AssetStore(str(tmp_path))
+    assert os.listdir(store.tmp_dir) == []
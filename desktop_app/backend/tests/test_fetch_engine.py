@@ -0,0 +1,56 @@
+import threading
+
+from fetch_engine import FetchEngine
+
+
+def test_busy_host_does_not_block_other_hosts():
+    engine = FetchEngine(max_workers=4, per_host=2)
+    release = threading.Event()
+    running = []
+    lock = threading.Lock()
+    peak = [0]
+
+    def slow(url):
+        with lock:
+            running.append(url)
+            peak[0] = max(peak[0], len(running))
+        release.wait(5)
+        with lock:
+            running.remove(url)
+        return url
+
+    try:
+        busy = [engine.submit(slow, f"http://busy.test/{n}") for n in range(20)]
+        other = engine.submit(lambda url: url, "http://other.test/a")
+        # Only per_host calls for the busy host hold pool threads; the rest wait in its queue
+        assert other.result(timeout=2) == "http://other.test/a"
+        assert not any(f.done() for f in busy)
+        release.set()
+        assert [f.result(timeout=5) for f in busy] == [f"http://busy.test/{n}" for n in range(20)]
+        assert peak[0] == 2
+        assert not engine._hosts
+    finally:
+        release.set()
+        engine.close()
+
+
+def test_errors_and_cancelled_calls_free_their_host_slot():
+    engine = FetchEngine(max_workers=2, per_host=1)
+    release = threading.Event()
+
+    def fail(url):
+        raise ValueError(url)
+
+    try:
+        first = engine.submit(lambda url: release.wait(5), "http://host.test/1")
+        cancelled = engine.submit(lambda url: url, "http://host.test/2")
+        failing = engine.submit(fail, "http://host.test/3")
+        last = engine.submit(lambda url: url, "http://host.test/4")
+        assert cancelled.cancel()
+        release.set()
+        assert first.result(timeout=5)
+        assert isinstance(failing.exception(timeout=5), ValueError)
+        assert last.result(timeout=5) == "http://host.test/4"
+    finally:
+        release.set()
+        engine.close()
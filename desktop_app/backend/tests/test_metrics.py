@@ -0,0 +1,48 @@
+from metrics import DOWNLOAD_BYTES, download_byte_hook
+
+
+def downloaded(source):
+    return DOWNLOAD_BYTES._values.get((source,), 0)
+
+
+def event(status, downloaded_bytes, **extra):
+    d = {
+        'status': status,
+        'downloaded_bytes': downloaded_bytes,
+        'info_dict': {'id': 'abc', 'format_id': '18'},
+        'filename': 'video.mp4',
+    }
+    if status == 'downloading':
+        d['tmpfilename'] = 'video.mp4.part'
+    d.update(extra)
+    return d
+
+
+def test_full_download_counts_its_size_once():
+    hook = download_byte_hook('test-full')
+    for n in (250, 600, 1000):
+        hook(event('downloading', n))
+    hook(event('finished', 1000, total_bytes=1000))
+    assert downloaded('test-full') == 1000
+
+
+def test_finished_adds_bytes_after_last_update():
+    hook = download_byte_hook('test-tail')
+    hook(event('downloading', 900))
+    hook(event('finished', 1000))
+    assert downloaded('test-tail') == 1000
+
+
+def test_file_already_on_disk_counts_nothing():
+    hook = download_byte_hook('test-existing')
+    hook(event('finished', 1000))
+    assert downloaded('test-existing') == 0
+
+
+def test_formats_of_one_video_are_counted_separately():
+    hook = download_byte_hook('test-formats')
+    hook(event('downloading', 700, info_dict={'id': 'abc', 'format_id': '137'}))
+    hook(event('downloading', 300, info_dict={'id': 'abc', 'format_id': '140'}))
+    hook(event('finished', 700, info_dict={'id': 'abc', 'format_id': '137'}))
+    hook(event('finished', 300, info_dict={'id': 'abc', 'format_id': '140'}))
+    assert downloaded('test-formats') == 1000
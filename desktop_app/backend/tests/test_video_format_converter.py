@@ -0,0 +1,36 @@
+from video_format_converter import VideoFormatConverter
+
+
+def batch(tmp_path, convert):
+    source = tmp_path / 'in'
+    source.mkdir()
+    for name in ('a.mkv', 'b.mkv'):
+        (source / name).write_bytes(b'video')
+    converter = VideoFormatConverter(output_dir=str(tmp_path / 'out'), encode_workers=1)
+    converter.probe = lambda path: {}
+    converter.get_duration = lambda path, probe=None: 10.0
+    converter.convert_to_mp4 = convert
+    frames = []
+    summary = converter.convert_batch(str(source), workers=1, progress_callback=frames.append)
+    return summary, frames
+
+
+def test_batch_where_every_file_fails_is_an_error(tmp_path):
+    def fail(input_path, output_path, **kwargs):
+        raise RuntimeError(f"cannot decode {input_path.name}")
+
+    summary, frames = batch(tmp_path, fail)
+    assert summary['status'] == 'error'
+    assert 'cannot decode' in summary['error']
+    assert len(summary['failed']) == 2
+    assert frames[-1] is summary
+
+
+def test_batch_with_some_conversions_completes(tmp_path):
+    def convert(input_path, output_path, **kwargs):
+        return input_path.name == 'a.mkv'
+
+    summary, frames = batch(tmp_path, convert)
+    assert summary['status'] == 'completed'
+    assert len(summary['converted']) == 1
+    assert summary['failed'][0]['error'] == "FFmpeg process failed"
@@ -0,0 +1,32 @@
+from yt_clips_downloader import YTClipsDownloader
+
+
+def plan(tmp_path, clips):
+    """Run download_clips with extraction and cutting stubbed; return the planned spans."""
+    downloader = YTClipsDownloader(output_dir=str(tmp_path))
+    downloader._extract = lambda url: {'id': 'vid', 'title': 'Video', 'extractor_key': 'Generic'}
+    downloader._select_formats = lambda info: [{'url': 'http://media.test/video.mp4'}]
+    jobs = []
+
+    def run_spans(planned, progress_callback=None):
+        jobs.extend(planned)
+        return [{'output': path} for _, _, _, outputs in planned for _, _, path in outputs]
+
+    downloader._run_spans = run_spans
+    written = downloader.download_clips(clips, timestamp='20260101_000000')
+    return jobs, written
+
+
+def test_identical_ranges_are_cut_once(tmp_path):
+    clip = {'url': 'http://media.test/video.mp4', 'start': 2, 'end': 6}
+    jobs, written = plan(tmp_path, [clip, dict(clip)])
+    outputs = [output for _, _, _, span in jobs for output in span]
+    assert outputs == [(2.0, 6.0, written[0])]
+    assert len(written) == 1
+
+
+def test_ranges_with_the_same_labels_get_distinct_paths(tmp_path):
+    url = 'http://media.test/video.mp4'
+    jobs, written = plan(tmp_path, [{'url': url, 'start': 2.2, 'end': 6.1}, {'url': url, 'start': 2.7, 'end': 6.4}])
+    assert len(written) == 2
+    assert len(set(written)) == 2
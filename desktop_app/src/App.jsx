@@ -15,6 +15,10 @@ function App() {
   const [working, setWorking] = useState(false); // Global busy state
   const ws = useRef(null);
   const logEndRef = useRef(null);
+  // Jobs started from this window: job_id -> frame handler, or null for the global progress bar
+  const jobs = useRef(new Map());
+  // Frames of jobs not claimed yet (they can arrive before the POST that queued them returns)
+  const unclaimed = useRef(new Map());
 
   // Connect to WebSocket
   useEffect(() => {
@@ -39,22 +43,14 @@ function App() {
     ws.current.onmessage = (event) => {
       const msg = JSON.parse(event.data);
       if (msg.type === 'progress') {
-        const data = msg.data;
-
-        // Handle Global Progress
-        if (data.status === 'downloading' || data.status === 'downloading_safe' || data.status === 'converting' || data.status === 'uploading') {
-          setProgress(data);
-          setWorking(true);
-        } else if (data.status === 'completed') {
-          setWorking(false);
-          setProgress(null);
-          addLog("Success", data.output ? `Completed: ${data.output}` : "Operation Completed Successfully.");
-          new Notification("Task Complete", { body: "Your operation is finished." });
-        } else if (data.status === 'error') {
-          setWorking(false);
-          addLog("Error", data.error);
-        } else if (data.message) {
-          addLog("Info", data.message);
+        if (jobs.current.has(msg.job_id)) {
+          handleFrame(msg.job_id, msg.data);
+        } else {
+          const frames = unclaimed.current.get(msg.job_id) || [];
+          unclaimed.current.set(msg.job_id, [...frames, msg.data].slice(-200));
+          if (unclaimed.current.size > 50) {
+            unclaimed.current.delete(unclaimed.current.keys().next().value);
+          }
         }
       }
     };
@@ -65,6 +61,48 @@ function App() {
     };
   };
 
+  // Follow a job the user started; frames of other jobs (other windows, resumed jobs) are ignored
+  const trackJob = (jobId, onFrame = null) => {
+    if (!jobId) return;
+    jobs.current.set(jobId, onFrame);
+    const frames = unclaimed.current.get(jobId) || [];
+    unclaimed.current.delete(jobId);
+    frames.forEach(data => handleFrame(jobId, data));
+  };
+
+  const handleFrame = (jobId, data) => {
+    const handler = jobs.current.get(jobId);
+    if (data.status === 'completed' || data.status === 'error') {
+      jobs.current.delete(jobId);
+    }
+    if (handler) {
+      handler(data);
+      return;
+    }
+    const othersRunning = [...jobs.current.values()].some(h => h === null);
+
+    // Handle Global Progress
+    if (data.status === 'downloading' || data.status === 'downloading_safe' || data.status === 'converting' || data.status === 'uploading') {
+      setProgress(data);
+      setWorking(true);
+    } else if (data.status === 'completed') {
+      if (!othersRunning) {
+        setWorking(false);
+        setProgress(null);
+      }
+      addLog("Success", data.output ? `Completed: ${data.output}` : "Operation Completed Successfully.");
+      new Notification("Task Complete", { body: "Your operation is finished." });
+    } else if (data.status === 'error') {
+      if (!othersRunning) {
+        setWorking(false);
+        setProgress(null);
+      }
+      addLog("Error", data.error);
+    } else if (data.message) {
+      addLog("Info", data.message);
+    }
+  };
+
   const addLog = (source, message) => {
     setLogs(prev => [...prev, `[${new Date().toLocaleTimeString()}] [${source}] ${message}`]);
   };
@@ -115,6 +153,7 @@ function App() {
                 addLog={addLog}
                 downloading={working}
                 setDownloading={setWorking}
+                trackJob={trackJob}
               />
             )}
             {activeTab === 'scraper' && (
@@ -122,6 +161,7 @@ function App() {
                 addLog={addLog}
                 working={working}
                 setWorking={setWorking}
+                trackJob={trackJob}
               />
             )}
             {activeTab === 'clips' && (
@@ -129,6 +169,7 @@ function App() {
                 addLog={addLog}
                 working={working}
                 setWorking={setWorking}
+                trackJob={trackJob}
               />
             )}
             {activeTab === 'converter' && (
@@ -136,6 +177,7 @@ function App() {
                 addLog={addLog}
                 working={working}
                 setWorking={setWorking}
+                trackJob={trackJob}
               />
             )}
           </motion.div>
@@ -1,7 +1,7 @@
 import { useState } from 'react';
 import { RefreshCw, FileVideo, Settings } from 'lucide-react';
 
-export default function Converter({ addLog, wsProgress, working, setWorking }) {
+export default function Converter({ addLog, wsProgress, working, setWorking, trackJob }) {
     const [filePath, setFilePath] = useState('');
     const [quality, setQuality] = useState('high');
 
@@ -11,11 +11,12 @@ export default function Converter({ addLog, wsProgress, working, setWorking }) {
         addLog("Converter", `Starting conversion: ${filePath} (${quality})`);
 
         try {
-            await fetch(`http://localhost:8000/convert`, {
+            const res = await fetch(`http://localhost:8000/convert`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({ file_path: filePath, quality })
             });
+            trackJob((await res.json()).job_id);
         } catch (e) {
             setWorking(false);
             addLog("Error", `Conversion request failed: ${e.message}`);
@@ -2,7 +2,7 @@ import { useState } from 'react';
 import { Search, Image as ImageIcon, Code, Layers } from 'lucide-react';
 import { motion, AnimatePresence } from 'framer-motion';
 
-export default function ImageScraper({ addLog, wsProgress, working, setWorking }) {
+export default function ImageScraper({ addLog, wsProgress, working, setWorking, trackJob }) {
     const [url, setUrl] = useState('');
     const [mode, setMode] = useState('images'); // 'images' or 'scripts'
     const [results, setResults] = useState([]);
@@ -18,11 +18,12 @@ export default function ImageScraper({ addLog, wsProgress, working, setWorking }
         addLog("Scraper", `Starting ${label} scrape for: ${url}`);
 
         try {
-            await fetch(`http://localhost:8000/${endpoint}`, {
+            const res = await fetch(`http://localhost:8000/${endpoint}`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({ url })
             });
+            trackJob((await res.json()).job_id);
             // The actual results come via WebSocket 'completed' event for now, 
             // or we can implement a list return. 
             // For this v1, the backend sends "files" in the "completed" WS message.
@@ -2,15 +2,22 @@ import { useState } from 'react';
 import { Search, Activity, Download } from 'lucide-react';
 import { motion, AnimatePresence } from 'framer-motion';
 
-export default function VideoDownloader({ addLog, wsProgress, downloading, setDownloading }) {
+const PAGE_SIZE = 20;
+
+export default function VideoDownloader({ addLog, wsProgress, downloading, setDownloading, trackJob }) {
     const [url, setUrl] = useState('');
     const [analyzing, setAnalyzing] = useState(false);
     const [videos, setVideos] = useState([]);
+    const [playlist, setPlaylist] = useState(null);
+    // Next playlist page whose formats have not been requested yet
+    const [nextPage, setNextPage] = useState(0);
 
     const handleAnalyze = async () => {
         if (!url) return;
         setAnalyzing(true);
         setVideos([]);
+        setPlaylist(null);
+        setNextPage(0);
         addLog("Analysis", `Scanning URL: ${url}`);
 
         try {
@@ -23,7 +30,13 @@ export default function VideoDownloader({ addLog, wsProgress, downloading, setDo
 
             if (data.found && data.videos) {
                 setVideos(data.videos);
-                addLog("Analysis", `Found ${data.videos.length} videos.`);
+                if (data.playlist) {
+                    setPlaylist(data.playlist);
+                    addLog("Analysis", `Playlist "${data.playlist.title}": ${data.playlist.count} videos.`);
+                    loadPage(url, 0);
+                } else {
+                    addLog("Analysis", `Found ${data.videos.length} videos.`);
+                }
             } else {
                 addLog("Analysis", "No videos found.");
             }
@@ -34,16 +47,56 @@ export default function VideoDownloader({ addLog, wsProgress, downloading, setDo
         }
     };
 
+    // Resolve one page of playlist entries; each arrives as an "entry" frame of the job
+    const loadPage = async (playlistUrl, page) => {
+        setNextPage(page + 1);
+        try {
+            const res = await fetch(`http://localhost:8000/analyze/stream`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ url: playlistUrl, page, page_size: PAGE_SIZE })
+            });
+            trackJob((await res.json()).job_id, (data) => {
+                if (data.status === 'entry') {
+                    setVideos(prev => prev.map(v => (v.index === data.index ? data.video : v)));
+                } else if (data.status === 'error') {
+                    addLog("Error", `Could not load formats: ${data.error}`);
+                }
+            });
+        } catch (e) {
+            addLog("Error", `Could not load formats: ${e.message}`);
+        }
+    };
+
+    // Playlist entries arrive without formats; resolve one on demand
+    const handleResolve = async (idx) => {
+        const video = videos[idx];
+        try {
+            const res = await fetch(`http://localhost:8000/analyze/entry`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ url: video.url })
+            });
+            const data = await res.json();
+            if (data.found) {
+                setVideos(prev => prev.map((v, i) => (i === idx ? data.video : v)));
+            }
+        } catch (e) {
+            addLog("Error", `Could not load formats: ${e.message}`);
+        }
+    };
+
     const handleDownload = async (video, formatIdx) => {
         setDownloading(true);
         addLog("Download", `Starting download: ${video.title}`);
 
         try {
-            await fetch(`http://localhost:8000/download`, {
+            const res = await fetch(`http://localhost:8000/download`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({ video, format_idx: formatIdx })
             });
+            trackJob((await res.json()).job_id);
         } catch (e) {
             setDownloading(false);
             addLog("Error", `Download request failed: ${e.message}`);
@@ -79,6 +132,15 @@ export default function VideoDownloader({ addLog, wsProgress, downloading, setDo
                 </button>
             </div>
 
+            {playlist && nextPage * PAGE_SIZE < playlist.count && (
+                <button
+                    onClick={() => loadPage(playlist.url, nextPage)}
+                    className="mb-4 px-4 py-2 rounded text-sm font-semibold transition bg-slate-700 hover:bg-slate-600 text-white"
+                >
+                    Load formats for videos {nextPage * PAGE_SIZE + 1}-{Math.min((nextPage + 1) * PAGE_SIZE, playlist.count)}
+                </button>
+            )}
+
             <AnimatePresence>
                 {videos.map((video, idx) => (
                     <motion.div
@@ -98,6 +160,15 @@ export default function VideoDownloader({ addLog, wsProgress, downloading, setDo
                             </div>
                         </div>
 
+                        {video.lazy && (
+                            <button
+                                onClick={() => handleResolve(idx)}
+                                className="px-4 py-2 rounded text-sm font-semibold transition bg-slate-700 hover:bg-slate-600 text-white"
+                            >
+                                Load formats
+                            </button>
+                        )}
+
                         <div className="space-y-2">
                             {video.formats.slice(0, 5).map((fmt, fIdx) => (
                                 <div key={fIdx} className="flex items-center justify-between bg-slate-800/50 p-3 rounded hover:bg-slate-700 transition cursor-pointer">
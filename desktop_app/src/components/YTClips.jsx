@@ -1,7 +1,7 @@
 import { useState } from 'react';
 import { Scissors, Youtube } from 'lucide-react';
 
-export default function YTClips({ addLog, wsProgress, working, setWorking }) {
+export default function YTClips({ addLog, wsProgress, working, setWorking, trackJob }) {
     const [url, setUrl] = useState('');
 
     const handleDownload = async () => {
@@ -10,11 +10,12 @@ export default function YTClips({ addLog, wsProgress, working, setWorking }) {
         addLog("Clips", `Starting clip download: ${url}`);
 
         try {
-            await fetch(`http://localhost:8000/download-clip`, {
+            const res = await fetch(`http://localhost:8000/download-clip`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({ url })
             });
+            trackJob((await res.json()).job_id);
         } catch (e) {
             setWorking(false);
             addLog("Error", `Clip request failed: ${e.message}`);